@@ -0,0 +1,418 @@
+"""
+Stream resume x JD screening from JSONL files.
+
+Each input line is a JSON object with "text" and an optional "id":
+    {"id": "jd-42", "text": "Senior Product Manager ..."}
+
+One match record is written per resume/JD pair, in input order:
+    {"resume_id": ..., "jd_id": ..., "match_result": {...}, "prefilter_score": 0.83,
+     "skipped": false, "error": null}
+
+Pairs flow through a parse stage and a match stage (pipeline.py) with their own
+thread counts (--parse-workers, --workers) and bounded queues (--queue-size); a
+summary of each stage's utilization and queue depth is printed at the end, and
+every --progress SECONDS during the run.
+
+--resumes and --jds may also be PDF/HTML files or directories of them; their text is
+extracted by ingest.py in a process pool while earlier pairs are already matching.
+
+Pairs scoring below --min-prefilter-score skip the LLM and have match_result null.
+With --top-k K (or PREFILTER_TOP_K) every document is parsed first and only the K
+best-scoring resumes per JD are matched. --vector-index DIR (needs numpy and the REST
+backend) also keeps each JD's K nearest resumes by embedding, so candidates who
+describe the same skills in other words are not dropped; the index persists in DIR
+and later runs only embed resumes whose ids it has not seen.
+With --store DIR, scores are also appended to a columnar match_store.MatchStore.
+With --journal PATH (or RUN_JOURNAL) every finished parse and match is journaled;
+rerunning the same command after a crash replays finished work from the journal
+and only calls the LLM for the rest.
+With --cascade (or CASCADE_MODELS) set to "small,large", each parse and match runs
+on the small model first and escalates only when its answer is not good enough.
+
+Usage:
+    python batch_screen.py --resumes resumes.jsonl --jds jds.jsonl --output matches.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from cascade import CASCADE_STATS, cascade_match, cascade_models, cascade_parse_jd, cascade_parse_resume
+from compaction import COMPACT_INPUTS, COMPACTION_STATS, learn_corpus
+from ingest import iter_documents
+from journal import Fallback, Journal, get_journal, set_journal
+from ollama_run import (WARMUP_ENABLED, BackendError, default_parallelism, match_jd_and_resume, parse_jd,
+                        parse_resume, print_backend_stats, print_warmup_report, warm_up)
+from parse_cache import SingleFlight, cache_key
+from pipeline import Pipeline, Stage
+from prefilter import PAIR_STATS, default_min_score, default_top_k, passes_prefilter, shortlist_all
+from scheduler import CLASSES, set_default_priority
+
+MODEL = "llama3.2"
+STORE_BATCH = 1024
+PARSE_MEMO_ENTRIES = int(os.environ.get("BATCH_PARSE_MEMO", "4096"))
+
+
+def read_jsonl(path: str):
+    """Yield (id, text) per line without loading the file."""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"{path}:{line_no}: skipping invalid JSON ({e})", file=sys.stderr)
+                continue
+            if not isinstance(record, dict):
+                print(f"{path}:{line_no}: skipping invalid JSON (expected an object, got "
+                      f"{type(record).__name__})", file=sys.stderr)
+                continue
+            yield str(record.get("id", line_no)), record.get("text", "")
+
+
+def read_documents(path: str):
+    """(id, text) from a JSONL file, or from PDF/HTML/text documents (a file or a directory)."""
+    if path.endswith(".jsonl"):
+        return read_jsonl(path)
+    return iter_documents(path)
+
+
+class ExtractedDocuments:
+    """
+    Documents from iter_documents, extracted as the first pass over them asks for each
+    one and kept for every later pass. The first resume's pairs can then be matching
+    while the remaining JDs are still being extracted, and no JD is extracted twice.
+    """
+
+    def __init__(self, documents):
+        self._source = iter(documents)
+        self._seen = []
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        i = 0
+        while True:
+            with self._lock:
+                if i == len(self._seen):
+                    if self._source is None:
+                        return
+                    document = next(self._source, None)
+                    if document is None:
+                        self._source = None
+                        return
+                    self._seen.append(document)
+                document = self._seen[i]
+            i += 1
+            yield document
+
+
+def iter_pairs(resumes_path: str, jds_path: str, jds=None):
+    """
+    Yield (resume_id, resume_text, jd_id, jd_text). A JSONL JD file is re-read for
+    every resume so memory stays constant; repeated JD parses are served by ParseOnce.
+    JD documents are extracted once, lazily, through an ExtractedDocuments (`jds`),
+    since extraction is the expensive part.
+    """
+    if jds is None and not jds_path.endswith(".jsonl"):
+        jds = ExtractedDocuments(read_documents(jds_path))
+    for resume_id, resume_text in read_documents(resumes_path):
+        for jd_id, jd_text in (jds if jds is not None else read_jsonl(jds_path)):
+            yield resume_id, resume_text, jd_id, jd_text
+
+
+class ParseOnce:
+    """
+    Parsed documents of one run, so each resume and JD is parsed once however many
+    pairs it appears in, even with the parse cache off. Workers asking for a document
+    that is still being parsed wait for that call instead of starting their own.
+    Keeps the `max_entries` most recently used documents (all of them when None);
+    failed parses are not kept. With `cascade` (models, smallest first) `model` is unused.
+    """
+
+    def __init__(self, model: str, cascade: list = None, max_entries: int = PARSE_MEMO_ENTRIES):
+        self.model = model
+        self.cascade = cascade
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flight = SingleFlight()
+
+    def resume(self, text: str) -> dict:
+        if self.cascade:
+            return self._get("resume", text, lambda: cascade_parse_resume(text, self.cascade))
+        return self._get("resume", text, lambda: parse_resume(text, self.model))
+
+    def jd(self, text: str) -> dict:
+        if self.cascade:
+            return self._get("jd", text, lambda: cascade_parse_jd(text, self.cascade))
+        return self._get("jd", text, lambda: parse_jd(text, self.model))
+
+    def _get(self, kind: str, text: str, parse) -> dict:
+        key = cache_key(kind, text, ",".join(self.cascade or [self.model]), "")
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        def compute():
+            info = parse()
+            if info and self.max_entries != 0:
+                with self._lock:
+                    self._entries[key] = info
+                    while self.max_entries is not None and len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return info
+        return self._flight.do(key, compute)
+
+
+def shortlist_pairs(resumes_path: str, jds_path: str, jds, parsed: ParseOnce, top_k: int,
+                    min_score: float, workers: int, vector_index=None) -> set:
+    """
+    Parse every resume and JD up front and keep the top_k resumes per JD (prefilter.SkillIndex),
+    plus the top_k nearest by embedding when `vector_index` (a vector_index.VectorIndex) is given.
+    Returns {(resume_id, jd_id)}. Every pair of a document that fails to parse is kept
+    too, so the pipeline parses it again and reports the error instead of skipping it.
+    """
+    def parse_all(documents, parse) -> tuple:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [(doc_id, pool.submit(parse, text)) for doc_id, text in documents]
+            infos, failed = {}, []
+            for doc_id, future in futures:
+                try:
+                    info = future.result()
+                except Exception:
+                    info = None
+                if info:
+                    infos[doc_id] = info
+                else:
+                    failed.append(doc_id)
+            return infos, failed
+
+    jd_infos, failed_jds = parse_all(jds if jds is not None else read_jsonl(jds_path), parsed.jd)
+    resume_infos, failed_resumes = parse_all(read_documents(resumes_path), parsed.resume)
+    shortlists, stats = shortlist_all(jd_infos, resume_infos, top_k, min_score)
+    print(f"Prefilter top-{top_k}: {stats.sent_to_llm} of {stats.pairs} resume/JD pairs shortlisted.",
+          file=sys.stderr)
+    if failed_jds or failed_resumes:
+        print(f"Prefilter top-{top_k}: {len(failed_jds)} JDs and {len(failed_resumes)} resumes failed to parse; "
+              f"their pairs are left to the pipeline.", file=sys.stderr)
+    pairs = {(resume_id, jd_id) for jd_id, ranked in shortlists.items() for resume_id, _ in ranked}
+    if vector_index is not None:
+        pairs.update(semantic_pairs(vector_index, jd_infos, resume_infos, top_k))
+    resume_ids = list(resume_infos) + failed_resumes
+    pairs.update((resume_id, jd_id) for jd_id in failed_jds for resume_id in resume_ids)
+    pairs.update((resume_id, jd_id) for resume_id in failed_resumes for jd_id in jd_infos)
+    return pairs
+
+
+def semantic_pairs(index, jd_infos: dict, resume_infos: dict, top_k: int) -> set:
+    """
+    {(resume_id, jd_id)} for the top_k resumes nearest each JD in `index`. Resumes are
+    embedded into it first; rows it holds from other runs are skipped, not counted.
+    """
+    from vector_index import jd_document, resume_document
+    try:
+        index.add(resume_infos, resume_document)
+        jd_ids = list(jd_infos)
+        # Widen the search by the rows that are not part of this run so they cannot
+        # crowd this run's resumes out of the top_k.
+        k = top_k + len(index) - len(resume_infos)
+        hits = index.query([jd_infos[jd_id] for jd_id in jd_ids], jd_document, k)
+    except BackendError as e:
+        print(f"Vector shortlist unavailable ({e}); using the skill shortlist only.", file=sys.stderr)
+        return set()
+    pairs = set()
+    for jd_id, ranked in zip(jd_ids, hits):
+        ranked = [resume_id for resume_id, _ in ranked if resume_id in resume_infos][:top_k]
+        pairs.update((resume_id, jd_id) for resume_id in ranked)
+    print(f"Vector shortlist: {len(pairs)} resume/JD pairs from {index.path}.", file=sys.stderr)
+    return pairs
+
+
+def parse_pair(resume_id: str, resume_text: str, jd_id: str, jd_text: str, parsed: ParseOnce,
+               min_score: float = 0.0, shortlist: set = None) -> tuple:
+    """
+    Parse both sides and apply the prefilter. Returns (record, jd_info, resume_info);
+    the infos are None when the pair needs no match (skipped, or failed: an exception
+    or an empty parse of either side sets record["error"]). With
+    `shortlist` (from shortlist_pairs) only the pairs in it are matched.
+    """
+    record = {"resume_id": resume_id, "jd_id": jd_id, "match_result": None,
+              "prefilter_score": None, "skipped": False, "error": None}
+    try:
+        resume_info = parsed.resume(resume_text)
+        jd_info = parsed.jd(jd_text)
+        # An empty side would pass the prefilter (nothing required) and be matched blind.
+        failed = [kind for kind, info in (("resume", resume_info), ("JD", jd_info)) if not info]
+        if failed:
+            record["error"] = " and ".join(failed) + " parse failed"
+            return record, None, None
+        keep, record["prefilter_score"] = passes_prefilter(
+            jd_info, resume_info, min_score, shortlist is None or (resume_id, jd_id) in shortlist)
+    except Exception as e:
+        record["error"] = str(e)
+        return record, None, None
+    if not keep:
+        record["skipped"] = True
+        return record, None, None
+    return record, jd_info, resume_info
+
+
+def match_pair(parsed: tuple, model: str, cascade: list = None) -> dict:
+    record, jd_info, resume_info = parsed
+    if jd_info is None:
+        return record
+    try:
+        if cascade:
+            record["match_result"] = cascade_match(jd_info, resume_info, cascade)
+        else:
+            record["match_result"] = match_jd_and_resume(jd_info, resume_info, model)
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def screen_pair(resume_id: str, resume_text: str, jd_id: str, jd_text: str, model: str,
+                min_score: float = 0.0, cascade: list = None) -> dict:
+    """Parse and match one pair in the calling thread."""
+    parsed = ParseOnce(model, cascade, max_entries=0)
+    return match_pair(parse_pair(resume_id, resume_text, jd_id, jd_text, parsed, min_score), model, cascade)
+
+
+def run_batch(resumes_path: str, jds_path: str, out, model: str = MODEL, workers: int = None,
+              min_score: float = 0.0, store=None, cascade: list = None, parse_workers: int = None,
+              queue_size: int = None, report_every: float = None, top_k: int = None, vector_index=None) -> int:
+    """
+    Screen every pair through a parse -> match pipeline: `parse_workers` and `workers`
+    threads per stage, bounded queues between them, records written in input order.
+    A slow match stage backs up into parsing and then into reading the inputs, so
+    memory stays bounded however large the inputs are.
+    With `top_k`, every document is parsed first and only the top_k resumes per JD
+    are matched (by skill overlap, and by embedding too with `vector_index`); their
+    parses are kept for the whole run.
+    Matched pairs are also appended to `store` (a match_store.MatchStore) when given,
+    except those whose match fell back to default scores.
+    """
+    workers = workers or default_parallelism()
+    jds = None if jds_path.endswith(".jsonl") else ExtractedDocuments(read_documents(jds_path))
+    if COMPACT_INPUTS:
+        # One cheap pass over the JDs so boilerplate shared across postings is known up front.
+        learn_corpus(text for _, text in (jds if jds is not None else read_jsonl(jds_path)))
+    shortlist = None
+    if top_k:
+        parsed = ParseOnce(model, cascade, max_entries=None)
+        shortlist = shortlist_pairs(resumes_path, jds_path, jds, parsed, top_k, min_score, parse_workers or workers,
+                                    vector_index)
+    else:
+        parsed = ParseOnce(model, cascade)
+    pipe = Pipeline([
+        Stage("parse", lambda pair: parse_pair(*pair, parsed, min_score, shortlist), parse_workers or workers,
+              queue_size),
+        Stage("match", lambda pair: match_pair(pair, model, cascade), workers, queue_size),
+    ], report_every=report_every)
+    written = 0
+    pending_store = []
+
+    def flush_store():
+        from match_store import MatchRecord
+        store.append([MatchRecord.from_result(r["jd_id"], r["resume_id"], r["match_result"])
+                      for r in pending_store])
+        pending_store.clear()
+
+    for record in pipe.run(iter_pairs(resumes_path, jds_path, jds)):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        written += 1
+        # Fallback defaults are placeholders, not scores; ranking must not see them.
+        if store is not None and record["match_result"] and not isinstance(record["match_result"], Fallback):
+            pending_store.append(record)
+            if len(pending_store) >= STORE_BATCH:
+                flush_store()
+    if pending_store:
+        flush_store()
+    print(pipe.summary(), file=sys.stderr)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream resume x JD matching from JSONL files.")
+    parser.add_argument("--resumes", required=True, help="JSONL file of resumes, or PDF/HTML files or a directory")
+    parser.add_argument("--jds", required=True, help="JSONL file of job descriptions, or PDF/HTML files or a directory")
+    parser.add_argument("--output", default="-", help="JSONL output path (default: stdout)")
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="match stage threads (default: OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--parse-workers", type=int, default=None, help="parse stage threads (default: --workers)")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="bound of each stage's input queue (default: 2 x its workers)")
+    parser.add_argument("--progress", type=float, default=None, metavar="SECONDS",
+                        help="print stage utilization and queue depths every SECONDS")
+    parser.add_argument("--min-prefilter-score", type=float, default=default_min_score(),
+                        help="skip the LLM for pairs below this skill/years score in [0, 1] "
+                             "(default: PREFILTER_MIN_SCORE or 0)")
+    parser.add_argument("--top-k", type=int, default=default_top_k(),
+                        help="parse everything first and only match the K best-scoring resumes per JD "
+                             "(default: PREFILTER_TOP_K, off)")
+    parser.add_argument("--vector-index", default=None, metavar="DIR",
+                        help="with --top-k, also shortlist the K nearest resumes per JD by embedding, "
+                             "kept in a VectorIndex in DIR")
+    parser.add_argument("--no-warmup", action="store_true", help="skip loading the model before the first pair")
+    parser.add_argument("--store", default=None, help="also append scores to a columnar MatchStore in this directory")
+    parser.add_argument("--cascade", default=",".join(cascade_models()),
+                        help="comma-separated models, smallest first, to cascade through instead of --model "
+                             "(default: CASCADE_MODELS)")
+    parser.add_argument("--journal", default=None,
+                        help="write-ahead journal file; rerunning with the same file resumes (default: RUN_JOURNAL)")
+    parser.add_argument("--priority", choices=sorted(CLASSES), default="batch",
+                        help="scheduler class for this run's LLM calls (default: batch)")
+    args = parser.parse_args()
+    set_default_priority(args.priority)
+    if args.journal:
+        set_journal(Journal(args.journal))
+    cascade = [m.strip() for m in args.cascade.split(",") if m.strip()]
+
+    if WARMUP_ENABLED and not args.no_warmup:
+        for model in cascade or [args.model]:
+            print_warmup_report(warm_up(model))
+
+    store = None
+    if args.store:
+        from match_store import MatchStore  # needs numpy
+        store = MatchStore(args.store)
+    vectors = None
+    if args.vector_index:
+        if not args.top_k:
+            parser.error("--vector-index needs --top-k")
+        from vector_index import VectorIndex  # needs numpy
+        vectors = VectorIndex(args.vector_index)
+    if args.output == "-":
+        count = run_batch(args.resumes, args.jds, sys.stdout, args.model, args.workers, args.min_prefilter_score,
+                          store, cascade, args.parse_workers, args.queue_size, args.progress, args.top_k, vectors)
+    else:
+        with open(args.output, "w", encoding="utf-8") as out:
+            count = run_batch(args.resumes, args.jds, out, args.model, args.workers, args.min_prefilter_score,
+                              store, cascade, args.parse_workers, args.queue_size, args.progress,
+                              args.top_k, vectors)
+    print(f"Wrote {count} match records.", file=sys.stderr)
+    print(PAIR_STATS.summary(), file=sys.stderr)
+    if cascade:
+        print(CASCADE_STATS.summary(), file=sys.stderr)
+    print_backend_stats()
+    if COMPACTION_STATS.documents:
+        print(COMPACTION_STATS.summary(), file=sys.stderr)
+    journal = get_journal()
+    if isinstance(journal, Journal):
+        print(journal.summary(), file=sys.stderr)
+        journal.close()
+    json_path, prom_path = metrics.export_all(basename="batch_metrics")
+    print(f"Metrics written to {json_path} and {prom_path}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Check and time compaction.compact against a corpus of job postings.
+
+Each corpus line has "name", "text", "budget", "keep" (lines that must survive:
+requirements the parser needs) and "drop" (boilerplate lines that must be removed).
+Exits 1 when any case loses a required line or keeps a dropped one.
+
+Usage:
+    python benchmarks/bench_compaction.py [corpus.jsonl]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from compaction import compact  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "compaction_corpus.jsonl")
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS
+    with open(path, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    failures = 0
+    print(f"{'case':<36} {'tokens':>13} {'result':>6} {'us/call':>8}")
+    for case in cases:
+        result = compact(case["text"], case.get("budget"), posting=case.get("posting", True))
+        lines = set(result.text.splitlines())
+        lost = [line for line in case.get("keep", []) if line not in lines]
+        kept = [line for line in case.get("drop", []) if line in lines]
+        failures += bool(lost or kept)
+        runs = 2000
+        usec = timeit.timeit(lambda: compact(case["text"], case.get("budget")), number=runs) / runs * 1e6
+        tokens = f"{result.tokens_before} -> {result.tokens_after}"
+        print(f"{case['name']:<36} {tokens:>13} {'FAIL' if lost or kept else 'ok':>6} {usec:8.1f}")
+        for line in lost:
+            print(f"    lost: {line}")
+        for line in kept:
+            print(f"    kept: {line}")
+
+    print(f"\n{len(cases) - failures}/{len(cases)} cases passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Check and time json_repair.parse_model_json against a corpus of malformed model outputs.
+
+Each corpus line has "name", "raw" (model output) and "expected" (the dict we want back).
+The legacy extract-braces-and-append-'}' approach is scored alongside for comparison;
+every case it fails would have cost a re_prompt_fix LLM call.
+
+Usage:
+    python benchmarks/bench_json_repair.py [corpus.jsonl]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from json_repair import parse_model_json  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "json_repair_corpus.jsonl")
+
+
+def legacy_parse(raw_output: str) -> dict:
+    cleaned = raw_output.replace("```json", "").replace("```", "").strip()
+    start = cleaned.find('{')
+    end = cleaned.rfind('}')
+    if start == -1 or end == -1 or end < start:
+        return {}
+    json_string = cleaned[start:end + 1]
+    opens = json_string.count('{')
+    closes = json_string.count('}')
+    if opens > closes:
+        json_string += '}' * (opens - closes)
+    try:
+        return json.loads(json_string)
+    except json.JSONDecodeError:
+        return {}
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS
+    with open(path, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    failures = 0
+    legacy_ok = 0
+    print(f"{'case':<28} {'legacy':>6} {'repair':>6} {'us/call':>8}")
+    for case in cases:
+        raw, expected = case["raw"], case["expected"]
+        ok = parse_model_json(raw) == expected
+        old = legacy_parse(raw) == expected
+        legacy_ok += old
+        failures += not ok
+        runs = 2000
+        usec = timeit.timeit(lambda: parse_model_json(raw), number=runs) / runs * 1e6
+        print(f"{case['name']:<28} {'ok' if old else 'FAIL':>6} {'ok' if ok else 'FAIL':>6} {usec:8.1f}")
+
+    total = len(cases)
+    print(f"\nlegacy: {legacy_ok}/{total} parsed, repair: {total - failures}/{total} parsed")
+    print(f"re-prompts avoided on this corpus: {(total - failures) - legacy_ok}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
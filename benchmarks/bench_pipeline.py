@@ -0,0 +1,180 @@
+"""
+Throughput / latency benchmark of the parse and match pipeline against the fake Ollama.
+
+Drives parse_jd, parse_resume, match_jd_and_resume and the batch_screen pair loop at
+several concurrency levels, and reports ops/sec, p50/p95/p99 latency and LLM calls
+per operation. Baselines can be saved and compared to catch regressions.
+
+The *_unconstrained scenarios run against a fake server that rejects JSON schema
+formats, so malformed outputs (--malformed-rate) reach the repair and re-prompt
+paths; truncated outputs (--truncated-rate) hit every scenario.
+
+Usage:
+    python benchmarks/bench_pipeline.py                        # print results
+    python benchmarks/bench_pipeline.py --save-baseline        # write benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --compare              # exit 1 on a regression
+    python benchmarks/bench_pipeline.py --backend subprocess   # drive the fake CLI instead
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+import batch_screen  # noqa: E402
+import metrics  # noqa: E402
+import ollama_run  # noqa: E402
+from fake_ollama import FakeConfig, FakeOllamaServer  # noqa: E402
+from ollama_backend import HTTPBackend, ResilientBackend, SubprocessBackend, set_backend  # noqa: E402
+from parse_cache import NullCache, set_parse_cache  # noqa: E402
+from scheduler import Scheduler, set_scheduler  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+SCENARIOS = ("parse_jd", "parse_resume", "match", "pair", "match_unconstrained", "pair_unconstrained")
+# Run against a fake that rejects `format` schemas, as Ollama did before structured
+# outputs, so the malformed-output repair and re-prompt paths are exercised too.
+UNCONSTRAINED = "_unconstrained"
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _operation(scenario: str, i: int, model: str):
+    scenario = scenario.replace(UNCONSTRAINED, "")
+    # Distinct text per iteration so nothing is served from a cache.
+    jd_text = f"Senior Product Manager #{i}\nRequired: 5 years of product management, SQL, ML."
+    resume_text = f"Candidate {i}\nSkills: Product Management, Python, SQL\nGoogle 04/2019-02/2023"
+    if scenario == "parse_jd":
+        return lambda: ollama_run.parse_jd(jd_text, model)
+    if scenario == "parse_resume":
+        return lambda: ollama_run.parse_resume(resume_text, model)
+    if scenario == "match":
+        jd_info = dict(ollama_run.JD_SCHEMA["properties"], job_title=jd_text)
+        resume_info = {"skills": ["Product Management"], "total_years_of_experience": i % 12}
+        return lambda: ollama_run.match_jd_and_resume(jd_info, resume_info, model)
+    return lambda: batch_screen.screen_pair(f"r{i}", resume_text, f"j{i}", jd_text, model)
+
+
+def run_scenario(scenario: str, concurrency: int, ops: int, model: str) -> dict:
+    operations = [_operation(scenario, i, model) for i in range(ops)]
+    latencies = []
+
+    def timed_call(op):
+        start = time.perf_counter()
+        op()
+        latencies.append(time.perf_counter() - start)
+
+    metrics.REGISTRY.reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed_call, operations))
+    elapsed = time.perf_counter() - start
+    # Counted client-side so the subprocess backend reports it too.
+    llm_calls = sum(metrics.REGISTRY.to_dict()["counters"].get("llm_calls_total", {}).values())
+    latencies.sort()
+    return {
+        "ops": ops,
+        "throughput_ops_s": round(ops / elapsed, 3),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "llm_calls_per_op": round(llm_calls / ops, 3),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return human-readable regressions: throughput down, p95 or calls/op up by > tolerance."""
+    problems = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if current["throughput_ops_s"] < base["throughput_ops_s"] * (1 - tolerance):
+            problems.append(f"{key}: throughput {current['throughput_ops_s']} < baseline {base['throughput_ops_s']}")
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{key}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if current["llm_calls_per_op"] > base["llm_calls_per_op"] + 1e-9:
+            problems.append(f"{key}: LLM calls/op {current['llm_calls_per_op']} > baseline {base['llm_calls_per_op']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a fake Ollama.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,4,8", help="comma-separated worker counts")
+    parser.add_argument("--ops", type=int, default=40, help="operations per scenario and concurrency level")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--tokens-per-second", type=float, default=4000.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.1)
+    parser.add_argument("--truncated-rate", type=float, default=0.1)
+    parser.add_argument("--num-parallel", type=int, default=8)
+    parser.add_argument("--straggler-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--resilient", action="store_true", help="wrap the backend in retries/breaker")
+    parser.add_argument("--hedge", action="store_true", help="with --resilient, hedge slow calls")
+    parser.add_argument("--backend", choices=["http", "subprocess"], default="http")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    config = FakeConfig(args.latency, args.tokens_per_second, args.malformed_rate, args.truncated_rate,
+                        args.num_parallel, straggler_rate=args.straggler_rate, error_rate=args.error_rate)
+    server = FakeOllamaServer(config).start()
+    raw_config = FakeConfig(**dict(vars(config), reject_format=True))
+    raw_server = FakeOllamaServer(raw_config).start()
+    backends = {}
+    for kind, url in (("", server.url), (UNCONSTRAINED, raw_server.url)):
+        if args.backend == "http":
+            backend = HTTPBackend(url, pool_size=64)
+        else:
+            # The CLI stand-in is never constrained; it uses its own latency defaults
+            # and takes the fault rates from the environment.
+            os.environ["FAKE_OLLAMA_MALFORMED_RATE"] = str(args.malformed_rate)
+            os.environ["FAKE_OLLAMA_TRUNCATED_RATE"] = str(args.truncated_rate)
+            backend = SubprocessBackend(os.path.join(HERE, "fake_ollama.py"))
+        if args.resilient:
+            backend = ResilientBackend(backend, backoff=0.05, hedge=args.hedge)
+        backends[kind] = backend
+    set_parse_cache(NullCache())
+    # Give the client as many LLM slots as the fake server has, as OLLAMA_NUM_PARALLEL would.
+    set_scheduler(Scheduler(args.num_parallel))
+
+    model = "llama3.2"
+    results = {}
+    print(f"{'scenario':<20} {'conc':>4} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'calls/op':>9}")
+    for scenario in args.scenarios.split(","):
+        set_backend(backends[UNCONSTRAINED if scenario.endswith(UNCONSTRAINED) else ""])
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            r = run_scenario(scenario, concurrency, args.ops, model)
+            results[f"{scenario}@{concurrency}"] = r
+            print(f"{scenario:<20} {concurrency:>4} {r['throughput_ops_s']:>9} {r['p50_ms']:>9} "
+                  f"{r['p95_ms']:>9} {r['p99_ms']:>9} {r['llm_calls_per_op']:>9}")
+    server.stop()
+    raw_server.stop()
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            config = {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "compare")}
+            json.dump({"config": config, "results": results}, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        problems = compare(results, baseline, args.tolerance)
+        for problem in problems:
+            print("REGRESSION", problem)
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Deterministic stand-in for the Ollama server and the `ollama` CLI, for benchmarks.
+
+Responses are canned parse/match JSON chosen from the request (format schema or
+prompt wording). Latency, token rate, parallel slots and the share of malformed
+or truncated outputs are configurable. Output depends only on the prompt and the
+seed, so runs are reproducible.
+
+    python benchmarks/fake_ollama.py serve --port 11555 --latency 0.05 --malformed-rate 0.2
+    echo "prompt" | python benchmarks/fake_ollama.py run llama3.2      # CLI stand-in
+
+Truncated output can hit any request, since a `format` schema does not stop a
+generation from being cut off. Malformed output (prose, single quotes, missing
+keys) is only produced for unconstrained requests, as with the real server;
+--reject-format makes every request unconstrained.
+
+The CLI stand-in also reads its fault rates from FAKE_OLLAMA_MALFORMED_RATE and
+FAKE_OLLAMA_TRUNCATED_RATE, so a harness driving it through SubprocessBackend
+can set them.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+JD_RESPONSE = {
+    "job_title": "Senior Product Manager",
+    "company_name": "Example Corp",
+    "required_education": "Bachelor's degree",
+    "required_experience_years": 5,
+    "required_skills": ["Product Management", "Machine Learning", "SQL", "Stakeholder Management"],
+    "responsibilities": ["Own the roadmap", "Partner with engineering", "Define success metrics"],
+}
+
+RESUME_RESPONSE = {
+    "highest_education": "Master of Science",
+    "total_years_of_experience": 8,
+    "skills": ["Product Management", "Machine Learning", "Python", "SQL"],
+    "work_experience": [
+        {"title": "Senior Technical Program Manager", "company": "Google", "start_date": "04/2019",
+         "end_date": "02/2023"},
+        {"title": "Technical Product Manager", "company": "TuSimple", "start_date": "03/2018",
+         "end_date": "04/2019"},
+    ],
+}
+
+
+def match_response(rng: random.Random) -> dict:
+    def dim(score_key="match_score"):
+        level = rng.randint(2, 6)
+        return {"match_level": level, score_key: f"{level * 14}%", "reasoning": "Deterministic fake reasoning."}
+    return {
+        "education": dim(),
+        "work_and_project_experience": dim(),
+        "skills": dim(),
+        "experience_year": dim(),
+        "Final_match": dim("Final_match_score"),
+    }
+
+
+class FakeConfig:
+    def __init__(self, latency: float = 0.02, tokens_per_second: float = 2000.0, malformed_rate: float = 0.0,
+                 truncated_rate: float = 0.0, num_parallel: int = 4, seed: int = 0, load_seconds: float = 0.0,
+                 straggler_rate: float = 0.0, straggler_seconds: float = 2.0, error_rate: float = 0.0,
+                 reject_format: bool = False, context_length: int = 131072):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.malformed_rate = malformed_rate
+        self.truncated_rate = truncated_rate
+        self.num_parallel = num_parallel
+        self.seed = seed
+        self.load_seconds = load_seconds
+        # Per attempt, not per prompt: a retried or hedged duplicate rolls again.
+        self.straggler_rate = straggler_rate
+        self.straggler_seconds = straggler_seconds
+        self.error_rate = error_rate
+        # Answer a JSON schema `format` with HTTP 400, as Ollama did before structured outputs.
+        self.reject_format = reject_format
+        self.context_length = context_length  # reported by /api/show
+
+
+def _rng_for(prompt: str, seed: int) -> random.Random:
+    digest = hashlib.sha256(f"{seed}:{prompt}".encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def _kind(prompt: str, schema) -> str:
+    props = schema.get("properties", {}) if isinstance(schema, dict) else {}
+    if "matches" in props or "jd_id:" in prompt:
+        return "batch"
+    if "required_skills" in props or "parse the following JD" in prompt:
+        return "jd"
+    if "highest_education" in props or "Resume Text" in prompt:
+        return "resume"
+    return "match"
+
+
+def _schema_keys(schema, array_key: str = None):
+    """Property names a match schema asks for (of its array items with array_key); None if unknown."""
+    if not isinstance(schema, dict):
+        return None
+    if array_key:
+        schema = schema.get("properties", {}).get(array_key, {}).get("items", {})
+    props = schema.get("properties")
+    return set(props) if props else None
+
+
+def _only(body: dict, keys) -> dict:
+    return body if keys is None else {k: v for k, v in body.items() if k in keys}
+
+
+def render(prompt: str, schema, config: FakeConfig) -> str:
+    """The fake model's full output for one prompt."""
+    rng = _rng_for(prompt, config.seed)
+    kind = _kind(prompt, schema)
+    if kind == "jd":
+        body = JD_RESPONSE
+    elif kind == "resume":
+        body = RESUME_RESPONSE
+    elif kind == "batch":
+        ids = [line.split(":", 1)[1].strip() for line in prompt.splitlines() if line.startswith("jd_id:")]
+        keys = _schema_keys(schema, "matches")
+        body = {"matches": [dict(_only(match_response(rng), keys), jd_id=jd_id) for jd_id in ids]}
+    else:
+        body = _only(match_response(rng), _schema_keys(schema))
+    text = json.dumps(body, ensure_ascii=False)
+    roll = rng.random()
+    if roll < config.truncated_rate:
+        # Generation cut off mid-object (num_predict reached, stream dropped); a schema
+        # does not prevent this, so constrained requests are truncated too.
+        return text[:rng.randint(len(text) // 2, len(text) - 2)]
+    if schema:
+        return text
+    if roll < config.truncated_rate + config.malformed_rate:
+        if kind == "match" and rng.random() < 0.5:
+            # Structurally valid but missing Final_match: only a re-prompt fixes this.
+            body = dict(body)
+            body.pop("Final_match")
+            return "Here is the comparison:\n" + json.dumps(body)
+        return "```json\n" + text.replace('"', "'").replace("}", ",}", 1) + "\n```\nHope this helps!"
+    return text
+
+
+def _embedding(text: str, dim: int = 64) -> list:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    rng = random.Random(int.from_bytes(digest[:8], "big"))
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+class FakeOllamaServer:
+    """ThreadingHTTPServer wrapper; start() returns once the port is bound."""
+
+    def __init__(self, config: FakeConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeConfig()
+        self.requests = 0
+        self.loaded_models = set()
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(self.config.num_parallel)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, body: dict, status: int = 200):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                try:
+                    self.end_headers()
+                    self.wfile.write(data)
+                except OSError:
+                    # Client hung up (a cancelled hedge or an expired deadline).
+                    self.close_connection = True
+
+            def do_GET(self):
+                if self.path == "/api/tags" or self.path == "/":
+                    self._send_json({"models": [{"name": m} for m in sorted(fake.loaded_models)]})
+                elif self.path == "/api/ps":
+                    self._send_json({"models": [{"name": m, "model": m} for m in sorted(fake.loaded_models)]})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with fake._lock:
+                    fake.requests += 1
+                if self.path in ("/api/generate", "/api/chat"):
+                    self._complete(payload)
+                elif self.path == "/api/embed":
+                    inputs = payload.get("input", [])
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self._send_json({"embeddings": [_embedding(t) for t in inputs]})
+                elif self.path == "/api/show":
+                    self._send_json({"model_info": {"llama.context_length": fake.config.context_length}})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def _complete(self, payload: dict):
+                config = fake.config
+                model = payload.get("model", "")
+                if self.path == "/api/chat":
+                    messages = payload.get("messages", [])
+                    prompt = "\n\n".join(m.get("content", "") for m in messages)
+                    user_prompt = messages[-1].get("content", "") if messages else ""
+                else:
+                    prompt = (payload.get("system") or "") + "\n\n" + (payload.get("prompt") or "")
+                    user_prompt = payload.get("prompt") or ""
+
+                if config.reject_format and isinstance(payload.get("format"), dict):
+                    self._send_json({"error": "invalid format: expected \"json\" or a JSON schema"}, 400)
+                    return
+                with fake._lock:
+                    attempt = fake._attempts.get(prompt, 0)
+                    fake._attempts[prompt] = attempt + 1
+                fault = _rng_for(f"{attempt}:{prompt}", config.seed).random()
+                if fault < config.error_rate:
+                    self._send_json({"error": "server overloaded"}, 503)
+                    return
+                with fake._slots:
+                    if fault < config.error_rate + config.straggler_rate:
+                        time.sleep(config.straggler_seconds)
+                    load_ns = 0
+                    if model not in fake.loaded_models:
+                        time.sleep(config.load_seconds)
+                        load_ns = int(config.load_seconds * 1e9)
+                        with fake._lock:
+                            fake.loaded_models.add(model)
+                    if not user_prompt.strip():
+                        # Empty prompt: the load/keep-alive request Ollama documents.
+                        self._send_json({"model": model, "response": "", "done": True, "load_duration": load_ns})
+                        return
+                    text = render(user_prompt, payload.get("format"), config)
+                    prompt_tokens = len(prompt) // 4 + 1
+                    tokens = max(1, len(text) // 4)
+                    time.sleep(config.latency)
+                    stats = {
+                        "done": True,
+                        "prompt_eval_count": prompt_tokens,
+                        "prompt_eval_duration": int(config.latency * 1e9),
+                        "eval_count": tokens,
+                        "eval_duration": int(tokens / config.tokens_per_second * 1e9),
+                        "load_duration": load_ns,
+                    }
+                    if payload.get("stream"):
+                        self._stream(text, stats)
+                    else:
+                        time.sleep(tokens / config.tokens_per_second)
+                        if self.path == "/api/chat":
+                            self._send_json(dict(stats, message={"role": "assistant", "content": text}))
+                        else:
+                            self._send_json(dict(stats, response=text))
+
+            def _stream(self, text: str, stats: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                per_token = 1.0 / fake.config.tokens_per_second
+                pieces = [text[i:i + 4] for i in range(0, len(text), 4)] + [""]
+                try:
+                    for i, piece in enumerate(pieces):
+                        done = i == len(pieces) - 1
+                        if self.path == "/api/chat":
+                            chunk = {"message": {"role": "assistant", "content": piece}, "done": done}
+                        else:
+                            chunk = {"response": piece, "done": done}
+                        if done:
+                            chunk.update(stats)
+                        data = json.dumps(chunk).encode("utf-8") + b"\n"
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                        self.wfile.flush()
+                        time.sleep(per_token)
+                    self.wfile.write(b"0\r\n\r\n")
+                except OSError:
+                    # Client hung up (early stop); the generation is cancelled.
+                    self.close_connection = True
+
+        return Handler
+
+
+def _cli_run(args):
+    config = FakeConfig(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                        malformed_rate=args.malformed_rate, truncated_rate=args.truncated_rate, seed=args.seed)
+    prompt = sys.stdin.read()
+    if not prompt.strip():
+        # `ollama run MODEL` with no prompt just loads the model.
+        time.sleep(args.load_seconds)
+        return
+    # The CLI gets "SYSTEM: ... USER: ... ASSISTANT:"; only the user part picks the response.
+    user_part = prompt.split("USER:", 1)[-1].rsplit("ASSISTANT:", 1)[0]
+    text = render(user_part, None, config)
+    time.sleep(config.latency + len(text) / 4 / config.tokens_per_second)
+    sys.stdout.write(text + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake Ollama server / CLI.")
+    parser.add_argument("command", choices=["serve", "run"])
+    parser.add_argument("model", nargs="?", default="llama3.2")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11555)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds of prompt processing per call")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--malformed-rate", type=float,
+                        default=float(os.environ.get("FAKE_OLLAMA_MALFORMED_RATE", "0")))
+    parser.add_argument("--truncated-rate", type=float,
+                        default=float(os.environ.get("FAKE_OLLAMA_TRUNCATED_RATE", "0")))
+    parser.add_argument("--num-parallel", type=int, default=4)
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="simulated model load on first use")
+    parser.add_argument("--straggler-rate", type=float, default=0.0, help="share of calls that stall")
+    parser.add_argument("--straggler-seconds", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with HTTP 503")
+    parser.add_argument("--reject-format", action="store_true",
+                        help="answer JSON schema formats with HTTP 400, like Ollama before structured outputs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keepalive", default=None, help="accepted for CLI compatibility")
+    # Intermixed so `run --keepalive 30m MODEL` parses like the real CLI.
+    args = parser.parse_intermixed_args()
+
+    if args.command == "run":
+        _cli_run(args)
+        return
+    config = FakeConfig(args.latency, args.tokens_per_second, args.malformed_rate, args.truncated_rate,
+                        args.num_parallel, args.seed, args.load_seconds, args.straggler_rate,
+                        args.straggler_seconds, args.error_rate, args.reject_format)
+    server = FakeOllamaServer(config, args.host, args.port).start()
+    print(f"Fake Ollama listening on {server.url}", file=sys.stderr)
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
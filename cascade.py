@@ -0,0 +1,153 @@
+"""
+Small-to-large model cascade for parsing and matching.
+
+Each stage runs on the first (smallest) model in CASCADE_MODELS and only moves to
+the next one when the answer is not good enough:
+  parse  the result misses required keys of JD_SCHEMA / RESUME_SCHEMA or has wrong types
+  match  validate_match_result fails, or Final_match_score falls in the borderline
+         band (CASCADE_BORDERLINE, default 40-60) where the small model's call decides
+         little and is most often wrong
+A backend error on one tier also escalates. The last tier's answer is always used.
+
+    CASCADE_MODELS=llama3.2:1b,llama3.2 python batch_screen.py ...
+"""
+import os
+import re
+import sys
+import threading
+import time
+
+import metrics
+from ollama_backend import BackendError
+from ollama_run import JD_SCHEMA, RESUME_SCHEMA, match_jd_and_resume, parse_jd, parse_resume
+
+
+def cascade_models() -> list:
+    """Tiers from CASCADE_MODELS, smallest first; empty when the cascade is off."""
+    return [m.strip() for m in os.environ.get("CASCADE_MODELS", "").split(",") if m.strip()]
+
+
+def _borderline_band() -> tuple:
+    low, _, high = os.environ.get("CASCADE_BORDERLINE", "40-60").partition("-")
+    return float(low), float(high or low)
+
+
+BORDERLINE = _borderline_band()
+_PERCENT = re.compile(r"-?\d+(?:\.\d+)?")
+
+_JSON_TYPES = {"string": str, "number": (int, float), "integer": int, "array": list, "object": dict}
+
+
+def parse_schema_ok(info: dict, schema: dict) -> bool:
+    """Required keys present with the schema's JSON types (bool is not a number)."""
+    if not isinstance(info, dict) or not info:
+        return False
+    for key in schema.get("required", []):
+        if key not in info:
+            return False
+        expected = _JSON_TYPES.get(schema["properties"].get(key, {}).get("type"))
+        value = info[key]
+        if expected and (not isinstance(value, expected) or isinstance(value, bool)):
+            return False
+    return True
+
+
+class CascadeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}        # (stage, model) -> calls
+        self.seconds = {}      # (stage, model) -> total seconds
+        self.escalations = {}  # (stage, reason) -> count
+        self.finished = {}     # (stage, model) -> items whose answer came from this tier
+
+    def _add(self, table: dict, key: tuple, amount: float = 1):
+        with self._lock:
+            table[key] = table.get(key, 0) + amount
+
+    def record_call(self, stage: str, model: str, seconds: float):
+        self._add(self.calls, (stage, model))
+        self._add(self.seconds, (stage, model), seconds)
+        metrics.observe("cascade_tier_seconds", seconds, stage=stage, model=model)
+
+    def record_escalation(self, stage: str, model: str, reason: str):
+        self._add(self.escalations, (stage, reason))
+        metrics.inc("cascade_escalations_total", stage=stage, model=model, reason=reason)
+
+    def record_finish(self, stage: str, model: str):
+        self._add(self.finished, (stage, model))
+
+    def summary(self) -> str:
+        with self._lock:
+            lines = []
+            for stage in sorted({s for s, _ in self.calls}):
+                total = sum(n for (s, _), n in self.finished.items() if s == stage)
+                tiers = []
+                for (s, model), calls in sorted(self.calls.items()):
+                    if s != stage:
+                        continue
+                    share = 100.0 * self.finished.get((s, model), 0) / total if total else 0.0
+                    avg = self.seconds[(s, model)] / calls
+                    tiers.append(f"{model}: {calls} calls, {avg:.2f}s avg, {share:.0f}% answered")
+                reasons = ", ".join(f"{reason} {n}" for (s, reason), n in sorted(self.escalations.items())
+                                    if s == stage) or "none"
+                lines.append(f"Cascade {stage}: " + "; ".join(tiers) + f" (escalations: {reasons})")
+        return "\n".join(lines)
+
+
+CASCADE_STATS = CascadeStats()
+
+
+def _run_tiers(stage: str, models: list, attempt):
+    """
+    Call attempt(model, last) per tier; it returns (result, reason) where reason is None
+    when the result is good enough. Returns the first good result or the last tier's.
+    """
+    result = None
+    for i, model in enumerate(models):
+        last = i == len(models) - 1
+        start = time.perf_counter()
+        try:
+            result, reason = attempt(model, last)
+        except BackendError as e:
+            CASCADE_STATS.record_call(stage, model, time.perf_counter() - start)
+            if last:
+                raise
+            print(f"Cascade {stage}: {model} failed ({e}); escalating.", file=sys.stderr)
+            CASCADE_STATS.record_escalation(stage, model, "error")
+            continue
+        CASCADE_STATS.record_call(stage, model, time.perf_counter() - start)
+        if reason is None or last:
+            CASCADE_STATS.record_finish(stage, model)
+            return result
+        CASCADE_STATS.record_escalation(stage, model, reason)
+    return result
+
+
+def cascade_parse_jd(jd_text: str, models: list) -> dict:
+    def attempt(model, last):
+        info = parse_jd(jd_text, model)
+        return info, None if parse_schema_ok(info, JD_SCHEMA) else "schema"
+    return _run_tiers("parse_jd", models, attempt)
+
+
+def cascade_parse_resume(resume_text: str, models: list) -> dict:
+    def attempt(model, last):
+        info = parse_resume(resume_text, model)
+        return info, None if parse_schema_ok(info, RESUME_SCHEMA) else "schema"
+    return _run_tiers("parse_resume", models, attempt)
+
+
+def cascade_match(jd_info: dict, resume_info: dict, models: list) -> dict:
+    low, high = BORDERLINE
+
+    def attempt(model, last):
+        # Lower tiers skip the re-prompt/fallback path; escalating is the better repair.
+        result = match_jd_and_resume(jd_info, resume_info, model, repair=last)
+        if result is None:
+            return None, "invalid"
+        found = _PERCENT.search(str(result["Final_match"].get("Final_match_score", "")))
+        score = float(found.group()) if found else 0.0
+        if low <= score <= high:
+            return result, "borderline"
+        return result, None
+    return _run_tiers("match", models, attempt)
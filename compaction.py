@@ -0,0 +1,218 @@
+"""
+Shrink JD and resume text before it goes into a parse prompt.
+
+Three passes, each line-based so nothing the parser needs is cut mid-sentence:
+  1. drop boilerplate: icon ligatures from copy-pasted job boards, accessibility /
+     EEO notices, salary disclaimers, and "About us" / "Benefits" sections (lines
+     in them that look informative are kept)
+  2. drop repeated lines: within the document, and lines that appear in at least
+     CORPUS_MIN_DOCS postings of the corpus registered with learn_corpus() (its first
+     CORPUS_SAMPLE_DOCS postings, so memory stays bounded on a large run)
+  3. enforce a token budget by dropping the least informative lines first
+
+Token counts use approx_tokens(), a regex approximation of a BPE tokenizer that is
+close enough to budget with and needs no model files.
+
+    result = compact(jd_text, budget=1500)
+    result.text, result.tokens_before, result.tokens_after
+"""
+import itertools
+import os
+import re
+import threading
+
+JD_TOKEN_BUDGET = int(os.environ.get("JD_TOKEN_BUDGET", "1500"))
+RESUME_TOKEN_BUDGET = int(os.environ.get("RESUME_TOKEN_BUDGET", "2500"))
+COMPACT_INPUTS = os.environ.get("COMPACT_INPUTS", "1") != "0"
+CORPUS_MIN_DOCS = 3
+# Short lines ("Python", "Requirements:") repeat across postings for good reason.
+CORPUS_MIN_LINE_CHARS = 60
+# Boilerplate shared across postings shows up in any sample of them; counting lines
+# over a bounded sample keeps learn_corpus() from holding the whole corpus.
+CORPUS_SAMPLE_DOCS = int(os.environ.get("COMPACT_CORPUS_SAMPLE", "2000"))
+CORPUS_MAX_LINES = 100_000
+# COMPACTION_LOG=1 prints the savings of every document.
+COMPACTION_LOG = os.environ.get("COMPACTION_LOG", "0") == "1"
+
+# Lines that are boilerplate wherever they appear.
+BOILERPLATE_LINE = re.compile(
+    r"welcomes people with disabilities|equal (employment )?opportunity|without regard to (race|age)"
+    r"|reasonable accommodation|e-?verify|pay transparency|salary range|base salary|compensation range"
+    r"|the (pay|salary) range for this|final (pay|compensation) (will|may) (be )?(determined|vary)"
+    r"|privacy (notice|policy)|click apply|apply now"
+    r"|we are an? (proud )?equal|background check|share this job|save this job|show more|show less",
+    re.I,
+)
+# Material-icon ligatures and job-board widgets that survive a copy-paste as text.
+ICON_LINE = re.compile(r"^(?:[a-z]+(?:_[a-z]+)+|place|info|share|bookmark|work|schedule|apartment)$")
+# Headings of marketing or legal sections, dropped up to the next heading. Only named
+# ones: "About the job" or "About you" sections hold the requirements.
+BOILERPLATE_SECTION = re.compile(
+    r"^(about (us|the company|our company)|our (mission|values|culture|story)"
+    r"|why join us|benefits|perks( and benefits| & benefits)?|what we offer|equal opportunity.*|eeo statement"
+    r"|compensation|pay transparency|disclaimer|legal)\s*:?$",
+    re.I,
+)
+# Anything that looks like the start of a new section ends a dropped one.
+SECTION_HEADING = re.compile(
+    r"^(minimum|preferred|basic|required|key)? ?(qualifications|requirements|responsibilities|skills"
+    r"|experience|education|what you('ll| will) do|who you are|the role|role|projects|summary)\b.*:?$"
+    r"|^[A-Z][A-Za-z &/'-]{2,40}:$",
+    re.I,
+)
+# Lines that carry what the parsers extract; dropped last under a tight budget.
+INFORMATIVE = re.compile(
+    r"\d|years?|degree|bachelor|master|ph\.?d|experience|require|qualif|skill|proficien"
+    r"|responsib|lead|manage|develop|design|build|own|\b(19|20)\d{2}\b",
+    re.I,
+)
+
+_TOKEN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def approx_tokens(text: str) -> int:
+    """
+    BPE-like token estimate: common words are one token, long words about one per
+    six characters, every digit run and punctuation mark one more.
+    """
+    count = 0
+    for piece in _TOKEN.findall(text):
+        count += 1 + len(piece) // 6 if piece[0].isalpha() else 1 + len(piece) // 3
+    return count
+
+
+def _norm_line(line: str) -> str:
+    return " ".join(line.lower().split())
+
+
+class CompactionResult:
+    __slots__ = ("text", "tokens_before", "tokens_after", "boilerplate_lines", "duplicate_lines",
+                 "budget_lines")
+
+    def __init__(self, text: str, tokens_before: int, tokens_after: int, boilerplate_lines: int = 0,
+                 duplicate_lines: int = 0, budget_lines: int = 0):
+        self.text = text
+        self.tokens_before = tokens_before
+        self.tokens_after = tokens_after
+        self.boilerplate_lines = boilerplate_lines
+        self.duplicate_lines = duplicate_lines
+        self.budget_lines = budget_lines
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+class CompactionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.max_saved = 0
+
+    def record(self, result: CompactionResult):
+        with self._lock:
+            self.documents += 1
+            self.tokens_before += result.tokens_before
+            self.tokens_after += result.tokens_after
+            self.max_saved = max(self.max_saved, result.tokens_saved)
+
+    def summary(self) -> str:
+        saved = self.tokens_before - self.tokens_after
+        share = 100.0 * saved / self.tokens_before if self.tokens_before else 0.0
+        per_doc = saved / self.documents if self.documents else 0.0
+        return (f"Input compaction: {self.documents} documents, ~{self.tokens_before} -> ~{self.tokens_after} "
+                f"tokens ({saved} saved, {share:.0f}%; {per_doc:.0f} per document on average, "
+                f"at most {self.max_saved}).")
+
+
+COMPACTION_STATS = CompactionStats()
+_corpus_lock = threading.Lock()
+_corpus_repeated = frozenset()
+
+
+def learn_corpus(texts, sample_docs: int = CORPUS_SAMPLE_DOCS) -> int:
+    """
+    Register the postings of this run; long lines found in CORPUS_MIN_DOCS or more of
+    them (company blurbs, shared legal text) are dropped by compact(). Returns how many.
+    Only the first `sample_docs` postings are read (all when None), and at most
+    CORPUS_MAX_LINES distinct lines are counted.
+    """
+    global _corpus_repeated
+    doc_freq = {}
+    for text in itertools.islice(texts, sample_docs):
+        for line in {_norm_line(line) for line in text.splitlines()}:
+            if len(line) >= CORPUS_MIN_LINE_CHARS and (line in doc_freq or len(doc_freq) < CORPUS_MAX_LINES):
+                doc_freq[line] = doc_freq.get(line, 0) + 1
+    repeated = frozenset(line for line, n in doc_freq.items() if n >= CORPUS_MIN_DOCS)
+    with _corpus_lock:
+        _corpus_repeated = repeated
+    return len(repeated)
+
+
+def _line_priority(line: str) -> tuple:
+    """Sort key for budget trimming: informative lines last, then shorter lines last."""
+    return len(INFORMATIVE.findall(line)), -len(line)
+
+
+def compact(text: str, budget: int = None, posting: bool = True) -> CompactionResult:
+    """
+    Compact one document. Boilerplate and corpus-level passes only apply to postings
+    (posting=True); a resume only gets in-document dedup and the budget. If nothing
+    (or no informative line) would be left, the original text is returned.
+    """
+    tokens_before = approx_tokens(text)
+    with _corpus_lock:
+        repeated = _corpus_repeated if posting else frozenset()
+
+    kept = []
+    seen = set()
+    boilerplate = duplicates = 0
+    in_dropped_section = False
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if posting and BOILERPLATE_SECTION.match(line):
+            in_dropped_section = True
+            boilerplate += 1
+            continue
+        if in_dropped_section:
+            if SECTION_HEADING.match(line):
+                in_dropped_section = False
+            elif not INFORMATIVE.search(line):
+                boilerplate += 1
+                continue
+        if posting and (ICON_LINE.match(line) or BOILERPLATE_LINE.search(line)):
+            boilerplate += 1
+            continue
+        norm = _norm_line(line)
+        if norm in seen or norm in repeated:
+            duplicates += 1
+            continue
+        seen.add(norm)
+        kept.append(line)
+
+    trimmed = 0
+    if budget:
+        costs = [approx_tokens(line) + 1 for line in kept]
+        total = sum(costs)
+        if total > budget:
+            drop = set()
+            for i in sorted(range(len(kept)), key=lambda i: _line_priority(kept[i])):
+                if total <= budget:
+                    break
+                drop.add(i)
+                total -= costs[i]
+            kept = [line for i, line in enumerate(kept) if i not in drop]
+            trimmed = len(drop)
+
+    compacted = "\n".join(kept)
+    if not compacted or (not any(INFORMATIVE.search(line) for line in kept)
+                         and any(INFORMATIVE.search(line) for line in text.splitlines())):
+        # Compaction lost everything the parser extracts; the full text is the safer prompt.
+        compacted = text
+    result = CompactionResult(compacted, tokens_before, approx_tokens(compacted), boilerplate, duplicates, trimmed)
+    COMPACTION_STATS.record(result)
+    return result
@@ -0,0 +1,643 @@
+"""
+Text extraction from PDF and HTML documents for the parse stages.
+
+    for doc_id, text in iter_documents(["resumes/", "HeyGen.pdf", "job.html"]):
+        parse_resume(text, model)
+
+PDFs are memory-mapped and read page by page: with pypdf installed it does the
+extraction, otherwise a small stdlib reader handles the common case (FlateDecode
+content streams, object streams, ToUnicode CMaps, WinAnsi simple fonts). HTML goes
+through html.parser with scripts, styles and navigation dropped. Either way the
+text is whitespace-normalized before it is returned.
+
+Extraction is CPU-bound, so iter_documents runs it in a process pool and yields
+documents in input order as they finish, while the caller's threads are already
+spending their time on LLM calls for the earlier ones.
+
+    python ingest.py resumes/ > resumes.jsonl      # JSONL input for batch_screen.py
+"""
+import argparse
+import codecs
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+DOCUMENT_SUFFIXES = (".pdf", ".html", ".htm", ".txt")
+
+
+# ------------------------------------------------------------------------------
+# Whitespace normalization
+# ------------------------------------------------------------------------------
+
+_REPLACEMENTS = str.maketrans({
+    "\u00a0": " ", "\u2007": " ", "\u202f": " ", "\u200b": "", "\u00ad": "", "\ufeff": "",
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi", "\ufb04": "ffl",
+    # Bullets, including the private-use glyph Word's Symbol font maps them to.
+    "\u2022": "-", "\u25cf": "-", "\u25aa": "-", "\uf0b7": "-",
+})
+_SPACES = re.compile(r"[ \t\f\v]+")
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces, strip every line, and keep at most one blank line in a row."""
+    lines = []
+    for line in text.translate(_REPLACEMENTS).splitlines():
+        line = _SPACES.sub(" ", line).strip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+
+# ------------------------------------------------------------------------------
+# HTML
+# ------------------------------------------------------------------------------
+
+class _HTMLText(HTMLParser):
+    SKIP = {"script", "style", "noscript", "template", "svg", "nav", "footer", "button", "select", "iframe"}
+    BLOCK = {"p", "div", "br", "li", "tr", "td", "th", "h1", "h2", "h3", "h4", "h5", "h6", "title", "section",
+             "article", "header", "main", "aside", "ul", "ol", "table", "dt", "dd", "blockquote", "pre", "hr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+        elif tag in self.BLOCK:
+            self._newline()
+            if tag == "li":
+                self.parts.append("- ")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK:
+            self._newline()
+
+    def _newline(self):
+        if self.parts and not self.parts[-1].endswith("\n"):
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data.replace("\n", " "))
+
+
+def extract_html(path: str, chunk_size: int = 1 << 16) -> str:
+    """Visible text of an HTML page, fed to the parser in chunks straight from the mapped file."""
+    parser = _HTMLText()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for start in range(0, len(data), chunk_size):
+                parser.feed(decoder.decode(data[start:start + chunk_size]))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return normalize_whitespace("".join(parser.parts))
+
+
+# ------------------------------------------------------------------------------
+# PDF (stdlib fallback reader)
+# ------------------------------------------------------------------------------
+
+class _Ref:
+    __slots__ = ("num",)
+
+    def __init__(self, num: int):
+        self.num = num
+
+
+class _Stream:
+    __slots__ = ("dict", "raw")
+
+    def __init__(self, header: dict, raw: bytes):
+        self.dict = header
+        self.raw = raw
+
+
+_WHITESPACE = re.compile(rb"(?:[\x00\t\n\x0c\r ]|%[^\r\n]*)*")
+_REGULAR = re.compile(rb"[^\x00\t\n\x0c\r ()<>\[\]{}/%]+")
+_NUMBER = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+_HEX_STRING = re.compile(rb"<([0-9A-Fa-f\x00\t\n\x0c\r ]*)>")
+_NAME_ESCAPE = re.compile(r"#([0-9A-Fa-f]{2})")
+_OCTAL = re.compile(rb"[0-7]{1,3}")
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+_OBJ_HEADER = re.compile(rb"(?<!\d)(\d+)\s+\d+\s+obj\b")
+_ROOT = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R")
+_KEYWORDS = {b"true": True, b"false": False, b"null": None}
+
+
+class _Lexer:
+    """PDF tokens from `data` (bytes or mmap); `pos` can be moved by the caller."""
+
+    def __init__(self, data, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def next(self) -> tuple:
+        """(kind, value): kind is "str", "name", "num", "punct", "op", or None at the end."""
+        data = self.data
+        pos = _WHITESPACE.match(data, self.pos).end()
+        if pos >= len(data):
+            self.pos = pos
+            return None, None
+        c = data[pos:pos + 1]
+        if c == b"(":
+            value, self.pos = self._literal(pos + 1)
+            return "str", value
+        if c == b"<":
+            if data[pos + 1:pos + 2] == b"<":
+                self.pos = pos + 2
+                return "punct", b"<<"
+            m = _HEX_STRING.match(data, pos)
+            if not m:
+                self.pos = pos + 1
+                return "punct", c
+            digits = re.sub(rb"\s", b"", m.group(1))
+            self.pos = m.end()
+            return "str", bytes.fromhex((digits + b"0" * (len(digits) % 2)).decode("ascii"))
+        if c == b">":
+            self.pos = pos + (2 if data[pos + 1:pos + 2] == b">" else 1)
+            return "punct", b">>"
+        if c in (b"[", b"]", b"{", b"}"):
+            self.pos = pos + 1
+            return "punct", c
+        if c == b"/":
+            m = _REGULAR.match(data, pos + 1)
+            self.pos = m.end() if m else pos + 1
+            name = m.group().decode("latin-1") if m else ""
+            return "name", _NAME_ESCAPE.sub(lambda e: chr(int(e.group(1), 16)), name)
+        m = _REGULAR.match(data, pos)
+        if not m:
+            self.pos = pos + 1
+            return "op", c
+        self.pos = m.end()
+        word = m.group()
+        if _NUMBER.fullmatch(word):
+            return "num", float(word) if b"." in word else int(word)
+        return "op", word
+
+    def _literal(self, pos: int) -> tuple:
+        """Body of a (...) string starting after the paren: balanced parens and backslash escapes."""
+        data = self.data
+        out = bytearray()
+        depth = 1
+        while pos < len(data):
+            c = data[pos:pos + 1]
+            if c == b"\\":
+                nxt = data[pos + 1:pos + 2]
+                if nxt in _ESCAPES:
+                    out += _ESCAPES[nxt]
+                    pos += 2
+                elif nxt and nxt in b"01234567":
+                    m = _OCTAL.match(data[pos + 1:pos + 4])
+                    out.append(int(m.group(), 8) & 0xFF)
+                    pos += 1 + len(m.group())
+                elif nxt in (b"\r", b"\n"):
+                    pos += 3 if data[pos + 1:pos + 3] == b"\r\n" else 2
+                else:
+                    # Any other escaped byte (including \8 and \9) stands for itself.
+                    out += nxt
+                    pos += 2
+                continue
+            if c == b"(":
+                depth += 1
+            elif c == b")":
+                depth -= 1
+                if not depth:
+                    return bytes(out), pos + 1
+            out += c
+            pos += 1
+        return bytes(out), pos
+
+
+def _parse(lex: _Lexer):
+    """One PDF value: dict, list, _Ref, str (name), bytes (string), number, bool or None."""
+    kind, value = lex.next()
+    if kind == "punct" and value == b"<<":
+        result = {}
+        while True:
+            kind, key = lex.next()
+            if kind is None or (kind == "punct" and key == b">>"):
+                return result
+            result[key] = _parse(lex)
+    if kind == "punct" and value == b"[":
+        items = []
+        while True:
+            save = lex.pos
+            kind, item = lex.next()
+            if kind is None or (kind == "punct" and item == b"]"):
+                return items
+            lex.pos = save
+            items.append(_parse(lex))
+    if kind == "num" and isinstance(value, int):
+        save = lex.pos
+        kind2, _ = lex.next()
+        kind3, value3 = lex.next()
+        if kind2 == "num" and kind3 == "op" and value3 == b"R":
+            return _Ref(value)
+        lex.pos = save
+    if kind == "op":
+        return _KEYWORDS.get(value, value)
+    return value
+
+
+def _decode_stream(stream: _Stream):
+    """Decoded stream bytes, or None for filters other than FlateDecode (images and the like)."""
+    filters = stream.dict.get("Filter") or []
+    if isinstance(filters, str):
+        filters = [filters]
+    data = stream.raw
+    for name in filters:
+        if name not in ("FlateDecode", "Fl"):
+            return None
+        try:
+            data = zlib.decompressobj().decompress(data)
+        except zlib.error:
+            return None
+    return data
+
+
+class _Font:
+    __slots__ = ("mapping", "width")
+
+    def __init__(self, mapping: dict, width: int):
+        self.mapping = mapping
+        self.width = width
+
+    def decode(self, raw: bytes) -> str:
+        if self.width == 1 and not self.mapping:
+            return raw.decode("cp1252", errors="replace")
+        chars = []
+        for i in range(0, len(raw) - self.width + 1, self.width):
+            code = int.from_bytes(raw[i:i + self.width], "big")
+            text = self.mapping.get(code)
+            if text is None and self.width == 1:
+                text = bytes([code]).decode("cp1252", errors="replace")
+            chars.append(text or "")
+        return "".join(chars)
+
+
+def _utf16(raw: bytes) -> str:
+    return raw.decode("utf-16-be", errors="ignore") if len(raw) % 2 == 0 else raw.decode("latin-1")
+
+
+def _parse_cmap(data: bytes) -> tuple:
+    """(code width in bytes, {code: text}) from a ToUnicode CMap."""
+    lex = _Lexer(data)
+    mapping = {}
+    width = None
+    operands = []
+    while True:
+        save = lex.pos
+        kind, value = lex.next()
+        if kind is None:
+            break
+        if kind != "op":
+            lex.pos = save
+            operands.append(_parse(lex))
+            continue
+        if value == b"endcodespacerange" and operands and width is None:
+            width = len(operands[0]) if isinstance(operands[0], bytes) else None
+        elif value == b"endbfchar":
+            for src, dst in zip(operands[0::2], operands[1::2]):
+                if isinstance(src, bytes) and isinstance(dst, bytes):
+                    mapping[int.from_bytes(src, "big")] = _utf16(dst)
+        elif value == b"endbfrange":
+            for lo, hi, dst in zip(operands[0::3], operands[1::3], operands[2::3]):
+                if not (isinstance(lo, bytes) and isinstance(hi, bytes)):
+                    continue
+                lo, hi = int.from_bytes(lo, "big"), int.from_bytes(hi, "big")
+                if isinstance(dst, list):
+                    for offset, item in enumerate(dst[:hi - lo + 1]):
+                        if isinstance(item, bytes):
+                            mapping[lo + offset] = _utf16(item)
+                elif isinstance(dst, bytes) and hi - lo < 0x10000:
+                    base = _utf16(dst)
+                    for offset in range(hi - lo + 1):
+                        mapping[lo + offset] = base[:-1] + chr(ord(base[-1]) + offset) if base else ""
+        operands = []
+    return width, mapping
+
+
+class _PDFReader:
+    """Just enough of a PDF reader to walk the page tree and pull text from content streams."""
+
+    def __init__(self, data):
+        self.data = data
+        # Scanning for "n 0 obj" is robust to broken xref tables; later definitions win.
+        self._offsets = {int(m.group(1)): m.end() for m in _OBJ_HEADER.finditer(data)}
+        self._objects = {}
+        self._packed = None
+        self._fonts = {}
+
+    def get(self, num: int):
+        if num not in self._objects:
+            if num in self._offsets:
+                self._objects[num] = self._read(self._offsets[num])
+            else:
+                self._objects[num] = self._packed_objects().get(num)
+        return self._objects[num]
+
+    def resolve(self, value):
+        seen = 0
+        while isinstance(value, _Ref) and seen < 32:
+            value = self.get(value.num)
+            seen += 1
+        return value
+
+    def _read(self, offset: int):
+        lex = _Lexer(self.data, offset)
+        value = _parse(lex)
+        if not isinstance(value, dict):
+            return value
+        save = lex.pos
+        kind, keyword = lex.next()
+        if kind != "op" or keyword != b"stream":
+            lex.pos = save
+            return value
+        start = lex.pos
+        if self.data[start:start + 2] == b"\r\n":
+            start += 2
+        elif self.data[start:start + 1] in (b"\r", b"\n"):
+            start += 1
+        length = self.resolve(value.get("Length"))
+        if not isinstance(length, int) or self.data[start + length:start + length + 20].find(b"endstream") < 0:
+            length = max(0, self.data.find(b"endstream", start) - start)
+        return _Stream(value, self.data[start:start + length])
+
+    def _packed_objects(self) -> dict:
+        """Objects stored inside /Type/ObjStm object streams, loaded on the first miss."""
+        if self._packed is None:
+            self._packed = {}
+            for offset in self._offsets.values():
+                if b"/ObjStm" not in self.data[offset:offset + 256]:
+                    continue
+                stream = self._read(offset)
+                if not isinstance(stream, _Stream) or stream.dict.get("Type") != "ObjStm":
+                    continue
+                body = _decode_stream(stream)
+                if body is None:
+                    continue
+                lex = _Lexer(body)
+                header = [lex.next()[1] for _ in range(2 * int(stream.dict.get("N", 0)))]
+                first = int(stream.dict.get("First", 0))
+                for num, rel in zip(header[0::2], header[1::2]):
+                    if isinstance(num, int) and isinstance(rel, int):
+                        self._packed.setdefault(num, _parse(_Lexer(body, first + rel)))
+        return self._packed
+
+    def pages(self):
+        """Yield (page dict, resources dict) in document order."""
+        roots = _ROOT.findall(self.data)
+        if not roots:
+            raise ValueError("no document catalog (/Root) found")
+        catalog = self.resolve(self.get(int(roots[-1])))
+        if not isinstance(catalog, dict):
+            raise ValueError("document catalog is not a dictionary")
+        yield from self._walk(catalog.get("Pages"), None, set())
+
+    def _walk(self, node, resources, seen: set):
+        if isinstance(node, _Ref):
+            if node.num in seen:
+                return
+            seen.add(node.num)
+        node = self.resolve(node)
+        if not isinstance(node, dict):
+            return
+        resources = node.get("Resources", resources)
+        if "Kids" in node:
+            for kid in self.resolve(node["Kids"]) or []:
+                yield from self._walk(kid, resources, seen)
+        else:
+            yield node, self.resolve(resources) or {}
+
+    def _font(self, ref) -> _Font:
+        key = ref.num if isinstance(ref, _Ref) else id(ref)
+        if key not in self._fonts:
+            font = self.resolve(ref)
+            font = font if isinstance(font, dict) else {}
+            width = 2 if font.get("Subtype") == "Type0" else 1
+            mapping = {}
+            to_unicode = self.resolve(font.get("ToUnicode"))
+            if isinstance(to_unicode, _Stream):
+                cmap = _decode_stream(to_unicode)
+                if cmap:
+                    cmap_width, mapping = _parse_cmap(cmap)
+                    width = cmap_width or width
+            self._fonts[key] = _Font(mapping, width)
+        return self._fonts[key]
+
+    def page_text(self, page: dict, resources: dict) -> str:
+        contents = self.resolve(page.get("Contents"))
+        streams = contents if isinstance(contents, list) else [contents]
+        parts = []
+        for stream in streams:
+            stream = self.resolve(stream)
+            if isinstance(stream, _Stream):
+                decoded = _decode_stream(stream)
+                if decoded:
+                    parts.append(decoded)
+        fonts = self.resolve(resources.get("Font")) or {}
+        return _show_text(b"\n".join(parts), {name: self._font(ref) for name, ref in fonts.items()})
+
+
+_SINGLE_BYTE = _Font({}, 1)
+
+
+def _show_text(content: bytes, fonts: dict) -> str:
+    """Interpret the text operators of a content stream; a move to a new baseline starts a new line."""
+    lex = _Lexer(content)
+    out = []
+    operands = []
+    font = _SINGLE_BYTE
+    y = 0.0
+    leading = 0.0
+    line_y = None
+
+    def show(text: str):
+        nonlocal line_y
+        if line_y is not None and abs(y - line_y) > 1:
+            out.append("\n")
+        line_y = y
+        out.append(text)
+
+    while True:
+        save = lex.pos
+        kind, op = lex.next()
+        if kind is None:
+            break
+        if kind != "op" or op in _KEYWORDS:
+            lex.pos = save
+            operands.append(_parse(lex))
+            continue
+        args = operands
+        operands = []
+        nums = [a for a in args if isinstance(a, (int, float))]
+        if op == b"BI":
+            end = content.find(b"EI", lex.pos)
+            lex.pos = len(content) if end < 0 else end + 2
+        elif op == b"BT":
+            y = 0.0
+        elif op == b"Tf" and args and isinstance(args[0], str):
+            font = fonts.get(args[0], _SINGLE_BYTE)
+        elif op == b"TL" and nums:
+            leading = nums[0]
+        elif op in (b"Td", b"TD") and len(nums) >= 2:
+            y += nums[1]
+            if op == b"TD":
+                leading = -nums[1]
+        elif op == b"Tm" and len(nums) >= 6:
+            y = nums[5]
+        elif op == b"T*":
+            y -= leading or 12
+        elif op in (b"Tj", b"'", b'"') and args and isinstance(args[-1], bytes):
+            if op != b"Tj":
+                y -= leading or 12
+            show(font.decode(args[-1]))
+        elif op == b"TJ" and args and isinstance(args[0], list):
+            pieces = []
+            for item in args[0]:
+                if isinstance(item, bytes):
+                    pieces.append(font.decode(item))
+                elif isinstance(item, (int, float)) and item < -250 and pieces and not pieces[-1].endswith(" "):
+                    # A large negative adjustment is a word gap in PDFs that omit space glyphs.
+                    pieces.append(" ")
+            show("".join(pieces))
+    return "".join(out)
+
+
+def _iter_pdf_pages_stdlib(data):
+    reader = _PDFReader(data)
+    for page, resources in reader.pages():
+        yield reader.page_text(page, resources)
+
+
+def iter_pdf_pages(path: str):
+    """Yield the text of each page of a PDF, reading the file through a memory map."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            try:
+                from pypdf import PdfReader
+            except ImportError:
+                yield from _iter_pdf_pages_stdlib(data)
+                return
+            for page in PdfReader(data).pages:
+                yield page.extract_text() or ""
+
+
+# ------------------------------------------------------------------------------
+# Documents
+# ------------------------------------------------------------------------------
+
+def iter_pages(path: str):
+    """Pages of a document: one per PDF page, a single one for HTML and plain text."""
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == ".pdf":
+        for page in iter_pdf_pages(path):
+            yield normalize_whitespace(page)
+    elif suffix in (".html", ".htm"):
+        yield extract_html(path)
+    else:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            yield normalize_whitespace(f.read())
+
+
+def extract_text(path: str) -> str:
+    return "\n\n".join(page for page in iter_pages(path) if page)
+
+
+def document_id(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def expand_paths(paths) -> list:
+    """Files and directories -> document files; directories are listed (not recursed) in name order."""
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith(DOCUMENT_SUFFIXES))
+        else:
+            files.append(path)
+    return files
+
+
+def _extract_job(path: str) -> tuple:
+    """Pool task: (text, error) so one unreadable file does not end the whole stream."""
+    try:
+        return extract_text(path), None
+    except Exception as e:
+        return "", f"{type(e).__name__}: {e}"
+
+
+def _usable(results):
+    """(doc_id, text) for each (path, (text, error)); failed and empty documents are reported and skipped."""
+    for path, (text, error) in results:
+        if error:
+            print(f"{path}: skipping, text extraction failed ({error})", file=sys.stderr)
+        elif not text:
+            print(f"{path}: skipping, no text extracted (scanned image?)", file=sys.stderr)
+        else:
+            yield document_id(path), text
+
+
+def iter_documents(paths, workers: int = None):
+    """
+    Yield (doc_id, text) for every document under `paths`, in order. Up to 2 x workers
+    files are extracted ahead in a process pool, so the consumer is never waiting on
+    a CPU-bound extraction it could have overlapped with its LLM calls.
+    """
+    files = expand_paths(paths)
+    workers = workers or INGEST_WORKERS
+    if workers <= 1 or len(files) <= 1:
+        yield from _usable((path, _extract_job(path)) for path in files)
+    else:
+        yield from _usable(_extract_in_pool(files, workers))
+
+
+def _extract_in_pool(files: list, workers: int):
+    """(path, (text, error)) in input order, with up to 2 x workers extractions in flight."""
+    window = deque()
+    # Callers are usually already running LLM threads, and forking a threaded process is unsafe.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = iter(files)
+        for path in pending:
+            window.append((path, pool.submit(_extract_job, path)))
+            if len(window) >= 2 * workers:
+                break
+        while window:
+            path, future = window.popleft()
+            next_path = next(pending, None)
+            if next_path is not None:
+                window.append((next_path, pool.submit(_extract_job, next_path)))
+            yield path, future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract text from PDF/HTML documents as JSONL.")
+    parser.add_argument("paths", nargs="+", help="files or directories of .pdf/.html/.txt documents")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: INGEST_WORKERS)")
+    args = parser.parse_args()
+    for doc_id, text in iter_documents(args.paths, args.workers):
+        sys.stdout.write(json.dumps({"id": doc_id, "text": text}, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
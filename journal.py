@@ -0,0 +1,202 @@
+"""
+Write-ahead journal that makes long screening runs resumable.
+
+Every journaled call (parse_jd, parse_resume, match_jd_and_resume) is keyed by a
+hash of its inputs. Before the work starts a "begin" record is appended; when it
+finishes with a usable result (not a Fallback), a "done" record holding the
+result is appended and fsync'ed. On restart the journal is replayed: done keys
+are answered from it without touching the LLM, and keys that began but never
+finished were in flight when the previous run died, so they simply run again.
+
+    RUN_JOURNAL=runs/screening.journal python batch_screen.py ...
+
+One JSON object per line, so a record torn by a crash is at most the last line,
+which is cut off on the next open.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+import metrics
+from parse_cache import normalize_text
+
+
+def journal_key(kind: str, version: str, arguments: list) -> str:
+    """Hash of a call's inputs; strings are whitespace-normalized like parse cache keys."""
+    material = json.dumps([kind, version] + [normalize_text(a) if isinstance(a, str) else a for a in arguments],
+                          ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class Journal:
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self.replayed = 0     # done records loaded from a previous run
+        self.interrupted = 0  # keys that began in a previous run but never finished
+        self.skipped = 0      # calls answered from the journal in this run
+        self.retried = 0      # interrupted keys run again in this run
+        self.written = 0
+        self._lock = threading.Lock()
+        self._done = {}  # key -> result as JSON text, so every caller gets its own copy
+        self._in_flight = set()
+        self._replay()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                # The previous run died mid-append; drop the partial record.
+                f.truncate(end)
+                print(f"Journal {self.path}: dropped a partial record at the end.", file=sys.stderr)
+        bad = 0
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+                key, op = record["key"], record["op"]
+            except (ValueError, KeyError, TypeError):
+                bad += 1
+                continue
+            if op == "begin":
+                self._in_flight.add(key)
+            elif op == "done":
+                self._in_flight.discard(key)
+                self._done[key] = json.dumps(record.get("value"), ensure_ascii=False)
+        self.replayed = len(self._done)
+        self.interrupted = len(self._in_flight)
+        if bad:
+            print(f"Journal {self.path}: skipped {bad} unreadable records.", file=sys.stderr)
+
+    def _append(self, record: dict, sync: bool):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if sync and self.fsync:
+                os.fsync(self._file.fileno())
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._done.get(key)
+            if value is None:
+                return None
+            self.skipped += 1
+        return json.loads(value)
+
+    def begin(self, key: str, kind: str):
+        with self._lock:
+            if key in self._in_flight:
+                self._in_flight.discard(key)
+                self.retried += 1
+        # Only an intent record; losing it in a crash loses nothing but the retry count.
+        self._append({"op": "begin", "kind": kind, "key": key, "ts": time.time()}, sync=False)
+
+    def commit(self, key: str, kind: str, value):
+        self._append({"op": "done", "kind": kind, "key": key, "ts": time.time(), "value": value}, sync=True)
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._done[key] = payload
+            self.written += 1
+
+    def summary(self) -> str:
+        return (f"Journal {self.path}: {self.replayed} results replayed ({self.interrupted} were in flight), "
+                f"{self.skipped} calls skipped, {self.retried} retried, {self.written} new results written.")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class NullJournal:
+    """Stand-in used when journaling is disabled."""
+
+    def get(self, key: str):
+        return None
+
+    def begin(self, key: str, kind: str):
+        pass
+
+    def commit(self, key: str, kind: str, value):
+        pass
+
+    def summary(self) -> str:
+        return "Journal disabled."
+
+    def close(self):
+        pass
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """RUN_JOURNAL selects the journal file; unset or "off" disables journaling."""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                path = os.environ.get("RUN_JOURNAL", "")
+                _journal = NullJournal() if path.lower() in ("", "off", "none") else Journal(path)
+    return _journal
+
+
+def set_journal(journal):
+    global _journal
+    with _journal_lock:
+        _journal = journal
+
+
+class Fallback(dict):
+    """
+    A stand-in result (e.g. match defaults after the re-prompt also failed). Callers
+    use it like the dict it is; journaled() returns it without recording it.
+    """
+
+
+def journaled(kind: str, version: str):
+    """
+    Decorator: answer repeated calls from the journal and record new results.
+    Falsy results (failed parses, rejected matches) and Fallback results are not
+    recorded, so they are retried.
+    The wrapped function gets a journal_key(*args, **kwargs) attribute for callers that
+    produce the same result another way (batched matching).
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def key_for(*args, **kwargs) -> str:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return journal_key(kind, version, list(bound.arguments.values()))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            journal = get_journal()
+            if isinstance(journal, NullJournal):
+                return func(*args, **kwargs)
+            key = key_for(*args, **kwargs)
+            value = journal.get(key)
+            if value is not None:
+                metrics.inc("journal_replayed_total", kind=kind)
+                return value
+            journal.begin(key, kind)
+            value = func(*args, **kwargs)
+            if value and not isinstance(value, Fallback):
+                journal.commit(key, kind, value)
+            return value
+        wrapper.journal_key = key_for
+        return wrapper
+    return decorator
@@ -0,0 +1,239 @@
+"""
+Single-pass repair of JSON-ish model output.
+
+Handles the failure modes we see from local models: code fences and prose around
+(or between) objects, missing closing braces/brackets, trailing or missing commas,
+unterminated strings, single-quoted strings, unquoted keys and words, Python
+literals (True/False/None), and unescaped quotes inside strings.
+"""
+import json
+import re
+from json.encoder import encode_basestring
+
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?$")
+_KEY_TOKEN = re.compile(r"[^\s:,{}\[\]\"']+")
+_VALUE_TOKEN = re.compile(r"[^,{}\[\]\n\"]+")
+_SKIP = re.compile(r"[\s,]+")
+_HEX4 = re.compile(r"[0-9a-fA-F]{4}")
+_STRING_STOP = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+_LITERALS = {"true": "true", "false": "false", "null": "null",
+             "True": "true", "False": "false", "None": "null"}
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "'": "'"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+# Object member states: expecting a key, a colon after a key, or a value after a colon.
+_KEY, _COLON, _VALUE = 0, 1, 2
+
+
+def _string_closes(text: str, j: int) -> bool:
+    """
+    A quote only ends a string if it is followed by a delimiter (or the end), or by
+    whitespace and another quote: '"x" "b": 2' is a missing comma, not an inner quote.
+    """
+    n = len(text)
+    quote = text[j]
+    j += 1
+    while j < n and text[j] in " \t\r":
+        j += 1
+    return j >= n or text[j] in ",:}]\n" or (text[j] == quote and text[j - 1] in " \t\r")
+
+
+def _read_string(text: str, i: int) -> tuple:
+    """Read a quoted string starting at text[i]; return (python_str, index_after)."""
+    quote = text[i]
+    stop = _STRING_STOP[quote]
+    n = len(text)
+    chars = []
+    j = i + 1
+    while j < n:
+        m = stop.search(text, j)
+        if not m:
+            chars.append(text[j:])
+            break
+        chars.append(text[j:m.start()])
+        j = m.start()
+        ch = text[j]
+        if ch == "\\" and j + 1 < n:
+            nxt = text[j + 1]
+            if nxt == "u" and _HEX4.fullmatch(text, j + 2, j + 6):
+                chars.append(chr(int(text[j + 2:j + 6], 16)))
+                j += 6
+                continue
+            if nxt in _ESCAPES:
+                chars.append(_ESCAPES[nxt])
+            else:
+                chars.append("\\" + nxt)
+            j += 2
+            continue
+        if ch == quote and _string_closes(text, j):
+            return "".join(chars), j + 1
+        chars.append(ch)
+        j += 1
+    return "".join(chars), n
+
+
+class _Container:
+    __slots__ = ("opener", "count", "state")
+
+    def __init__(self, opener: str):
+        self.opener = opener
+        self.count = 0
+        self.state = _KEY
+
+
+def _close(out: list, frame: _Container):
+    if frame.opener == "{":
+        if frame.state == _COLON:
+            out.append(":null")
+        elif frame.state == _VALUE:
+            out.append("null")
+    out.append(_CLOSERS[frame.opener])
+
+
+def repair_one(text: str, start: int) -> tuple:
+    """
+    Repair the JSON value opening at text[start] ('{' or '[').
+    Returns (json_text, index_after) where index_after is just past the point where
+    the top-level value closed (or len(text) if it never did).
+    """
+    out = []
+    stack = []
+    n = len(text)
+    i = start
+
+    def begin_value() -> bool:
+        # Emit whatever separator the enclosing container needs before a value.
+        # Returns False when the value is really an unquoted key.
+        if not stack:
+            return True
+        frame = stack[-1]
+        if frame.opener == "[":
+            if frame.count:
+                out.append(",")
+            frame.count += 1
+            return True
+        if frame.state == _KEY:
+            return False
+        if frame.state == _COLON:
+            out.append(":")
+        frame.state = _KEY
+        frame.count += 1
+        return True
+
+    def emit_key(key: str):
+        frame = stack[-1]
+        if frame.count:
+            out.append(",")
+        out.append(encode_basestring(key))
+        frame.state = _COLON
+
+    while i < n:
+        ch = text[i]
+        if ch in " \t\r\n,":
+            # Commas are re-derived from structure, which fixes trailing and missing ones.
+            i = _SKIP.match(text, i).end()
+        elif ch in "{[":
+            if stack and stack[-1].opener == "{" and stack[-1].state == _KEY:
+                emit_key("")
+            begin_value()
+            stack.append(_Container(ch))
+            out.append(ch)
+            i += 1
+        elif ch in "}]":
+            # A mismatched closer still closes only the innermost container: for
+            # '["a", "b"}' the model forgot ']' and the '}' belongs to the object.
+            i += 1
+            _close(out, stack.pop())
+            if not stack:
+                return "".join(out), i
+        elif ch == ":":
+            if stack and stack[-1].opener == "{" and stack[-1].state == _COLON:
+                out.append(":")
+                stack[-1].state = _VALUE
+            i += 1
+        elif ch in "\"'":
+            value, i = _read_string(text, i)
+            if begin_value():
+                out.append(encode_basestring(value))
+            else:
+                emit_key(value)
+        else:
+            in_key = stack and stack[-1].opener == "{" and stack[-1].state == _KEY
+            m = (_KEY_TOKEN if in_key else _VALUE_TOKEN).match(text, i)
+            if not m:
+                i += 1
+                continue
+            token = m.group().strip()
+            i = m.end()
+            if not token:
+                continue
+            if in_key:
+                emit_key(token)
+                continue
+            parts = token.split()
+            if len(parts) > 1 and all(p in _LITERALS or _NUMBER.match(p) for p in parts):
+                # Missing commas between scalars, e.g. [1 2 3].
+                for part in parts:
+                    begin_value()
+                    out.append(_LITERALS.get(part, part))
+                continue
+            begin_value()
+            if token in _LITERALS:
+                out.append(_LITERALS[token])
+            elif _NUMBER.match(token):
+                out.append(token)
+            else:
+                out.append(encode_basestring(token))
+    while stack:
+        _close(out, stack.pop())
+    return "".join(out), n
+
+
+_decoder = json.JSONDecoder()
+
+
+def _strip_fences(text: str) -> str:
+    return text.replace("```json", "").replace("```", "")
+
+
+def repair_json(text: str, openers: str = "{") -> str:
+    """Return repaired JSON text for the first top-level value, or "" if there is none."""
+    text = _strip_fences(text)
+    starts = [p for p in (text.find(o) for o in openers) if p != -1]
+    if not starts:
+        return ""
+    return repair_one(text, min(starts))[0]
+
+
+def parse_model_json(raw_output: str) -> dict:
+    """
+    Parse a model response into a dict, repairing it if needed. Repair stops at the
+    first balanced top-level object; after it, only well-formed JSON objects are
+    taken, so braces in trailing prose cannot add keys. If the model split its answer
+    into several objects with prose in between, their keys are merged (earlier
+    objects win). Returns {} when nothing usable is found.
+    """
+    text = _strip_fences(raw_output)
+    merged = None
+    pos = text.find("{")
+    while pos != -1:
+        # Well-formed objects go through the C decoder; only a broken first one is repaired.
+        try:
+            value, pos = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            if merged is not None:
+                pos = text.find("{", pos + 1)
+                continue
+            repaired, pos = repair_one(text, pos)
+            try:
+                value = json.loads(repaired)
+            except json.JSONDecodeError:
+                value = None
+        if isinstance(value, dict):
+            if merged is None:
+                merged = value
+            else:
+                for key, sub in value.items():
+                    merged.setdefault(key, sub)
+        pos = text.find("{", pos)
+    return merged if merged is not None else {}
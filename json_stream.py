@@ -0,0 +1,91 @@
+import json
+
+
+class JSONObjectScanner:
+    """
+    Incremental scanner that finds the end of the first top-level JSON object in a
+    token stream. It tracks string literals and escapes, so braces inside strings do
+    not count. Anything before the first '{' (prose, code fences) is skipped.
+
+        scanner = JSONObjectScanner(("job_title", "required_skills"))
+        for piece in tokens:
+            if scanner.feed(piece):
+                break           # scanner.result() holds the complete object
+
+    With `expected_keys`, a balanced object only counts if it parses to a dict that
+    has all of them; anything else ("use {x} format" in prose, half of an answer the
+    model split in two) is skipped and scanning goes on, so the output stays whole for
+    parse_model_json to repair or merge.
+    """
+
+    def __init__(self, expected_keys=()):
+        self.expected_keys = tuple(expected_keys)
+        self._parts = []
+        self.depth = 0
+        self.started = False
+        self.done = False
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> bool:
+        """Consume the next piece of output; return True once the object is closed."""
+        if self.done:
+            return True
+        start = 0
+        while True:
+            if not self.started:
+                start = text.find("{", start)
+                if start == -1:
+                    return False
+                self.started = True
+            closed = self._scan(text, start)
+            if closed is None:
+                return False
+            if self._accept():
+                self.done = True
+                return True
+            self._reset()
+            start = closed
+
+    def _scan(self, text: str, start: int):
+        """Index just past the closing brace if the object closes in `text`, else None."""
+        for i in range(start, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{" or ch == "[":
+                self.depth += 1
+            elif ch == "}" or ch == "]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self._parts.append(text[start:i + 1])
+                    return i + 1
+        self._parts.append(text[start:])
+        return None
+
+    def _accept(self) -> bool:
+        if not self.expected_keys:
+            return True
+        try:
+            value = json.loads(self.result())
+        except json.JSONDecodeError:
+            return False
+        return isinstance(value, dict) and all(key in value for key in self.expected_keys)
+
+    def _reset(self):
+        self._parts = []
+        self.depth = 0
+        self.started = False
+        self._in_string = False
+        self._escape = False
+
+    def result(self) -> str:
+        """The object text seen so far (complete once feed() has returned True)."""
+        return "".join(self._parts)
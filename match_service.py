@@ -0,0 +1,218 @@
+"""
+Resident HTTP service around the parse and match functions.
+
+    python match_service.py --port 8080
+
+    POST /parse_jd       {"text": "...", "model": "llama3.2"}            -> {"jd_info": {...}}
+    POST /parse_resume   {"text": "...", "model": "llama3.2"}            -> {"resume_info": {...}}
+    POST /match          {"jd_text" | "jd_info", "resume_text" | "resume_info", "model"}
+                         -> {"match_result": {...}, "jd_info": {...}, "resume_info": {...}, "cached": false}
+    GET  /stats, /health
+
+Requests run at the "interactive" scheduler class; bulk clients sharing the service
+send "priority": "batch" so they only use capacity interactive lookups leave idle.
+
+The backend connection pool and the parse cache live for the whole process.
+Identical concurrent requests (same normalized text, or same parsed dict) share a
+single in-flight LLM call, and finished results are kept in an in-memory TTL/LRU memo.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from journal import Fallback
+from ollama_run import (JD_PROMPT_VERSION, RESUME_PROMPT_VERSION, WARMUP_ENABLED, default_parallelism,
+                        match_jd_and_resume, parse_jd, parse_resume, print_warmup_report, warm_up)
+from parse_cache import SingleFlight, cache_key, get_parse_cache
+from scheduler import get_scheduler, priority
+
+MODEL = "llama3.2"
+MEMO_TTL = float(os.environ.get("MATCH_MEMO_TTL", "3600"))
+MEMO_MAX_ENTRIES = int(os.environ.get("MATCH_MEMO_MAX_ENTRIES", "10000"))
+
+
+class TTLMemo:
+    """LRU map whose entries also expire `ttl` seconds after they were stored."""
+
+    def __init__(self, max_entries: int = MEMO_MAX_ENTRIES, ttl: float = MEMO_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class MatchService:
+    def __init__(self, model: str = MODEL, memo: TTLMemo = None):
+        self.model = model
+        self.memo = memo or TTLMemo()
+        self.flight = SingleFlight()
+
+    def _memoized(self, key: str, fn, keep=bool):
+        """Returns (value, cached). Only results for which keep(result) is true are memoized."""
+        value = self.memo.get(key)
+        if value is not None:
+            return value, True
+
+        def compute():
+            result = fn()
+            if keep(result):
+                self.memo.put(key, result)
+            return result
+        return self.flight.do(key, compute), False
+
+    def parse_jd(self, text: str, model: str):
+        key = cache_key("jd", text, model, JD_PROMPT_VERSION)
+        return self._memoized(key, lambda: parse_jd(text, model))
+
+    def parse_resume(self, text: str, model: str):
+        key = cache_key("resume", text, model, RESUME_PROMPT_VERSION)
+        return self._memoized(key, lambda: parse_resume(text, model))
+
+    @staticmethod
+    def _side_key(kind: str, text, info, model: str, version: str) -> str:
+        if text is not None:
+            return cache_key(kind, text, model, version)
+        material = json.dumps(info, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def match(self, request: dict, model: str) -> dict:
+        jd_text, jd_info = request.get("jd_text"), request.get("jd_info")
+        resume_text, resume_info = request.get("resume_text"), request.get("resume_info")
+        if (jd_text is None) == (jd_info is None) or (resume_text is None) == (resume_info is None):
+            raise ValueError("give exactly one of jd_text/jd_info and one of resume_text/resume_info")
+        key = "match:" + ":".join([
+            self._side_key("jd", jd_text, jd_info, model, JD_PROMPT_VERSION),
+            self._side_key("resume", resume_text, resume_info, model, RESUME_PROMPT_VERSION),
+            model,
+        ])
+
+        def compute():
+            jd = jd_info if jd_info is not None else self.parse_jd(jd_text, model)[0]
+            resume = resume_info if resume_info is not None else self.parse_resume(resume_text, model)[0]
+            if not jd or not resume:
+                return {}
+            return {"jd_info": jd, "resume_info": resume, "match_result": match_jd_and_resume(jd, resume, model)}
+
+        # Fallback defaults stand in for a failed match; the next request should try again.
+        result, cached = self._memoized(
+            key, compute, lambda r: bool(r and r["match_result"]) and not isinstance(r["match_result"], Fallback))
+        if not result:
+            raise RuntimeError("parsing the JD or resume failed")
+        return dict(result, cached=cached)
+
+    def stats(self) -> dict:
+        return {"memo": self.memo.stats(), "coalesced": self.flight.coalesced,
+                "parse_cache": get_parse_cache().stats(), "scheduler": get_scheduler(default_parallelism).stats()}
+
+
+def make_handler(service: MatchService):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            print(f"{self.address_string()} {fmt % args}", file=sys.stderr)
+
+        def _send_json(self, body: dict, status: int = 200):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json({"status": "ok"})
+            elif self.path == "/stats":
+                self._send_json(service.stats())
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(request, dict):
+                    raise ValueError("request body must be a JSON object")
+            except ValueError as e:
+                self._send_json({"error": f"bad request: {e}"}, 400)
+                return
+            model = request.get("model") or service.model
+            try:
+                with priority(request.get("priority") or "interactive"):
+                    if self.path in ("/parse_jd", "/parse_resume"):
+                        text = request.get("text")
+                        if not isinstance(text, str):
+                            raise ValueError("'text' is required")
+                        if self.path == "/parse_jd":
+                            info, cached = service.parse_jd(text, model)
+                            self._send_json({"jd_info": info, "cached": cached})
+                        else:
+                            info, cached = service.parse_resume(text, model)
+                            self._send_json({"resume_info": info, "cached": cached})
+                    elif self.path == "/match":
+                        self._send_json(service.match(request, model))
+                    else:
+                        self._send_json({"error": "not found"}, 404)
+            except ValueError as e:
+                self._send_json({"error": str(e)}, 400)
+            except Exception as e:
+                self._send_json({"error": str(e)}, 502)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve parse and match over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--no-warmup", action="store_true")
+    args = parser.parse_args()
+
+    if WARMUP_ENABLED and not args.no_warmup:
+        print_warmup_report(warm_up(args.model))
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MatchService(args.model)))
+    server.daemon_threads = True
+    print(f"Matching service listening on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
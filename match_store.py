@@ -0,0 +1,220 @@
+"""
+Typed match records and a columnar on-disk store for bulk match results.
+
+MatchRecord parses a match_result dict once ("85%" -> 85.0, levels as ints) into
+__slots__ objects. MatchStore keeps many of them as memory-mapped NumPy columns,
+one per field, so ranking queries are vectorized scans instead of JSON parsing:
+
+    store = MatchStore("results/matches")
+    store.append([MatchRecord.from_result("jd-1", "r-9", match_result), ...])
+    store.top_k("jd-1", k=50)        # [(resume_id, Final_match_score, match_level), ...]
+
+Reasoning strings are not stored; keep the JSONL output for those. Requires numpy.
+"""
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+DIMENSIONS = ("education", "work_and_project_experience", "skills", "experience_year", "Final_match")
+_PERCENT = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def parse_score(value) -> float:
+    """'85%', '85', 85, None -> 85.0 / 0.0."""
+    if isinstance(value, bool) or value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _PERCENT.search(str(value))
+    return float(match.group()) if match else 0.0
+
+
+def parse_level(value) -> int:
+    try:
+        return min(7, max(0, int(value)))
+    except (TypeError, ValueError):
+        return 0
+
+
+class DimensionScore:
+    __slots__ = ("level", "score", "reasoning")
+
+    def __init__(self, level: int, score: float, reasoning: str = ""):
+        self.level = level
+        self.score = score
+        self.reasoning = reasoning
+
+    @classmethod
+    def from_dict(cls, sub, score_key: str = "match_score") -> "DimensionScore":
+        if not isinstance(sub, dict):
+            return cls(0, 0.0)
+        return cls(parse_level(sub.get("match_level")), parse_score(sub.get(score_key)),
+                   str(sub.get("reasoning", "")))
+
+    def to_dict(self, score_key: str = "match_score") -> dict:
+        return {"match_level": self.level, score_key: f"{self.score:g}%", "reasoning": self.reasoning}
+
+
+class MatchRecord:
+    __slots__ = ("jd_id", "resume_id") + DIMENSIONS
+
+    def __init__(self, jd_id: str, resume_id: str, **scores):
+        self.jd_id = jd_id
+        self.resume_id = resume_id
+        for dim in DIMENSIONS:
+            setattr(self, dim, scores.get(dim) or DimensionScore(0, 0.0))
+
+    @classmethod
+    def from_result(cls, jd_id: str, resume_id: str, match_result: dict) -> "MatchRecord":
+        match_result = match_result or {}
+        scores = {dim: DimensionScore.from_dict(match_result.get(dim)) for dim in DIMENSIONS[:-1]}
+        scores["Final_match"] = DimensionScore.from_dict(match_result.get("Final_match"), "Final_match_score")
+        return cls(str(jd_id), str(resume_id), **scores)
+
+    @property
+    def final_score(self) -> float:
+        return self.Final_match.score
+
+    def to_result(self) -> dict:
+        """The nested dict shape match_jd_and_resume returns."""
+        result = {dim: getattr(self, dim).to_dict() for dim in DIMENSIONS[:-1]}
+        result["Final_match"] = self.Final_match.to_dict("Final_match_score")
+        return result
+
+
+class _Vocab:
+    """String id <-> int32 code, persisted one id per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ids = []
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.ids = [line.rstrip("\n") for line in f]
+        self.codes = {doc_id: code for code, doc_id in enumerate(self.ids)}
+        self._pending = []
+
+    def code(self, doc_id: str) -> int:
+        code = self.codes.get(doc_id)
+        if code is None:
+            code = self.codes[doc_id] = len(self.ids)
+            self.ids.append(doc_id)
+            self._pending.append(doc_id)
+        return code
+
+    def flush(self):
+        if self._pending:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(doc_id + "\n" for doc_id in self._pending))
+            self._pending = []
+
+
+class MatchStore:
+    """
+    Columnar store in `path`:
+      jd.i4, resume.i4                  int32 codes into jd_ids.txt / resume_ids.txt
+      <dimension>.level.u1, .score.f4   one level and one score column per dimension
+      meta.json                         row count (replaced atomically last)
+    Columns are memory-mapped and grown by doubling, like VectorIndex.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._meta_path = os.path.join(path, "meta.json")
+        self.count = 0
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding="utf-8") as f:
+                self.count = json.load(f)["count"]
+        self._jds = _Vocab(os.path.join(path, "jd_ids.txt"))
+        self._resumes = _Vocab(os.path.join(path, "resume_ids.txt"))
+        self._specs = {"jd": np.int32, "resume": np.int32}
+        for dim in DIMENSIONS:
+            self._specs[f"{dim}.level"] = np.uint8
+            self._specs[f"{dim}.score"] = np.float32
+        self._columns = {}
+        self._capacity = 0
+        existing = os.path.join(path, "jd.i4")
+        if os.path.exists(existing):
+            self._open(max(self.count, os.path.getsize(existing) // 4))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _file(self, name: str) -> str:
+        suffix = {np.int32: "i4", np.uint8: "u1", np.float32: "f4"}[self._specs[name]]
+        return os.path.join(self.path, f"{name}.{suffix}")
+
+    def _open(self, capacity: int):
+        for name, dtype in self._specs.items():
+            size = capacity * np.dtype(dtype).itemsize
+            with open(self._file(name), "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            self._columns[name] = np.memmap(self._file(name), dtype=dtype, mode="r+", shape=(capacity,))
+        self._capacity = capacity
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self._capacity:
+            return
+        for column in self._columns.values():
+            column.flush()
+        self._columns = {}
+        self._open(max(rows, 2 * self._capacity, 4096))
+
+    def _save_meta(self):
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"count": self.count, "dimensions": list(DIMENSIONS)}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._meta_path)
+
+    def append(self, records: list) -> int:
+        if not records:
+            return 0
+        with self._lock:
+            start, end = self.count, self.count + len(records)
+            self._ensure_capacity(end)
+            cols = self._columns
+            cols["jd"][start:end] = [self._jds.code(r.jd_id) for r in records]
+            cols["resume"][start:end] = [self._resumes.code(r.resume_id) for r in records]
+            for dim in DIMENSIONS:
+                cols[f"{dim}.level"][start:end] = [getattr(r, dim).level for r in records]
+                cols[f"{dim}.score"][start:end] = [getattr(r, dim).score for r in records]
+            for column in cols.values():
+                column.flush()
+            self._jds.flush()
+            self._resumes.flush()
+            self.count = end
+            self._save_meta()
+        return len(records)
+
+    def column(self, name: str) -> "np.ndarray":
+        """Read-only view of the first `count` rows of a column, e.g. "skills.score"."""
+        with self._lock:
+            view = self._columns[name][:self.count].view() if self.count else np.empty(0, self._specs[name])
+        view.flags.writeable = False
+        return view
+
+    def top_k(self, jd_id: str, k: int = 50, dimension: str = "Final_match") -> list:
+        """Best resumes for one JD by a dimension's score: [(resume_id, score, level), ...]."""
+        code = self._jds.codes.get(jd_id)
+        if code is None or not self.count:
+            return []
+        rows = np.flatnonzero(self.column("jd") == code)
+        if not len(rows):
+            return []
+        scores = self.column(f"{dimension}.score")[rows]
+        if len(rows) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(rows))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        levels = self.column(f"{dimension}.level")
+        resumes = self.column("resume")
+        return [(self._resumes.ids[resumes[rows[i]]], float(scores[i]), int(levels[rows[i]])) for i in best]
@@ -0,0 +1,264 @@
+"""
+In-process metrics for the screening pipeline: per-stage wall time, LLM token
+counts and throughput, and JSON repair / retry / fallback counters.
+
+    with timed("parse_jd"):
+        ...
+    observe("llm_prompt_tokens", 812, stage="parse_jd")
+    inc("json_parse_total", result="repaired", stage="match")
+
+At the end of a run export_all() writes a JSON summary and a Prometheus text file.
+"""
+import contextlib
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+# Default buckets by unit; histograms pick them from their name suffix.
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160, 320, 640)
+RESERVOIR_SIZE = 2048
+
+HELP = {
+    "stage_seconds": "Wall time per pipeline stage.",
+    "llm_call_seconds": "Wall time per LLM call.",
+    "llm_prompt_tokens": "Prompt tokens evaluated per LLM call.",
+    "llm_completion_tokens": "Completion tokens generated per LLM call.",
+    "llm_tokens_per_second": "Generation throughput reported by the backend.",
+    "llm_calls_total": "LLM calls issued.",
+    "llm_errors_total": "LLM calls that failed in the backend.",
+    "json_parse_total": "Model outputs by parse result (clean, repaired, failed).",
+    "match_retry_total": "Match re-prompts and fallbacks.",
+    "input_tokens_saved_total": "Estimated prompt tokens removed by input compaction.",
+    "warmup_seconds": "Model warm-up time by phase (load, prefix, first_call).",
+    "scheduler_wait_seconds": "Time an LLM call waited for a scheduler slot, by priority class.",
+    "journal_replayed_total": "Parse and match calls answered from the run journal.",
+    "cascade_tier_seconds": "Wall time per cascade tier attempt, by stage and model.",
+    "cascade_escalations_total": "Cascade escalations to a larger model, by stage, model and reason.",
+}
+
+
+def _buckets_for(name: str) -> tuple:
+    if name.endswith("_seconds"):
+        return SECONDS_BUCKETS
+    if name.endswith("_tokens"):
+        return TOKEN_BUCKETS
+    return RATE_BUCKETS
+
+
+class Histogram:
+    """Cumulative buckets for Prometheus plus a bounded reservoir for percentiles."""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._samples = []
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        if len(self._samples) < RESERVOIR_SIZE:
+            self._samples.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < RESERVOIR_SIZE:
+                self._samples[slot] = value
+
+    def percentile(self, q: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": round(self.percentile(0.50), 6),
+            "p95": round(self.percentile(0.95), 6),
+            "p99": round(self.percentile(0.99), 6),
+        }
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(_buckets_for(name))
+            hist.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counter_value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def histogram(self, name: str, **labels):
+        with self._lock:
+            return self._histograms.get(self._key(name, labels))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def to_dict(self) -> dict:
+        def label_str(labels):
+            return ",".join(f"{k}={v}" for k, v in labels) or "all"
+
+        out = {"histograms": {}, "counters": {}, "rates": {}}
+        with self._lock:
+            for (name, labels), hist in sorted(self._histograms.items()):
+                out["histograms"].setdefault(name, {})[label_str(labels)] = hist.summary()
+            for (name, labels), value in sorted(self._counters.items()):
+                out["counters"].setdefault(name, {})[label_str(labels)] = value
+            counters = dict(self._counters)
+
+        parsed = {labels: v for (name, labels), v in counters.items() if name == "json_parse_total"}
+        total = sum(parsed.values())
+        if total:
+            for outcome in ("repaired", "failed"):
+                hits = sum(v for labels, v in parsed.items() if ("result", outcome) in labels)
+                out["rates"][f"json_{outcome}_rate"] = round(hits / total, 4)
+        matches = sum(v for (name, labels), v in counters.items()
+                      if name == "llm_calls_total" and ("stage", "match") in labels)
+        if matches:
+            for kind in ("reprompt", "fallback"):
+                hits = sum(v for (name, labels), v in counters.items()
+                           if name == "match_retry_total" and ("kind", kind) in labels)
+                out["rates"][f"match_{kind}_rate"] = round(hits / matches, 4)
+        return out
+
+    def to_prometheus(self, prefix: str = "resume_jd_") -> str:
+        lines = []
+        with self._lock:
+            hist_names = sorted({name for name, _ in self._histograms})
+            counter_names = sorted({name for name, _ in self._counters})
+            for name in hist_names:
+                metric = prefix + name
+                lines.append(f"# HELP {metric} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} histogram")
+                for (hname, labels), hist in sorted(self._histograms.items()):
+                    if hname != name:
+                        continue
+                    base = [f'{k}="{v}"' for k, v in labels]
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lbl = ",".join(base + [f'le="{bound}"'])
+                        lines.append(f"{metric}_bucket{{{lbl}}} {cumulative}")
+                    lbl = ",".join(base + ['le="+Inf"'])
+                    lines.append(f"{metric}_bucket{{{lbl}}} {hist.count}")
+                    suffix = "{" + ",".join(base) + "}" if base else ""
+                    lines.append(f"{metric}_sum{suffix} {hist.sum}")
+                    lines.append(f"{metric}_count{suffix} {hist.count}")
+            for name in counter_names:
+                metric = prefix + name
+                lines.append(f"# HELP {metric} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} counter")
+                for (cname, labels), value in sorted(self._counters.items()):
+                    if cname != name:
+                        continue
+                    suffix = "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+                    lines.append(f"{metric}{suffix} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+_local = threading.local()
+
+
+def observe(name: str, value: float, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+
+def inc(name: str, amount: float = 1, **labels):
+    REGISTRY.inc(name, amount, **labels)
+
+
+def current_stage() -> str:
+    """The innermost stage being timed on this thread, used to label LLM calls."""
+    stack = getattr(_local, "stages", None)
+    return stack[-1] if stack else "other"
+
+
+@contextlib.contextmanager
+def timed(stage: str):
+    stack = getattr(_local, "stages", None)
+    if stack is None:
+        stack = _local.stages = []
+    stack.append(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe("stage_seconds", time.perf_counter() - start, stage=stage)
+        stack.pop()
+
+
+def timed_stage(stage: str):
+    """Decorator form of timed()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_llm_call(seconds: float, response, stage: str = None):
+    """Record wall time and the token counters an LLMResponse carries."""
+    stage = stage or current_stage()
+    REGISTRY.inc("llm_calls_total", stage=stage)
+    REGISTRY.observe("llm_call_seconds", seconds, stage=stage)
+    if response.prompt_eval_count:
+        REGISTRY.observe("llm_prompt_tokens", response.prompt_eval_count, stage=stage)
+    if response.eval_count:
+        REGISTRY.observe("llm_completion_tokens", response.eval_count, stage=stage)
+        duration = response.eval_duration / 1e9 if response.eval_duration else seconds
+        if duration > 0:
+            REGISTRY.observe("llm_tokens_per_second", response.eval_count / duration, stage=stage)
+
+
+def export_all(directory: str = None, basename: str = "run_metrics") -> tuple:
+    """
+    Write <basename>.json and <basename>.prom into METRICS_DIR (default ./metrics).
+    Returns the two paths.
+    """
+    directory = directory or os.environ.get("METRICS_DIR", "metrics")
+    os.makedirs(directory, exist_ok=True)
+    json_path = os.path.join(directory, basename + ".json")
+    prom_path = os.path.join(directory, basename + ".prom")
+    for path, content in ((json_path, json.dumps(REGISTRY.to_dict(), indent=2)),
+                          (prom_path, REGISTRY.to_prometheus())):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    return json_path, prom_path
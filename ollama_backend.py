@@ -0,0 +1,1033 @@
+import codecs
+import contextlib
+import http.client
+import json
+import os
+import queue
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from scheduler import get_scheduler
+
+DEFAULT_HOST = "http://127.0.0.1:11434"
+# Deadline for one call, in seconds; a hung generation fails instead of stalling the run.
+DEFAULT_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", "300"))
+
+
+class BackendError(Exception):
+    """
+    Raised when a backend cannot produce a completion (transport or server error).
+    `status` is the HTTP status for server errors; transport failures carry the
+    underlying OSError (ConnectionError, TimeoutError, ...) as __cause__.
+    `cancelled` marks a call aborted by its caller, `deadline_exceeded` one that ran
+    out of the caller's overall time before it could start.
+    """
+
+    def __init__(self, message: str, status: int = None, cancelled: bool = False,
+                 deadline_exceeded: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.cancelled = cancelled
+        self.deadline_exceeded = deadline_exceeded
+
+    @property
+    def transient(self) -> bool:
+        """Worth retrying: the transport failed, timed out, or the server was overloaded."""
+        return isinstance(self.__cause__, OSError) or (self.status is not None and
+                                                       (self.status >= 500 or self.status == 429))
+
+
+class Cancellation:
+    """
+    Lets one thread abort a call running in another (the losing attempt of a hedged
+    call). Backends register an abort for the resource they are blocked on, such as
+    the socket or the child process, and unregister it once the call is over.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._aborts = {}
+        self._lock = threading.Lock()
+
+    def register(self, key, abort) -> bool:
+        """False if the call was already cancelled; abort() is then not registered."""
+        with self._lock:
+            if not self.cancelled:
+                self._aborts[key] = abort
+            return not self.cancelled
+
+    def unregister(self, key):
+        with self._lock:
+            self._aborts.pop(key, None)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            aborts, self._aborts = list(self._aborts.values()), {}
+        for abort in aborts:
+            abort()
+
+
+def _remaining(deadline: float, timeout: float) -> float:
+    """Seconds left for one call: its own timeout, capped by the caller's overall deadline."""
+    if deadline is None:
+        return timeout
+    left = deadline - time.monotonic()
+    if left <= 0:
+        # Not transient: retrying cannot help once the caller's time is up.
+        raise BackendError("call deadline exceeded", deadline_exceeded=True)
+    return min(timeout, left)
+
+
+@contextlib.contextmanager
+def _abortable(cancel: Cancellation, key, abort):
+    if cancel is None:
+        yield
+        return
+    if not cancel.register(key, abort):
+        raise BackendError("call cancelled", cancelled=True)
+    try:
+        yield
+    finally:
+        cancel.unregister(key)
+
+
+class LLMResponse:
+    """
+    Text plus the timing/token counters Ollama reports for one call.
+    Durations are in nanoseconds, as returned by the REST API.
+    `constrained` is True when the server decoded against a `format` JSON schema.
+    `error` is set (and text empty) when the call failed in the backend, so callers can
+    tell a dead backend from output that merely needs repair.
+    """
+    __slots__ = ("text", "prompt_eval_count", "prompt_eval_duration",
+                 "eval_count", "eval_duration", "load_duration", "total_duration", "constrained", "error")
+
+    def __init__(self, text: str, prompt_eval_count: int = 0, prompt_eval_duration: int = 0,
+                 eval_count: int = 0, eval_duration: int = 0, load_duration: int = 0,
+                 total_duration: int = 0, constrained: bool = False, error: str = None):
+        self.text = text
+        self.constrained = constrained
+        self.error = error
+        self.prompt_eval_count = prompt_eval_count
+        self.prompt_eval_duration = prompt_eval_duration
+        self.eval_count = eval_count
+        self.eval_duration = eval_duration
+        self.load_duration = load_duration
+        self.total_duration = total_duration
+
+    @classmethod
+    def from_api(cls, text: str, body: dict, constrained: bool = False) -> "LLMResponse":
+        return cls(
+            text,
+            constrained=constrained,
+            prompt_eval_count=body.get("prompt_eval_count", 0) or 0,
+            prompt_eval_duration=body.get("prompt_eval_duration", 0) or 0,
+            eval_count=body.get("eval_count", 0) or 0,
+            eval_duration=body.get("eval_duration", 0) or 0,
+            load_duration=body.get("load_duration", 0) or 0,
+            total_duration=body.get("total_duration", 0) or 0,
+        )
+
+
+class SubprocessBackend:
+    """
+    The original path: spawn `ollama run <model>` per prompt and read stdout.
+    Kept as a fallback for machines where the REST API is not reachable.
+    The CLI cannot take a `format` schema, so output is never constrained.
+
+    All backends accept `stop_when`: a callable fed each piece of output as it is
+    generated. Once it returns True the generation is cancelled and the text so far
+    is returned. generate/chat also take `deadline` (a time.monotonic() value that
+    caps the call's own timeout) and `cancel` (a Cancellation to abort it from
+    another thread).
+    """
+    name = "subprocess"
+
+    def __init__(self, executable: str = "ollama", timeout: float = DEFAULT_TIMEOUT):
+        self.executable = executable
+        self.timeout = timeout
+
+    def generate(self, system_prompt: str, user_prompt: str, model: str, stop_when=None, deadline: float = None,
+                 cancel: Cancellation = None, **options) -> LLMResponse:
+        prompt_text = f"SYSTEM:\n{system_prompt}\n\nUSER:\n{user_prompt}\n\nASSISTANT:\n"
+        return self._run(prompt_text, model, stop_when, options.get("keep_alive"), deadline, cancel)
+
+    def chat(self, messages: list, model: str, stop_when=None, deadline: float = None,
+             cancel: Cancellation = None, **options) -> LLMResponse:
+        parts = [f"{m['role'].upper()}:\n{m['content']}" for m in messages]
+        prompt_text = "\n\n".join(parts) + "\n\nASSISTANT:\n"
+        return self._run(prompt_text, model, stop_when, options.get("keep_alive"), deadline, cancel)
+
+    def embed(self, texts: list, model: str) -> list:
+        raise BackendError("the ollama CLI cannot compute embeddings; use the REST backend")
+
+    def preload(self, model: str, keep_alive: str = None) -> LLMResponse:
+        """`ollama run` with no prompt loads the model and exits."""
+        return self._run("", model, keep_alive=keep_alive)
+
+    def running_models(self):
+        """The CLI has no machine-readable `ps`; None means unknown."""
+        return None
+
+    def context_length(self, model: str):
+        """Unknown (None) through the CLI."""
+        return None
+
+    def _run(self, prompt_text: str, model: str, stop_when=None, keep_alive: str = None, deadline: float = None,
+             cancel: Cancellation = None) -> LLMResponse:
+        cmd = [self.executable, "run", model]
+        if keep_alive:
+            cmd[2:2] = ["--keepalive", keep_alive]
+        timeout = _remaining(deadline, self.timeout)
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise BackendError(f"could not start {self.executable}: {e}") from e
+        with _abortable(cancel, proc, proc.kill):
+            if stop_when is not None:
+                return self._run_streaming(proc, cmd, prompt_text, stop_when, timeout, cancel)
+            try:
+                stdout, stderr = proc.communicate(prompt_text.encode("utf-8"), timeout=timeout)
+            except subprocess.TimeoutExpired as e:
+                proc.kill()
+                proc.communicate()
+                raise BackendError(f"{self.executable} run {model}: no result after {timeout:g}s") \
+                    from TimeoutError(str(e))
+        if cancel is not None and cancel.cancelled:
+            raise BackendError(f"{self.executable} run {model}: call cancelled", cancelled=True)
+        if proc.returncode != 0:
+            raise BackendError(stderr.decode("utf-8", "replace").strip() or f"exit code {proc.returncode}")
+        return LLMResponse(stdout.decode("utf-8", "replace"))
+
+    def _run_streaming(self, proc: subprocess.Popen, cmd: list, prompt_text: str, stop_when, timeout: float,
+                       cancel: Cancellation = None) -> LLMResponse:
+        stderr_parts = []
+
+        def feed_and_drain():
+            try:
+                proc.stdin.write(prompt_text.encode("utf-8"))
+                proc.stdin.close()
+            except OSError:
+                pass
+            stderr_parts.append(proc.stderr.read())
+
+        helper = threading.Thread(target=feed_and_drain, daemon=True)
+        helper.start()
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            proc.kill()
+
+        watchdog = threading.Timer(timeout, expire)
+        watchdog.daemon = True
+        watchdog.start()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pieces = []
+        stopped = False
+        while True:
+            data = proc.stdout.read1(4096)
+            if not data:
+                break
+            piece = decoder.decode(data)
+            pieces.append(piece)
+            if stop_when(piece):
+                proc.kill()
+                stopped = True
+                break
+        proc.wait()
+        watchdog.cancel()
+        helper.join()
+        proc.stdout.close()
+        if timed_out.is_set():
+            raise BackendError(f"{cmd[0]} run: no result after {timeout:g}s") from TimeoutError()
+        if cancel is not None and cancel.cancelled:
+            raise BackendError(f"{cmd[0]} run: call cancelled", cancelled=True)
+        if not stopped and proc.returncode != 0:
+            err = b"".join(stderr_parts).decode("utf-8", "replace").strip()
+            raise BackendError(err or f"exit code {proc.returncode}")
+        return LLMResponse("".join(pieces))
+
+
+_STAT_KEYS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "load_duration",
+              "total_duration")
+
+
+class HTTPBackend:
+    """
+    Keep-alive client for the Ollama REST API (/api/generate, /api/chat).
+    Connections are pooled so concurrent callers each reuse an open socket
+    instead of paying a TCP handshake (or a process spawn) per prompt.
+    stop_when is ignored for calls with a `format` schema: they are sent without
+    streaming, since constrained decoding stops at the closing brace by itself.
+    """
+    name = "http"
+
+    def __init__(self, host: str = None, pool_size: int = 8, timeout: float = DEFAULT_TIMEOUT):
+        self.host = (host or os.environ.get("OLLAMA_HOST") or DEFAULT_HOST).rstrip("/")
+        if "://" not in self.host:
+            self.host = "http://" + self.host
+        parts = urlsplit(self.host)
+        self._scheme = parts.scheme
+        self._netloc = parts.netloc
+        self.timeout = timeout
+        self.format_supported = True  # cleared when the server rejects a JSON schema `format`
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self._scheme == "https":
+            return http.client.HTTPSConnection(self._netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self._netloc, timeout=self.timeout)
+
+    def _acquire(self) -> http.client.HTTPConnection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def _release(self, conn: http.client.HTTPConnection):
+        if conn.timeout != self.timeout:
+            self._set_timeout(conn, self.timeout)
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @staticmethod
+    def _set_timeout(conn: http.client.HTTPConnection, timeout: float):
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+    @staticmethod
+    def _abort(conn: http.client.HTTPConnection):
+        """Unblock a read in another thread; close() alone does not wake a pending recv."""
+        sock = conn.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _send(self, method: str, path: str, payload: dict = None, timeout: float = None,
+              cancel: Cancellation = None) -> tuple:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        # A pooled socket may have been closed by the server while idle; retry once on a fresh one.
+        for attempt in range(2):
+            conn = self._acquire()
+            if timeout is not None and timeout != self.timeout:
+                self._set_timeout(conn, timeout)
+            if cancel is not None and not cancel.register(conn, lambda conn=conn: self._abort(conn)):
+                self._release(conn)
+                raise BackendError(f"{self.host}{path}: call cancelled", cancelled=True)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                conn.close()
+                self._disarm(conn, cancel)
+                if attempt == 0 and not (cancel and cancel.cancelled):
+                    continue
+                raise self._error(path, e, cancel)
+            except OSError as e:
+                conn.close()
+                self._disarm(conn, cancel)
+                raise self._error(path, e, cancel)
+        raise BackendError(f"{self.host}{path}: connection failed")
+
+    @staticmethod
+    def _disarm(conn: http.client.HTTPConnection, cancel: Cancellation):
+        if cancel is not None:
+            cancel.unregister(conn)
+
+    def _error(self, path: str, e: Exception, cancel: Cancellation = None, cause: Exception = None) -> BackendError:
+        """The BackendError for a transport failure, with `cause` (default `e`) as its __cause__."""
+        if cancel is not None and cancel.cancelled:
+            # Raised from the aborted socket; not a failure of the server, so not transient.
+            return BackendError(f"{self.host}{path}: call cancelled", cancelled=True)
+        error = BackendError(f"{self.host}{path}: {e}")
+        error.__cause__ = cause or e
+        return error
+
+    def _finish(self, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse):
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+    def request(self, method: str, path: str, payload: dict = None, deadline: float = None,
+                cancel: Cancellation = None) -> dict:
+        conn, resp = self._send(method, path, payload, _remaining(deadline, self.timeout), cancel)
+        try:
+            data = resp.read()
+        except OSError as e:
+            conn.close()
+            raise self._error(path, e, cancel)
+        except http.client.HTTPException as e:
+            conn.close()
+            raise self._error(path, e, cancel, ConnectionError(str(e)))
+        finally:
+            # Unregister the abort before the socket can go back to the pool.
+            self._disarm(conn, cancel)
+        self._finish(conn, resp)
+        if resp.status != 200:
+            raise BackendError(f"{self.host}{path}: HTTP {resp.status} {data[:200]!r}", resp.status)
+        try:
+            return json.loads(data) if data else {}
+        except json.JSONDecodeError as e:
+            raise BackendError(f"{self.host}{path}: bad response body") from e
+
+    def stream(self, path: str, payload: dict, extract, stop_when, deadline: float = None,
+               cancel: Cancellation = None) -> tuple:
+        """
+        POST a streaming request and read NDJSON chunks until the final one or until
+        stop_when(piece) is True. Returns (text, stats_body).
+
+        Ollama only reports token counts and durations in the final chunk. On an early
+        stop the stats are whatever earlier chunks carried, with eval_count set to the
+        chunks read (one token each), prompt_eval_duration to the time to the first
+        chunk and eval_duration to the time after it; prompt_eval_count stays unknown (0).
+        Closing the connection is the only way to make the server cancel the generation,
+        so an early-stopped call costs its pooled socket; the next call opens a new one.
+        """
+        sent = time.monotonic()
+        timeout = _remaining(deadline, self.timeout)
+        deadline = sent + timeout
+        conn, resp = self._send("POST", path, payload, timeout, cancel)
+        try:
+            return self._read_stream(conn, resp, path, extract, stop_when, sent, deadline, timeout, cancel)
+        finally:
+            self._disarm(conn, cancel)
+
+    def _read_stream(self, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse, path: str, extract,
+                     stop_when, sent: float, deadline: float, timeout: float, cancel: Cancellation) -> tuple:
+        if resp.status != 200:
+            data = resp.read()
+            self._disarm(conn, cancel)
+            self._finish(conn, resp)
+            raise BackendError(f"{self.host}{path}: HTTP {resp.status} {data[:200]!r}", resp.status)
+        pieces = []
+        stats = {}
+        first = None
+        try:
+            while True:
+                if time.monotonic() > deadline:
+                    # The socket timeout bounds each read; this bounds the whole generation.
+                    raise TimeoutError(f"generation exceeded {timeout:g}s")
+                line = resp.readline()
+                if not line:
+                    break
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    conn.close()
+                    raise BackendError(f"{self.host}{path}: {chunk['error']}")
+                first = first or time.monotonic()
+                pieces.append(extract(chunk))
+                stats.update((k, v) for k, v in chunk.items() if k in _STAT_KEYS and v)
+                if chunk.get("done"):
+                    resp.read()
+                    # Unregister the abort before the socket can go back to the pool.
+                    self._disarm(conn, cancel)
+                    self._finish(conn, resp)
+                    return "".join(pieces), chunk
+                if stop_when(pieces[-1]):
+                    conn.close()
+                    break
+        except (OSError, json.JSONDecodeError) as e:
+            conn.close()
+            raise self._error(path, e, cancel)
+        except http.client.HTTPException as e:
+            conn.close()
+            raise self._error(path, e, cancel, ConnectionError(str(e)))
+        conn.close()
+        if cancel is not None and cancel.cancelled:
+            # The aborted socket reads as a clean end of stream.
+            raise BackendError(f"{self.host}{path}: call cancelled", cancelled=True)
+        now = time.monotonic()
+        stats.setdefault("eval_count", len(pieces))
+        if first is not None:
+            stats.setdefault("prompt_eval_duration", int((first - sent) * 1e9))
+            stats.setdefault("eval_duration", int((now - first) * 1e9))
+        stats.setdefault("total_duration", int((now - sent) * 1e9))
+        return "".join(pieces), stats
+
+    def _complete(self, path: str, payload: dict, extract, stop_when, deadline: float = None,
+                  cancel: Cancellation = None) -> LLMResponse:
+        if not self.format_supported:
+            payload.pop("format", None)
+        constrained = payload.get("format") is not None
+        # Constrained decoding already ends at the closing brace; a full response
+        # also keeps the final stats chunk (prompt_eval_count etc.).
+        scan = None if constrained else stop_when
+        payload["stream"] = scan is not None
+        try:
+            if scan is None:
+                body = self.request("POST", path, payload, deadline, cancel)
+                return LLMResponse.from_api(extract(body), body, constrained)
+            text, body = self.stream(path, payload, extract, scan, deadline, cancel)
+            return LLMResponse.from_api(text, body, constrained)
+        except BackendError as e:
+            # Ollama before structured outputs rejects a schema `format` with HTTP 400;
+            # fall back to unconstrained output, which the JSON repair path handles.
+            if not constrained or e.status != 400 or "format" not in str(e):
+                raise
+            print(f"{self.host} rejected the JSON schema format ({e}); sending unconstrained requests.",
+                  file=sys.stderr)
+            self.format_supported = False
+            return self._complete(path, payload, extract, stop_when, deadline, cancel)
+
+    def generate(self, system_prompt: str, user_prompt: str, model: str, stop_when=None, deadline: float = None,
+                 cancel: Cancellation = None, **options) -> LLMResponse:
+        payload = {"model": model, "system": system_prompt, "prompt": user_prompt}
+        payload.update({k: v for k, v in options.items() if v is not None})
+        return self._complete("/api/generate", payload, lambda c: c.get("response", ""), stop_when, deadline,
+                              cancel)
+
+    def chat(self, messages: list, model: str, stop_when=None, deadline: float = None, cancel: Cancellation = None,
+             **options) -> LLMResponse:
+        payload = {"model": model, "messages": messages}
+        payload.update({k: v for k, v in options.items() if v is not None})
+        return self._complete("/api/chat", payload, lambda c: c.get("message", {}).get("content", ""), stop_when,
+                              deadline, cancel)
+
+    def preload(self, model: str, keep_alive: str = None) -> LLMResponse:
+        """A generate request without a prompt loads the model and pins it for keep_alive."""
+        payload = {"model": model, "stream": False}
+        if keep_alive:
+            payload["keep_alive"] = keep_alive
+        return LLMResponse.from_api("", self.request("POST", "/api/generate", payload))
+
+    def running_models(self) -> list:
+        """Names of the models currently loaded on the server (/api/ps)."""
+        body = self.request("GET", "/api/ps")
+        return [m.get("name") or m.get("model") for m in body.get("models", [])]
+
+    def context_length(self, model: str):
+        """The model's trained context length from /api/show, or None if it does not say."""
+        body = self.request("POST", "/api/show", {"model": model})
+        for key, value in (body.get("model_info") or {}).items():
+            if key.endswith(".context_length") and isinstance(value, int):
+                return value
+        return None
+
+    def embed(self, texts: list, model: str) -> list:
+        """Embed a batch of texts with /api/embed; returns one vector per text."""
+        body = self.request("POST", "/api/embed", {"model": model, "input": texts})
+        embeddings = body.get("embeddings")
+        if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+            raise BackendError(f"{self.host}/api/embed: expected {len(texts)} embeddings")
+        return embeddings
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class FallbackBackend:
+    """
+    Use `primary` until it fails to connect, then switch to `secondary` for the rest of the run.
+    Server-side errors (HTTP status) are not treated as a reason to switch.
+    """
+
+    def __init__(self, primary, secondary):
+        self.primary = primary
+        self.secondary = secondary
+        self._use_secondary = False
+
+    @property
+    def name(self) -> str:
+        return self.secondary.name if self._use_secondary else self.primary.name
+
+    def _call(self, method: str, *args, **options) -> LLMResponse:
+        if not self._use_secondary:
+            try:
+                return getattr(self.primary, method)(*args, **options)
+            except BackendError as e:
+                if not isinstance(e.__cause__, ConnectionError):
+                    raise
+                print(f"Ollama REST API unreachable ({e}); falling back to {self.secondary.name}.",
+                      file=sys.stderr)
+                self._use_secondary = True
+        return getattr(self.secondary, method)(*args, **options)
+
+    def generate(self, system_prompt: str, user_prompt: str, model: str, **options) -> LLMResponse:
+        return self._call("generate", system_prompt, user_prompt, model, **options)
+
+    def chat(self, messages: list, model: str, **options) -> LLMResponse:
+        return self._call("chat", messages, model, **options)
+
+    def embed(self, texts: list, model: str) -> list:
+        return self._call("embed", texts, model)
+
+    def preload(self, model: str, keep_alive: str = None) -> LLMResponse:
+        return self._call("preload", model, keep_alive)
+
+    def running_models(self):
+        return self._call("running_models")
+
+    def context_length(self, model: str):
+        return self._call("context_length", model)
+
+
+class _Endpoint:
+    __slots__ = ("backend", "outstanding", "healthy", "retry_at", "requests", "failures")
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.outstanding = 0
+        self.healthy = True
+        self.retry_at = 0.0
+        self.requests = 0
+        self.failures = 0
+
+
+class BalancedBackend:
+    """
+    Spread calls over several Ollama servers. Each call goes to the healthy endpoint
+    with the fewest requests in flight, never more than `max_inflight` per endpoint
+    (callers wait for a free slot). An endpoint that fails to answer, stalls past
+    `timeout` or returns a 5xx/429 is taken out of rotation and the call is retried
+    on another one; a background
+    health check (GET /api/tags) puts it back once it answers again.
+    """
+    name = "balanced"
+
+    def __init__(self, hosts: list, max_inflight: int = 4, timeout: float = 300.0,
+                 health_interval: float = 5.0):
+        if not hosts:
+            raise ValueError("BalancedBackend needs at least one host")
+        self.max_inflight = max_inflight
+        self.health_interval = health_interval
+        self._endpoints = [_Endpoint(HTTPBackend(h, pool_size=max_inflight, timeout=timeout)) for h in hosts]
+        self._cond = threading.Condition()
+        self._closed = False
+        self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+        self._health_thread.start()
+
+    @property
+    def capacity(self) -> int:
+        return self.max_inflight * len(self._endpoints)
+
+    def _acquire(self, exclude: set) -> _Endpoint:
+        with self._cond:
+            while True:
+                candidates = [e for e in self._endpoints if e.healthy and e not in exclude]
+                if not candidates:
+                    raise BackendError("no healthy Ollama endpoint") from ConnectionError(
+                        "all endpoints failed or are out of rotation")
+                free = [e for e in candidates if e.outstanding < self.max_inflight]
+                if free:
+                    endpoint = min(free, key=lambda e: (e.outstanding, e.requests))
+                    endpoint.outstanding += 1
+                    endpoint.requests += 1
+                    return endpoint
+                self._cond.wait()
+
+    def _release(self, endpoint: _Endpoint, failed: bool):
+        with self._cond:
+            endpoint.outstanding -= 1
+            if failed:
+                endpoint.failures += 1
+                endpoint.healthy = False
+                endpoint.retry_at = time.monotonic() + self.health_interval
+            self._cond.notify_all()
+
+    def _call(self, method: str, *args, **options):
+        tried = set()
+        last_error = None
+        while True:
+            try:
+                endpoint = self._acquire(tried)
+            except BackendError:
+                if last_error is None:
+                    raise
+                raise last_error
+            try:
+                result = getattr(endpoint.backend, method)(*args, **options)
+            except BackendError as e:
+                # A 4xx is the server's answer to the request and would be the same elsewhere.
+                # Transport failures, timeouts and 5xx/429 (broken or overloaded server) take
+                # the endpoint out of rotation and the call moves on to the next one.
+                failed = e.transient
+                self._release(endpoint, failed=failed)
+                if not failed:
+                    raise
+                print(f"Ollama endpoint {endpoint.backend.host} failed ({e}); taking it out of rotation.",
+                      file=sys.stderr)
+                tried.add(endpoint)
+                last_error = e
+                continue
+            self._release(endpoint, failed=False)
+            return result
+
+    def _health_loop(self):
+        while not self._closed:
+            time.sleep(self.health_interval / 2)
+            now = time.monotonic()
+            for endpoint in self._endpoints:
+                if endpoint.healthy or now < endpoint.retry_at:
+                    continue
+                try:
+                    endpoint.backend.request("GET", "/api/tags")
+                except BackendError:
+                    endpoint.retry_at = time.monotonic() + self.health_interval
+                    continue
+                with self._cond:
+                    endpoint.healthy = True
+                    self._cond.notify_all()
+
+    def generate(self, system_prompt: str, user_prompt: str, model: str, **options) -> LLMResponse:
+        return self._call("generate", system_prompt, user_prompt, model, **options)
+
+    def chat(self, messages: list, model: str, **options) -> LLMResponse:
+        return self._call("chat", messages, model, **options)
+
+    def embed(self, texts: list, model: str) -> list:
+        return self._call("embed", texts, model)
+
+    def preload(self, model: str, keep_alive: str = None) -> LLMResponse:
+        """Load the model on every healthy endpoint; returns the slowest load."""
+        slowest = None
+        for endpoint in [e for e in self._endpoints if e.healthy]:
+            try:
+                response = endpoint.backend.preload(model, keep_alive)
+            except BackendError as e:
+                print(f"Preload on {endpoint.backend.host} failed: {e}", file=sys.stderr)
+                continue
+            if slowest is None or response.load_duration > slowest.load_duration:
+                slowest = response
+        if slowest is None:
+            raise BackendError("preload failed on every endpoint") from ConnectionError(model)
+        return slowest
+
+    def running_models(self) -> list:
+        """Models loaded on every healthy endpoint."""
+        loaded = None
+        for endpoint in [e for e in self._endpoints if e.healthy]:
+            names = set(endpoint.backend.running_models())
+            loaded = names if loaded is None else loaded & names
+        return sorted(loaded or ())
+
+    def context_length(self, model: str):
+        """From the first healthy endpoint that answers; the servers run the same models."""
+        for endpoint in [e for e in self._endpoints if e.healthy]:
+            try:
+                return endpoint.backend.context_length(model)
+            except BackendError:
+                continue
+        return None
+
+    def stats(self) -> list:
+        with self._cond:
+            return [{"host": e.backend.host, "requests": e.requests, "failures": e.failures,
+                     "healthy": e.healthy, "outstanding": e.outstanding} for e in self._endpoints]
+
+    def close(self):
+        self._closed = True
+        for endpoint in self._endpoints:
+            endpoint.backend.close()
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass. After `threshold` consecutive failures (transient errors or
+    exceeded deadlines) it opens and calls fail fast for `reset_after` seconds; then
+    one trial call is let through (half-open) and its outcome closes or re-opens the
+    breaker. Cancelled and rejected calls neither count as failures nor reset them.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self._opened_at >= self.reset_after else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_after:
+                return False
+            self._trial = True
+            return True
+
+    def release(self):
+        """End a call that says nothing about the backend's health (cancelled, rejected)."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok: bool):
+        with self._lock:
+            was_trial, self._trial = self._trial, False
+            if ok:
+                self.failures = 0
+                self._opened_at = None
+                return
+            self.failures += 1
+            if was_trial or self.failures >= self.threshold:
+                if self._opened_at is None or was_trial:
+                    self.opened += 1
+                self._opened_at = time.monotonic()
+
+
+class ResilientBackend:
+    """
+    Wraps a backend with:
+      - retries with exponential backoff and jitter, for transient errors only
+        (transport failures, timeouts, HTTP 5xx/429); a bad request or unparseable
+        model output is not retried here
+      - optional hedging: if a generate/chat call has not finished after the recent
+        p95 latency for that model, a duplicate is sent and the first result wins; the
+        duplicate needs a free scheduler slot, and the losing attempt is cancelled
+      - a circuit breaker that sheds calls while the backend keeps failing
+    Each generate/chat attempt takes its own slot from the process-wide scheduler, so
+    a call backing off between retries does not hold one. From its first attempt on,
+    a call (retries and backoff included) ends within `timeout` seconds.
+    """
+
+    HEDGE_MIN_SAMPLES = 20
+
+    def __init__(self, inner, retries: int = 2, backoff: float = 0.5, hedge: bool = False,
+                 breaker: CircuitBreaker = None, timeout: float = DEFAULT_TIMEOUT):
+        self.inner = inner
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.shed = 0
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.inner.name
+
+    def _observe(self, key: str, seconds: float):
+        with self._lock:
+            window = self._latencies.get(key)
+            if window is None:
+                window = self._latencies[key] = deque(maxlen=200)
+            window.append(seconds)
+
+    def _hedge_delay(self, key: str):
+        with self._lock:
+            window = self._latencies.get(key)
+            if window is None or len(window) < self.HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(window)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def _hedged(self, method: str, key: str, args: tuple, options: dict):
+        delay = self._hedge_delay(key)
+        if delay is None:
+            return getattr(self.inner, method)(*args, **options)
+        outcomes = queue.Queue()
+        cancels = {False: Cancellation(), True: Cancellation()}
+        scheduler = get_scheduler(default_parallelism)
+
+        def attempt(opts, is_hedge, slot=None):
+            try:
+                outcomes.put((True, getattr(self.inner, method)(*args, **opts), is_hedge))
+            except BackendError as e:
+                outcomes.put((False, e, is_hedge))
+            finally:
+                if slot is not None:
+                    scheduler.release(slot)
+
+        threading.Thread(target=attempt, args=(dict(options, cancel=cancels[False]), False), daemon=True).start()
+        try:
+            ok, value, _ = outcomes.get(timeout=delay)
+            if ok:
+                return value
+            raise value
+        except queue.Empty:
+            pass
+        slot = scheduler.try_acquire()
+        if slot is None:
+            # Every slot is taken: the duplicate would only queue behind other calls.
+            ok, value, _ = outcomes.get()
+            if ok:
+                return value
+            raise value
+        with self._lock:
+            self.hedged += 1
+        # stop_when callbacks keep per-call state, so the duplicate runs without one.
+        hedge_options = dict(options, stop_when=None, cancel=cancels[True])
+        threading.Thread(target=attempt, args=(hedge_options, True, slot), daemon=True).start()
+        error = None
+        for _ in range(2):
+            ok, value, is_hedge = outcomes.get()
+            if ok:
+                # Close the loser's connection (or kill its process) so the server stops generating.
+                cancels[not is_hedge].cancel()
+                if is_hedge:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return value
+            error = value
+        raise error
+
+    @staticmethod
+    def _slot(method: str):
+        """Generate/chat attempts each hold a scheduler slot; backoff sleeps leave it to other calls."""
+        if method in ("generate", "chat"):
+            return get_scheduler(default_parallelism).slot()
+        return contextlib.nullcontext()
+
+    def _call(self, method: str, *args, **options):
+        key = f"{method}:{args[-1] if args else ''}"
+        deadline = None
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                with self._lock:
+                    self.shed += 1
+                raise BackendError(f"{self.inner.name} backend unhealthy (circuit open); call shed")
+            with self._slot(method):
+                if deadline is None:
+                    # One deadline for the whole call from its first attempt on, so retries
+                    # do not each get the full timeout. Waiting for the first slot is not counted.
+                    deadline = time.monotonic() + self.timeout
+                    if method in ("generate", "chat"):
+                        options = dict(options, deadline=deadline)
+                start = time.monotonic()
+                try:
+                    if self.hedge and method in ("generate", "chat"):
+                        result = self._hedged(method, key, args, options)
+                    else:
+                        result = getattr(self.inner, method)(*args, **options)
+                    error = None
+                except BackendError as e:
+                    error = e
+            if error is None:
+                self.breaker.record(True)
+                self._observe(key, time.monotonic() - start)
+                return result
+            if error.transient or error.deadline_exceeded:
+                self.breaker.record(False)
+            else:
+                # Cancelled by the caller, or a request the backend answered but refused
+                # (4xx, bad model): neither a failure nor proof the backend is healthy.
+                self.breaker.release()
+            pause = self.backoff * (2 ** attempt) * (0.5 + random.random())
+            if not error.transient or attempt == self.retries or time.monotonic() + pause >= deadline:
+                raise error
+            with self._lock:
+                self.retried += 1
+            time.sleep(pause)
+
+    def generate(self, system_prompt: str, user_prompt: str, model: str, **options) -> LLMResponse:
+        return self._call("generate", system_prompt, user_prompt, model, **options)
+
+    def chat(self, messages: list, model: str, **options) -> LLMResponse:
+        return self._call("chat", messages, model, **options)
+
+    def embed(self, texts: list, model: str) -> list:
+        return self._call("embed", texts, model)
+
+    def preload(self, model: str, keep_alive: str = None) -> LLMResponse:
+        return self._call("preload", model, keep_alive)
+
+    def running_models(self):
+        return self.inner.running_models()
+
+    def context_length(self, model: str):
+        return self.inner.context_length(model)
+
+    def resilience_stats(self) -> dict:
+        with self._lock:
+            return {"retried": self.retried, "hedged": self.hedged, "hedge_wins": self.hedge_wins,
+                    "shed": self.shed, "breaker": self.breaker.state, "breaker_opened": self.breaker.opened}
+
+
+def unwrap(backend):
+    """The backend doing the actual transport, under any Resilient/Fallback wrappers."""
+    while True:
+        inner = getattr(backend, "inner", None) or getattr(backend, "primary", None)
+        if inner is None:
+            return backend
+        backend = inner
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _http_from_env():
+    """One HTTPBackend, or a BalancedBackend when OLLAMA_HOSTS lists several servers."""
+    hosts = [h.strip() for h in os.environ.get("OLLAMA_HOSTS", "").split(",") if h.strip()]
+    if len(hosts) > 1:
+        return BalancedBackend(hosts, max_inflight=int(os.environ.get("OLLAMA_MAX_INFLIGHT", "4")))
+    return HTTPBackend(hosts[0] if hosts else None)
+
+
+def make_backend(kind: str = None):
+    """
+    Build a backend from OLLAMA_BACKEND: "http" (default, falls back to the CLI if the
+    server is unreachable), "http-only", or "subprocess". OLLAMA_HOSTS=host1,host2,...
+    balances the HTTP backends over several servers. Every kind is wrapped in a
+    ResilientBackend (OLLAMA_RETRIES, OLLAMA_HEDGE=1, OLLAMA_BREAKER_THRESHOLD,
+    OLLAMA_BREAKER_RESET); OLLAMA_TIMEOUT is the per-call deadline.
+    """
+    kind = (kind or os.environ.get("OLLAMA_BACKEND") or "http").lower()
+    if kind == "subprocess":
+        backend = SubprocessBackend()
+    elif kind == "http-only":
+        backend = _http_from_env()
+    elif kind == "http":
+        backend = FallbackBackend(_http_from_env(), SubprocessBackend())
+    else:
+        raise ValueError(f"Unknown OLLAMA_BACKEND: {kind}")
+    breaker = CircuitBreaker(int(os.environ.get("OLLAMA_BREAKER_THRESHOLD", "5")),
+                             float(os.environ.get("OLLAMA_BREAKER_RESET", "30")))
+    return ResilientBackend(backend, retries=int(os.environ.get("OLLAMA_RETRIES", "2")),
+                            hedge=os.environ.get("OLLAMA_HEDGE", "0") == "1", breaker=breaker)
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = make_backend()
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def default_parallelism() -> int:
+    """
+    Match the server's OLLAMA_NUM_PARALLEL so we keep every slot busy without queueing
+    extra requests on the server side. With several servers, keep all of them busy.
+    """
+    per_server = max(1, int(os.environ.get("OLLAMA_NUM_PARALLEL", "4")))
+    backend = unwrap(get_backend())
+    return max(per_server, getattr(backend, "capacity", per_server))
@@ -1,32 +1,22 @@
 import json
-import subprocess
 import sys
 import time
 
-def call_ollama(system_prompt: str, user_prompt: str, model_name: str = "llama3.2") -> str:
-    prompt_text = f"SYSTEM:\n{system_prompt}\n\nUSER:\n{user_prompt}\n\nASSISTANT:\n"
-    cmd = ["ollama", "run", model_name]
-    result = subprocess.run(cmd, input=prompt_text, capture_output=True, text=True)
-    if result.returncode != 0:
-        print("Error running Ollama:", result.stderr, file=sys.stderr)
-        return ""
-    return result.stdout.strip()
+import metrics
+from json_repair import parse_model_json
+from metrics import timed_stage
+from ollama_backend import BackendError, get_backend
 
-def extract_json_object(raw_output: str) -> str:
-    cleaned = raw_output.replace("```json", "").replace("```", "").strip()
-    start = cleaned.find('{')
-    end = cleaned.rfind('}')
-    if start == -1 or end == -1 or end < start:
+def call_ollama(system_prompt: str, user_prompt: str, model_name: str = "llama3.2") -> str:
+    start = time.perf_counter()
+    try:
+        response = get_backend().generate(system_prompt, user_prompt, model_name)
+    except BackendError as e:
+        print("Error running Ollama:", e, file=sys.stderr)
+        metrics.inc("llm_errors_total", stage=metrics.current_stage())
         return ""
-    return cleaned[start:end+1].strip()
-
-def fix_missing_braces(json_string: str) -> str:
-    opens = json_string.count('{')
-    closes = json_string.count('}')
-    if opens > closes:
-        diff = opens - closes
-        json_string += '}' * diff
-    return json_string
+    metrics.record_llm_call(time.perf_counter() - start, response)
+    return response.text.strip()
 
 def finalize_match_structure(match_result: dict) -> dict:
     """
@@ -123,14 +113,10 @@ def re_prompt_fix(raw_output: str, system_prompt: str, user_prompt: str, model_n
         "Please correct it now."
     )
     new_raw = call_ollama(system_prompt, fix_prompt, model_name)
-    jpart = extract_json_object(new_raw)
-    jpart = fix_missing_braces(jpart)
-    try:
-        return json.loads(jpart)
-    except:
-        return {}
+    return parse_model_json(new_raw)
 
 # ------------------- Step 1: Parse JD -------------------
+@timed_stage("parse_jd")
 def parse_jd(jd_text: str, api_key: str, model: str) -> dict:
     system_prompt = (
         "You are a professional HR assistant who can read job descriptions and extract structured information. "
@@ -147,15 +133,13 @@ JD Text:
 \"\"\"
 """
     raw_output = call_ollama(system_prompt, user_prompt, model)
-    json_part = extract_json_object(raw_output)
-    json_part = fix_missing_braces(json_part)
-    try:
-        return json.loads(json_part)
-    except json.JSONDecodeError:
+    result = parse_model_json(raw_output)
+    if not result:
         print("JSON Parse Error in parse_jd. Raw output:\n", raw_output)
-        return {}
+    return result
 
 # ------------------- Step 2: Parse Resume -------------------
+@timed_stage("parse_resume")
 def parse_resume(resume_text: str, api_key: str, model: str) -> dict:
     system_prompt = (
         "You are an expert resume parser. Read the candidate's resume and extract structured information. "
@@ -171,15 +155,13 @@ Resume Text:
 \"\"\"
 """
     raw_output = call_ollama(system_prompt, user_prompt, model)
-    json_part = extract_json_object(raw_output)
-    json_part = fix_missing_braces(json_part)
-    try:
-        return json.loads(json_part)
-    except json.JSONDecodeError:
+    result = parse_model_json(raw_output)
+    if not result:
         print("JSON Parse Error in parse_resume. Raw output:\n", raw_output)
-        return {}
+    return result
 
 # ------------------- Step 3: Match JD and Resume -------------------
+@timed_stage("match")
 def match_jd_and_resume(jd_info: dict, resume_info: dict, api_key: str, model: str) -> dict:
     """
     Compare JD JSON and Resume JSON, then return EXACTLY five keys:
@@ -228,13 +210,9 @@ Finally, provide 'Final_match' with the fields: match_level, Final_match_score,
 
     # First attempt
     raw_output = call_ollama(system_prompt, user_prompt, model)
-    json_part = extract_json_object(raw_output)
-    json_part = fix_missing_braces(json_part)
-    try:
-        match_result = json.loads(json_part)
-    except json.JSONDecodeError:
+    match_result = parse_model_json(raw_output)
+    if not match_result:
         print("JSON Parse Error in match_jd_and_resume. Raw output:\n", raw_output)
-        match_result = {}
 
     # Validate
     if not validate_match_result(match_result):
@@ -354,5 +332,8 @@ Interests: Entrepreneurship, AI/Robotics, Bio-tech, Edu-tech, E-commerce
     match_result = match_jd_and_resume(jd_info, resume_info, OPENROUTER_API_KEY, MODEL)
     print("Match Result:\n", json.dumps(match_result, indent=2, ensure_ascii=False))
 
+    json_path, prom_path = metrics.export_all(basename="resume_jd_metrics")
+    print(f"Metrics written to {json_path} and {prom_path}.")
+
 if __name__ == "__main__":
     main()
@@ -1,31 +1,210 @@
+import contextlib
 import json
-import subprocess
+import os
 import sys
-
-def call_ollama(system_prompt: str, user_prompt: str, model_name: str = "llama3.2") -> str:
-    prompt_text = f"SYSTEM:\n{system_prompt}\n\nUSER:\n{user_prompt}\n\nASSISTANT:\n"
-    cmd = ["ollama", "run", model_name]
-    result = subprocess.run(cmd, input=prompt_text, capture_output=True, text=True)
-    if result.returncode != 0:
-        print("Error running Ollama:", result.stderr, file=sys.stderr)
-        return ""
-    return result.stdout.strip()
-
-def extract_json_object(raw_output: str) -> str:
-    cleaned = raw_output.replace("```json", "").replace("```", "").strip()
-    start = cleaned.find('{')
-    end = cleaned.rfind('}')
-    if start == -1 or end == -1 or end < start:
-        return ""
-    return cleaned[start:end+1].strip()
-
-def fix_missing_braces(json_string: str) -> str:
-    opens = json_string.count('{')
-    closes = json_string.count('}')
-    if opens > closes:
-        diff = opens - closes
-        json_string += '}' * diff
-    return json_string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from json_stream import JSONObjectScanner
+import metrics
+from compaction import (COMPACT_INPUTS, COMPACTION_LOG, COMPACTION_STATS, JD_TOKEN_BUDGET, RESUME_TOKEN_BUDGET,
+                        compact, learn_corpus)
+from journal import Fallback, Journal, get_journal, journaled
+from json_repair import parse_model_json
+from metrics import timed_stage
+from ollama_backend import BackendError, LLMResponse, ResilientBackend, default_parallelism, get_backend, unwrap
+from parse_cache import cached_parse, get_parse_cache
+from prefilter import PAIR_STATS, default_min_score, passes_prefilter
+from rule_scoring import rule_scores
+from scheduler import Scheduler, get_scheduler, retrying
+
+# Bump when a parse prompt changes so cached results from the old prompt are not reused.
+JD_PROMPT_VERSION = "3"
+RESUME_PROMPT_VERSION = "3"
+# Same for the match prompt; journaled match results are keyed by it.
+MATCH_PROMPT_VERSION = "1"
+
+# JSON schemas sent as Ollama's structured `format`, so output is valid by construction.
+_SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "match_level": {"type": "integer", "minimum": 1, "maximum": 7},
+        "match_score": {"type": "string", "pattern": "^[0-9]{1,3}%$"},
+        "reasoning": {"type": "string"},
+    },
+    "required": ["match_level", "match_score", "reasoning"],
+    "additionalProperties": False,
+}
+
+MATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "education": _SCORE_SCHEMA,
+        "work_and_project_experience": _SCORE_SCHEMA,
+        "skills": _SCORE_SCHEMA,
+        "experience_year": _SCORE_SCHEMA,
+        "Final_match": {
+            "type": "object",
+            "properties": {
+                "match_level": {"type": "integer", "minimum": 1, "maximum": 7},
+                "Final_match_score": {"type": "string", "pattern": "^[0-9]{1,3}%$"},
+                "reasoning": {"type": "string"},
+            },
+            "required": ["match_level", "Final_match_score", "reasoning"],
+            "additionalProperties": False,
+        },
+    },
+    "required": ["education", "work_and_project_experience", "skills", "experience_year", "Final_match"],
+    "additionalProperties": False,
+}
+
+JD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "job_title": {"type": "string"},
+        "company_name": {"type": "string"},
+        "required_education": {"type": "string"},
+        "required_experience_years": {"type": "number"},
+        "required_skills": {"type": "array", "items": {"type": "string"}},
+        "responsibilities": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["job_title", "company_name", "required_education", "required_experience_years",
+                 "required_skills", "responsibilities"],
+}
+
+RESUME_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "highest_education": {"type": "string"},
+        "total_years_of_experience": {"type": "number"},
+        "skills": {"type": "array", "items": {"type": "string"}},
+        "work_experience": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "company": {"type": "string"},
+                    "start_date": {"type": "string"},
+                    "end_date": {"type": "string"},
+                },
+                "required": ["title", "company", "start_date", "end_date"],
+            },
+        },
+    },
+    "required": ["highest_education", "total_years_of_experience", "skills", "work_experience"],
+}
+
+# How often match_jd_and_resume needs the re_prompt_fix round-trip / the fallback,
+# split by whether the first call was schema-constrained.
+RETRY_STATS = {
+    "constrained": {"calls": 0, "reprompts": 0, "fallbacks": 0},
+    "unconstrained": {"calls": 0, "reprompts": 0, "fallbacks": 0},
+}
+_retry_stats_lock = threading.Lock()
+
+def _count_retry(mode: str, field: str):
+    with _retry_stats_lock:
+        RETRY_STATS[mode][field] += 1
+    if field != "calls":
+        metrics.inc("match_retry_total", kind=field[:-1], mode=mode)
+
+def parse_output(raw_output: str) -> dict:
+    """parse_model_json, counting whether the output was clean, repaired or unusable."""
+    try:
+        value = json.loads(raw_output)
+        if isinstance(value, dict):
+            metrics.inc("json_parse_total", result="clean", stage=metrics.current_stage())
+            return value
+    except json.JSONDecodeError:
+        pass
+    value = parse_model_json(raw_output)
+    metrics.inc("json_parse_total", result="repaired" if value else "failed", stage=metrics.current_stage())
+    return value
+
+# Stream output and cancel the generation as soon as the top-level JSON object closes,
+# instead of paying for whatever the model writes after it. OLLAMA_STREAM=0 disables.
+# Only unconstrained calls stream: the subprocess backend, and HTTP calls without a
+# schema (or against a server that rejects `format`). Schema-constrained HTTP calls,
+# the default, already end at the closing brace and are sent without streaming.
+# The stream only stops at an object holding the schema's required keys; calls
+# without a schema run to the end, so split or prose-wrapped output reaches repair.
+STREAM_EARLY_STOP = os.environ.get("OLLAMA_STREAM", "1") != "0"
+# Every call refreshes the server's keep-alive so the model is not unloaded between JDs.
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+def _stop_when(format_schema: dict):
+    if not STREAM_EARLY_STOP or not format_schema:
+        return None
+    keys = format_schema.get("required") or list(format_schema.get("properties", {}))
+    return JSONObjectScanner(keys).feed if keys else None
+
+def _scheduled(backend):
+    """
+    The scheduler slot for one call. A ResilientBackend takes a slot per attempt itself,
+    so it does not hold one through retry backoff; other backends get one here.
+    """
+    if isinstance(backend, ResilientBackend):
+        return contextlib.nullcontext()
+    return get_scheduler(default_parallelism).slot()
+
+def call_llm(system_prompt: str, user_prompt: str, model_name: str = "llama3.2",
+             format_schema: dict = None) -> LLMResponse:
+    stop_when = _stop_when(format_schema)
+    backend = get_backend()
+    try:
+        with _scheduled(backend):
+            start = time.perf_counter()
+            response = backend.generate(system_prompt, user_prompt, model_name, format=format_schema,
+                                        keep_alive=KEEP_ALIVE, stop_when=stop_when)
+    except BackendError as e:
+        print("Error running Ollama:", e, file=sys.stderr)
+        metrics.inc("llm_errors_total", stage=metrics.current_stage())
+        return LLMResponse("", error=str(e))
+    metrics.record_llm_call(time.perf_counter() - start, response)
+    return response
+
+def call_chat(messages: list, model_name: str = "llama3.2", format_schema: dict = None,
+              keep_alive: str = None, options: dict = None) -> LLMResponse:
+    stop_when = _stop_when(format_schema)
+    backend = get_backend()
+    try:
+        with _scheduled(backend):
+            start = time.perf_counter()
+            response = backend.chat(messages, model_name, format=format_schema,
+                                    keep_alive=keep_alive, options=options, stop_when=stop_when)
+    except BackendError as e:
+        print("Error running Ollama:", e, file=sys.stderr)
+        metrics.inc("llm_errors_total", stage=metrics.current_stage())
+        return LLMResponse("", error=str(e))
+    metrics.record_llm_call(time.perf_counter() - start, response)
+    return response
+
+# Prompt evaluation cost of match calls, to verify prefix-cache savings.
+PROMPT_EVAL_STATS = {"calls": 0, "prompt_tokens": 0, "prompt_eval_ns": 0}
+
+def _record_prompt_eval(response: LLMResponse):
+    if not response.prompt_eval_count:
+        # Early-stopped streams end before Ollama reports the prompt's token count.
+        return
+    with _retry_stats_lock:
+        PROMPT_EVAL_STATS["calls"] += 1
+        PROMPT_EVAL_STATS["prompt_tokens"] += response.prompt_eval_count
+        PROMPT_EVAL_STATS["prompt_eval_ns"] += response.prompt_eval_duration
+
+def print_prompt_eval_stats():
+    calls = PROMPT_EVAL_STATS["calls"]
+    if not calls:
+        return
+    tokens = PROMPT_EVAL_STATS["prompt_tokens"] / calls
+    millis = PROMPT_EVAL_STATS["prompt_eval_ns"] / calls / 1e6
+    print(f"Match prompt eval: {calls} calls, {tokens:.0f} tokens evaluated and {millis:.1f} ms per call "
+          f"(prefix cache {'on' if MATCH_PREFIX_CACHE else 'off'}).")
+
+def call_ollama(system_prompt: str, user_prompt: str, model_name: str = "llama3.2",
+                format_schema: dict = None) -> str:
+    return call_llm(system_prompt, user_prompt, model_name, format_schema).text.strip()
 
 def finalize_match_structure(match_result: dict) -> dict:
     """
@@ -122,11 +301,23 @@ def validate_match_result(match_result: dict) -> bool:
             return False
     return True
 
-def re_prompt_fix(raw_output: str, system_prompt: str, user_prompt: str, model_name: str) -> dict:
+@timed_stage("re_prompt_fix")
+def re_prompt_fix(raw_output: str, system_prompt: str, user_prompt: str, model_name: str,
+                  rule_scored: bool = False) -> dict:
+    if rule_scored:
+        shape = (
+            "It must have EXACTLY three top-level keys:\n"
+            "1) work_and_project_experience\n2) skills\n3) Final_match\n\n"
+            "For the first two: match_level (1-7), match_score ('xx%'), reasoning.\n"
+        )
+    else:
+        shape = (
+            "It must have EXACTLY five top-level keys:\n"
+            "1) education\n2) work_and_project_experience\n3) skills\n4) experience_year\n5) Final_match\n\n"
+            "For the first four: match_level (1-7), match_score ('xx%'), reasoning.\n"
+        )
     fix_prompt = (
-        "You produced invalid JSON. It must have EXACTLY five top-level keys:\n"
-        "1) education\n2) work_and_project_experience\n3) skills\n4) experience_year\n5) Final_match\n\n"
-        "For the first four: match_level (1-7), match_score ('xx%'), reasoning.\n"
+        "You produced invalid JSON. " + shape +
         "For Final_match: match_level (1-7), Final_match_score ('xx%'), reasoning.\n"
         "No extra keys or nesting. Only valid JSON.\n"
         "Also, do NOT use match_level=0 or '0%' anywhere.\n\n"
@@ -134,15 +325,28 @@ def re_prompt_fix(raw_output: str, system_prompt: str, user_prompt: str, model_n
         f"{raw_output}\n\n"
         "Please correct it now."
     )
-    new_raw = call_ollama(system_prompt, fix_prompt, model_name)
-    jpart = extract_json_object(new_raw)
-    jpart = fix_missing_braces(jpart)
-    try:
-        return json.loads(jpart)
-    except:
-        return {}
-
+    # Re-prompts queue behind first attempts of the same priority class.
+    with retrying():
+        new_raw = call_ollama(system_prompt, fix_prompt, model_name)
+    return parse_output(new_raw)
+
+def _compact_input(text: str, budget: int, kind: str) -> str:
+    result = compact(text, budget, posting=kind == "jd")
+    if not result.text:
+        return text
+    metrics.inc("input_tokens_saved_total", result.tokens_saved, kind=kind)
+    metrics.observe("input_saved_tokens", result.tokens_saved, kind=kind)
+    if COMPACTION_LOG:
+        print(f"Compacted {kind}: ~{result.tokens_before} -> ~{result.tokens_after} tokens "
+              f"({result.tokens_saved} saved).", file=sys.stderr)
+    return result.text
+
+@timed_stage("parse_jd")
+@journaled("parse_jd", JD_PROMPT_VERSION)
+@cached_parse("parse_jd", JD_PROMPT_VERSION)
 def parse_jd(jd_text: str, model: str) -> dict:
+    if COMPACT_INPUTS:
+        jd_text = _compact_input(jd_text, JD_TOKEN_BUDGET, "jd")
     system_prompt = (
         "You are a professional HR assistant who can read job descriptions and extract structured information. "
         "Output must be valid JSON. No extra commentary."
@@ -156,16 +360,18 @@ JD Text:
 {jd_text}
 \"\"\"
 """
-    raw_output = call_ollama(system_prompt, user_prompt, model)
-    json_part = extract_json_object(raw_output)
-    json_part = fix_missing_braces(json_part)
-    try:
-        return json.loads(json_part)
-    except json.JSONDecodeError:
-        print("JSON Parse Error in parse_jd:\n", raw_output)
-        return {}
-
+    raw_output = call_ollama(system_prompt, user_prompt, model, JD_SCHEMA)
+    result = parse_output(raw_output)
+    if not result:
+        print("JSON Parse Error in parse_jd:\n", raw_output, file=sys.stderr)
+    return result
+
+@timed_stage("parse_resume")
+@journaled("parse_resume", RESUME_PROMPT_VERSION)
+@cached_parse("parse_resume", RESUME_PROMPT_VERSION)
 def parse_resume(resume_text: str, model: str) -> dict:
+    if COMPACT_INPUTS:
+        resume_text = _compact_input(resume_text, RESUME_TOKEN_BUDGET, "resume")
     system_prompt = (
         "You are an expert resume parser. Read the candidate's resume and extract structured information. "
         "Output must be valid JSON only. No extra commentary."
@@ -179,70 +385,459 @@ Resume Text:
 {resume_text}
 \"\"\"
 """
-    raw_output = call_ollama(system_prompt, user_prompt, model)
-    json_part = extract_json_object(raw_output)
-    json_part = fix_missing_braces(json_part)
+    raw_output = call_ollama(system_prompt, user_prompt, model, RESUME_SCHEMA)
+    result = parse_output(raw_output)
+    if not result:
+        print("JSON Parse Error in parse_resume:\n", raw_output, file=sys.stderr)
+    return result
+
+# Everything static lives in the system prompt and the JD comes before the resume, so
+# consecutive candidates for the same JD share the longest possible prompt prefix.
+MATCH_SYSTEM_PROMPT = (
+    "You are a professional job matching system. Compare the JD's requirements with the candidate's resume.\n"
+    "Compare them on:\n"
+    "1) education\n2) work_and_project_experience\n3) skills\n4) experience_year\n"
+    "Finally, provide 'Final_match' with match_level, Final_match_score, reasoning.\n\n"
+    "Return EXACTLY five top-level keys:\n"
+    "1) education\n2) work_and_project_experience\n3) skills\n4) experience_year\n5) Final_match\n\n"
+    "For the first four:\n"
+    "- match_level (1-7)\n"
+    "- match_score ('xx%')\n"
+    "- reasoning (1-2 sentences)\n\n"
+    "For 'Final_match':\n"
+    "- match_level (1-7)\n"
+    "- Final_match_score ('xx%')\n"
+    "- reasoning (1-2 sentences)\n\n"
+    "No extra commentary or triple backticks. Only valid JSON. Do not use match_level=0 or '0%'. "
+    "Use at least '10%' if it's a poor match."
+)
+
+# education and experience_year are scored by rule_scoring; the model is only asked for
+# the other two dimensions and the final synthesis. RULE_SCORING=0 asks it for all five.
+RULE_SCORING = os.environ.get("RULE_SCORING", "1") != "0"
+LLM_MATCH_KEYS = ("work_and_project_experience", "skills", "Final_match")
+
+RULE_MATCH_SCHEMA = {
+    "type": "object",
+    "properties": {key: MATCH_SCHEMA["properties"][key] for key in LLM_MATCH_KEYS},
+    "required": list(LLM_MATCH_KEYS),
+    "additionalProperties": False,
+}
+
+RULE_MATCH_SYSTEM_PROMPT = (
+    "You are a professional job matching system. Compare the JD's requirements with the candidate's resume.\n"
+    "Education and years of experience are already scored; you get those scores as input.\n\n"
+    "Return EXACTLY three top-level keys:\n"
+    "1) work_and_project_experience\n2) skills\n3) Final_match\n\n"
+    "For work_and_project_experience and skills:\n"
+    "- match_level (1-7)\n"
+    "- match_score ('xx%')\n"
+    "- reasoning (1-2 sentences)\n\n"
+    "For 'Final_match', weighing all four dimensions including the precomputed ones:\n"
+    "- match_level (1-7)\n"
+    "- Final_match_score ('xx%')\n"
+    "- reasoning (1-2 sentences)\n\n"
+    "No extra commentary or triple backticks. Only valid JSON. Do not use match_level=0 or '0%'. "
+    "Use at least '10%' if it's a poor match."
+)
+
+def active_match_system_prompt() -> str:
+    return RULE_MATCH_SYSTEM_PROMPT if RULE_SCORING else MATCH_SYSTEM_PROMPT
+
+def precomputed_block(rules: dict) -> str:
+    return f"Precomputed scores:\n{json.dumps(rules, ensure_ascii=False, sort_keys=True)}\n"
+
+def merge_rule_scores(llm_result: dict, rules: dict) -> dict:
+    """The five-key match result: rule-based dimensions plus whatever the model returned."""
+    return {
+        "education": rules["education"],
+        "work_and_project_experience": llm_result.get("work_and_project_experience"),
+        "skills": llm_result.get("skills"),
+        "experience_year": rules["experience_year"],
+        "Final_match": llm_result.get("Final_match"),
+    } if all(key in llm_result for key in LLM_MATCH_KEYS) else dict(llm_result, **rules)
+
+# Send matches through /api/chat with keep_alive so the server's prompt cache for the
+# system prompt + JD is reused across candidates. MATCH_PREFIX_CACHE=0 disables.
+MATCH_PREFIX_CACHE = os.environ.get("MATCH_PREFIX_CACHE", "1") != "0"
+
+@timed_stage("match")
+@journaled("match", MATCH_PROMPT_VERSION + ("+rules" if RULE_SCORING else ""))
+def match_jd_and_resume(jd_info: dict, resume_info: dict, model: str, repair: bool = True) -> dict:
+    """
+    Match one parsed pair. With repair=False an invalid first answer returns None
+    instead of going through re_prompt_fix and the fallback defaults (the cascade
+    escalates to a larger model instead).
+    """
+    rules = rule_scores(jd_info, resume_info) if RULE_SCORING else None
+    system_prompt = RULE_MATCH_SYSTEM_PROMPT if rules else MATCH_SYSTEM_PROMPT
+    schema = RULE_MATCH_SCHEMA if rules else MATCH_SCHEMA
+
+    # sort_keys keeps the JD serialization byte-identical between calls.
+    jd_str = json.dumps(jd_info, ensure_ascii=False, sort_keys=True)
+    resume_str = json.dumps(resume_info, ensure_ascii=False, sort_keys=True)
+
+    user_prompt = f"JD JSON:\n{jd_str}\n\nResume JSON:\n{resume_str}\n"
+    if rules:
+        # Pair-specific, so it goes last to keep the shared prefix intact.
+        user_prompt += "\n" + precomputed_block(rules)
+
+    if MATCH_PREFIX_CACHE:
+        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
+        response = call_chat(messages, model, schema, KEEP_ALIVE)
+    else:
+        response = call_llm(system_prompt, user_prompt, model, schema)
+    if response.error:
+        # Retries already happened in the backend; re-prompting a dead backend only adds delay.
+        raise BackendError(f"match failed: {response.error}")
+    _record_prompt_eval(response)
+    mode = "constrained" if response.constrained else "unconstrained"
+    _count_retry(mode, "calls")
+    raw_output = response.text.strip()
+    match_result = parse_output(raw_output)
+    if not match_result:
+        print("JSON Parse Error in match_jd_and_resume:\n", raw_output, file=sys.stderr)
+    if rules:
+        match_result = merge_rule_scores(match_result, rules)
+
+    if validate_match_result(match_result):
+        return match_result
+    if not repair:
+        return None
+
+    # With constrained decoding a second free-form attempt will not do better; only
+    # re-prompt when the backend could not enforce the schema.
+    if response.constrained:
+        print("WARNING: Constrained output invalid. Using fallback with non-zero defaults.", file=sys.stderr)
+        _count_retry(mode, "fallbacks")
+        return Fallback(finalize_match_structure(match_result))
+
+    print("WARNING: Missing 'Final_match' or other keys. Re-prompting...", file=sys.stderr)
+    _count_retry(mode, "reprompts")
+    match_result2 = re_prompt_fix(raw_output, system_prompt, user_prompt, model, rules is not None)
+    if rules and match_result2:
+        match_result2 = merge_rule_scores(match_result2, rules)
+    if not validate_match_result(match_result2):
+        print("Second attempt also invalid. Using fallback with non-zero defaults.", file=sys.stderr)
+        _count_retry(mode, "fallbacks")
+        return Fallback(finalize_match_structure(match_result2 if match_result2 else match_result))
+    return match_result2
+
+# ------------------- Warm-up: load the model before the first real call -------------------
+
+WARMUP_ENABLED = os.environ.get("OLLAMA_WARMUP", "1") != "0"
+
+def _is_model(name: str, model: str) -> bool:
+    return name == model or (":" not in model and name == model + ":latest")
+
+def warm_up(model: str, keep_alive: str = KEEP_ALIVE, prewarm_prefix: bool = None) -> dict:
+    """
+    Load `model`, pin it for `keep_alive` and (with the prefix cache on) put
+    the match system prompt into the server's prompt cache. Returns seconds per phase:
+    "load" is the preload request, i.e. the cold-start cost the first real call would
+    otherwise pay; "first_call" is a one-token call made afterwards, i.e. the warm case.
+    """
+    if prewarm_prefix is None:
+        prewarm_prefix = MATCH_PREFIX_CACHE
+    backend = get_backend()
+    report = {"model": model, "keep_alive": keep_alive, "was_loaded": None, "load": None, "server_load": None,
+              "prefix": None, "first_call": None}
+    short = {"num_predict": 1}
     try:
-        return json.loads(json_part)
-    except json.JSONDecodeError:
-        print("JSON Parse Error in parse_resume:\n", raw_output)
+        running = backend.running_models()
+        if running is not None:
+            report["was_loaded"] = any(_is_model(name, model) for name in running)
+
+        start = time.perf_counter()
+        response = backend.preload(model, keep_alive)
+        report["load"] = time.perf_counter() - start
+        report["server_load"] = response.load_duration / 1e9
+
+        if prewarm_prefix:
+            messages = [{"role": "system", "content": active_match_system_prompt()},
+                        {"role": "user", "content": "Reply with OK."}]
+            start = time.perf_counter()
+            backend.chat(messages, model, keep_alive=keep_alive, options=short)
+            report["prefix"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        backend.generate("", "Reply with OK.", model, keep_alive=keep_alive, options=short)
+        report["first_call"] = time.perf_counter() - start
+    except BackendError as e:
+        print(f"Warm-up of {model} failed: {e}", file=sys.stderr)
+    for phase in ("load", "prefix", "first_call"):
+        if report[phase] is not None:
+            metrics.observe("warmup_seconds", report[phase], phase=phase)
+    return report
+
+def print_warmup_report(report: dict):
+    if report["load"] is None:
+        return
+    state = {True: "already loaded", False: "cold", None: "state unknown"}[report["was_loaded"]]
+    line = f"Warm-up of {report['model']} ({state}): load {report['load']:.2f}s"
+    if report["prefix"] is not None:
+        line += f", match prefix {report['prefix']:.2f}s"
+    if report["first_call"] is not None:
+        line += f", warm first call {report['first_call']:.2f}s"
+    print(line + f" (keep_alive {report['keep_alive']}).", file=sys.stderr)
+
+# ------------------- Batched matching: one resume, several JDs per call -------------------
+BATCH_MATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "matches": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": dict({"jd_id": {"type": "string"}}, **MATCH_SCHEMA["properties"]),
+                "required": ["jd_id"] + MATCH_SCHEMA["required"],
+            },
+        },
+    },
+    "required": ["matches"],
+}
+
+BATCH_RULE_MATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "matches": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": dict({"jd_id": {"type": "string"}}, **RULE_MATCH_SCHEMA["properties"]),
+                "required": ["jd_id"] + RULE_MATCH_SCHEMA["required"],
+            },
+        },
+    },
+    "required": ["matches"],
+}
+
+_BATCH_INSTRUCTIONS = (
+    "\n\nYou will receive ONE resume and SEVERAL JDs, each with a jd_id. Return a JSON object "
+    "{\"matches\": [...]} with one element per JD. Each element has \"jd_id\" plus the {} keys above."
+)
+BATCH_MATCH_SYSTEM_PROMPT = MATCH_SYSTEM_PROMPT + _BATCH_INSTRUCTIONS.replace("{}", "five")
+BATCH_RULE_MATCH_SYSTEM_PROMPT = RULE_MATCH_SYSTEM_PROMPT + _BATCH_INSTRUCTIONS.replace("{}", "three")
+
+# Context budget for batched prompts. Ollama truncates silently past num_ctx, so
+# batches are packed to stay under it (chars/4 is a conservative token estimate).
+# OLLAMA_NUM_CTX is requested, capped per model by its trained context length.
+NUM_CTX = int(os.environ.get("OLLAMA_NUM_CTX", "8192"))
+_model_num_ctx = {}
+MATCH_OUTPUT_TOKENS = 320
+MAX_MATCH_BATCH = int(os.environ.get("MATCH_BATCH_SIZE", "1"))
+
+BATCH_STATS = {"calls": 0, "jds": 0, "retried": 0}
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def model_num_ctx(model: str) -> int:
+    """
+    Context to request and pack batches for: NUM_CTX, or less when the model was
+    trained on a shorter context. Asked once per model (/api/show); NUM_CTX if unknown.
+    """
+    num_ctx = _model_num_ctx.get(model)
+    if num_ctx is None:
+        try:
+            length = get_backend().context_length(model)
+        except BackendError as e:
+            print(f"Could not read the context length of {model} ({e}); assuming {NUM_CTX}.", file=sys.stderr)
+            length = None
+        num_ctx = _model_num_ctx[model] = min(NUM_CTX, length) if length else NUM_CTX
+    return num_ctx
+
+def plan_match_batches(resume_str: str, jd_strs: dict, max_batch: int, num_ctx: int = None) -> list:
+    """
+    Greedily pack JD ids into batches of at most max_batch whose prompt plus expected
+    output fits in num_ctx. A JD too large to share a batch gets a batch of its own.
+    """
+    budget = int((num_ctx or NUM_CTX) * 0.9)
+    fixed = estimate_tokens(BATCH_MATCH_SYSTEM_PROMPT) + estimate_tokens(resume_str)
+    batches, current, used = [], [], fixed
+    for jd_id, jd_str in jd_strs.items():
+        cost = estimate_tokens(jd_str) + MATCH_OUTPUT_TOKENS
+        if current and (len(current) >= max_batch or used + cost > budget):
+            batches.append(current)
+            current, used = [], fixed
+        current.append(jd_id)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+@timed_stage("batch_match")
+def _match_batch(jd_ids: list, jd_strs: dict, resume_str: str, model: str, rules: dict = None) -> dict:
+    """
+    One LLM call for several JDs; returns {jd_id: match_result} for the valid elements only.
+    With `rules` ({jd_id: rule_scores}) the model only fills the LLM_MATCH_KEYS.
+    """
+    if rules:
+        system_prompt, schema = BATCH_RULE_MATCH_SYSTEM_PROMPT, BATCH_RULE_MATCH_SCHEMA
+        jd_block = "\n\n".join(f"jd_id: {jd_id}\nJD JSON:\n{jd_strs[jd_id]}\n{precomputed_block(rules[jd_id])}"
+                                 for jd_id in jd_ids)
+    else:
+        system_prompt, schema = BATCH_MATCH_SYSTEM_PROMPT, BATCH_MATCH_SCHEMA
+        jd_block = "\n\n".join(f"jd_id: {jd_id}\nJD JSON:\n{jd_strs[jd_id]}" for jd_id in jd_ids)
+    user_prompt = f"Resume JSON:\n{resume_str}\n\nJDs:\n{jd_block}\n"
+    messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
+    response = call_chat(messages, model, schema, KEEP_ALIVE, {"num_ctx": model_num_ctx(model)})
+    if response.error:
+        # Leave the whole batch to the per-JD retry, so one failed call does not sink the others.
+        print(f"Batch match of {len(jd_ids)} JDs failed: {response.error}", file=sys.stderr)
         return {}
+    _record_prompt_eval(response)
+    parsed = parse_output(response.text)
+    elements = parsed.get("matches") if isinstance(parsed.get("matches"), list) else []
 
-def match_jd_and_resume(jd_info: dict, resume_info: dict, model: str) -> dict:
-    system_prompt = (
-        "You are a professional job matching system. Compare the JD's requirements with the candidate's resume.\n"
-        "Return EXACTLY five top-level keys:\n"
-        "1) education\n2) work_and_project_experience\n3) skills\n4) experience_year\n5) Final_match\n\n"
-        "For the first four:\n"
-        "- match_level (1-7)\n"
-        "- match_score ('xx%')\n"
-        "- reasoning (1-2 sentences)\n\n"
-        "For 'Final_match':\n"
-        "- match_level (1-7)\n"
-        "- Final_match_score ('xx%')\n"
-        "- reasoning (1-2 sentences)\n\n"
-        "No extra commentary or triple backticks. Only valid JSON. Do not use match_level=0 or '0%'."
-    )
-
-    jd_str = json.dumps(jd_info, ensure_ascii=False)
-    resume_str = json.dumps(resume_info, ensure_ascii=False)
-
-    user_prompt = f"""
-JD JSON:
-{jd_str}
-
-Resume JSON:
-{resume_str}
-
-Compare them on:
-1) education
-2) work_and_project_experience
-3) skills
-4) experience_year
-
-Finally, provide 'Final_match' with match_level, Final_match_score, reasoning.
-No 0% or match_level=0 allowed. Use at least '10%' if it's a poor match.
-"""
-
-    raw_output = call_ollama(system_prompt, user_prompt, model)
-    json_part = extract_json_object(raw_output)
-    json_part = fix_missing_braces(json_part)
-    try:
-        match_result = json.loads(json_part)
-    except json.JSONDecodeError:
-        print("JSON Parse Error in match_jd_and_resume:\n", raw_output)
-        match_result = {}
-
-    if not validate_match_result(match_result):
-        print("WARNING: Missing 'Final_match' or other keys. Re-prompting...")
-        match_result2 = re_prompt_fix(raw_output, system_prompt, user_prompt, model)
-        if not validate_match_result(match_result2):
-            print("Second attempt also invalid. Using fallback with non-zero defaults.")
-            return finalize_match_structure(match_result2 if match_result2 else match_result)
-        else:
-            return match_result2
-    else:
-        return match_result
+    results = {}
+    for element in elements:
+        if not isinstance(element, dict):
+            continue
+        jd_id = str(element.pop("jd_id", ""))
+        if rules and jd_id in rules:
+            element = merge_rule_scores(element, rules[jd_id])
+        if jd_id in jd_strs and jd_id in jd_ids and validate_match_result(element):
+            results.setdefault(jd_id, element)
+    return results
+
+def match_resume_against_jds(resume_info: dict, jd_infos: dict, model: str, max_batch: int = None,
+                             max_workers: int = None, errors: dict = None) -> dict:
+    """
+    Match one resume against several parsed JDs, packing up to max_batch JDs into each
+    LLM call. Every returned element is checked with validate_match_result; JDs whose
+    element is missing or invalid (or whose batch call failed) are retried individually
+    with match_jd_and_resume. Returns {jd_id: match_result}.
+    When an individual retry raises, the error is re-raised, or with `errors` given
+    stored there as {jd_id: exception} and the JD's result is None.
+    """
+    max_batch = max_batch or MAX_MATCH_BATCH
+    # Pairs already matched in a journaled earlier run are not sent again; new batch
+    # results are journaled under the same key match_jd_and_resume would use.
+    journal = get_journal()
+    keys = {str(jd_id): match_jd_and_resume.journal_key(info, resume_info, model) for jd_id, info in jd_infos.items()}
+    results = {}
+    for jd_id in keys:
+        done = journal.get(keys[jd_id])
+        if done is not None:
+            results[jd_id] = done
+    resume_str = json.dumps(resume_info, ensure_ascii=False, sort_keys=True)
+    jd_strs = {str(jd_id): json.dumps(info, ensure_ascii=False, sort_keys=True) for jd_id, info in jd_infos.items()
+               if str(jd_id) not in results}
+    batches = plan_match_batches(resume_str, jd_strs, max_batch, model_num_ctx(model))
+    rules = ({str(jd_id): rule_scores(info, resume_info) for jd_id, info in jd_infos.items()}
+             if RULE_SCORING else None)
+
+    with ThreadPoolExecutor(max_workers=max_workers or default_parallelism()) as pool:
+        for batch_result in pool.map(lambda ids: _match_batch(ids, jd_strs, resume_str, model, rules), batches):
+            for jd_id, match_result in batch_result.items():
+                journal.commit(keys[jd_id], "match", match_result)
+            results.update(batch_result)
+        failed = [jd_id for jd_id in jd_infos if str(jd_id) not in results]
+        with _retry_stats_lock:
+            BATCH_STATS["calls"] += len(batches)
+            BATCH_STATS["jds"] += len(jd_strs)
+            BATCH_STATS["retried"] += len(failed)
+        retried = [(jd_id, pool.submit(match_jd_and_resume, jd_infos[jd_id], resume_info, model))
+                   for jd_id in failed]
+        for jd_id, future in retried:
+            try:
+                results[str(jd_id)] = future.result()
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors[jd_id] = e
+                results[str(jd_id)] = None
+    return {jd_id: results[str(jd_id)] for jd_id in jd_infos}
+
+def print_retry_stats():
+    for mode, counts in RETRY_STATS.items():
+        if counts["calls"]:
+            rate = 100.0 * counts["reprompts"] / counts["calls"]
+            print(f"Match calls ({mode}): {counts['calls']}, re-prompts: {counts['reprompts']} ({rate:.0f}%), "
+                  f"fallbacks: {counts['fallbacks']}")
+    if BATCH_STATS["calls"]:
+        print(f"Batched matching: {BATCH_STATS['jds']} JDs in {BATCH_STATS['calls']} calls, "
+              f"{BATCH_STATS['retried']} retried individually.")
+
+def print_backend_stats():
+    backend = get_backend()
+    if hasattr(backend, "resilience_stats"):
+        r = backend.resilience_stats()
+        if r["retried"] or r["hedged"] or r["shed"] or r["breaker_opened"]:
+            print(f"Backend resilience: {r['retried']} retries, {r['hedged']} hedged calls "
+                  f"({r['hedge_wins']} won by the hedge), {r['shed']} shed, circuit {r['breaker']} "
+                  f"(opened {r['breaker_opened']}x).", file=sys.stderr)
+    scheduler = get_scheduler(default_parallelism)
+    if isinstance(scheduler, Scheduler):
+        print(scheduler.summary(), file=sys.stderr)
+    backend = unwrap(backend)
+    if not hasattr(backend, "stats"):
+        return
+    for e in backend.stats():
+        state = "up" if e["healthy"] else "down"
+        print(f"Endpoint {e['host']} ({state}): {e['requests']} requests, {e['failures']} failures.",
+              file=sys.stderr)
+
+def parse_and_match(jd_text: str, resume_info: dict, model: str, min_score: float = 0.0,
+                    match: bool = True) -> tuple:
+    """
+    Returns (jd_info, match_result, prefilter_score). match_result is None when the
+    pair scores below min_score on the deterministic prefilter and the LLM is skipped,
+    or when match=False (the caller matches in batches).
+    """
+    jd_info = parse_jd(jd_text, model)
+    keep, score = passes_prefilter(jd_info, resume_info, min_score)
+    if not keep or not match:
+        return jd_info, None, score
+    match_result = match_jd_and_resume(jd_info, resume_info, model)
+    return jd_info, match_result, score
+
+def screen_resume_against_jds(resume_info: dict, all_jds: dict, model: str, max_workers: int = None,
+                              min_score: float = None, max_batch: int = None) -> list:
+    """
+    Parse and match every JD concurrently, at most max_workers at a time.
+    Returns one dict per JD in input order: name, jd_info, match_result, prefilter_score, error.
+    A JD that raises gets error set and None results; the others are unaffected.
+    JDs scoring below min_score (default PREFILTER_MIN_SCORE) are not sent to the LLM.
+    With max_batch > 1 (default MATCH_BATCH_SIZE) the JDs are matched several per call.
+    """
+    max_workers = max_workers or default_parallelism()
+    min_score = default_min_score() if min_score is None else min_score
+    max_batch = max_batch or MAX_MATCH_BATCH
+    batched = max_batch > 1
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            (jd_name, pool.submit(parse_and_match, jd_text, resume_info, model, min_score, not batched))
+            for jd_name, jd_text in all_jds.items()
+        ]
+        results = []
+        for jd_name, future in futures:
+            try:
+                jd_info, match_result, score = future.result()
+                results.append({"name": jd_name, "jd_info": jd_info, "match_result": match_result,
+                                "prefilter_score": score, "error": None})
+            except Exception as e:
+                print(f"Screening failed for {jd_name}: {e}", file=sys.stderr)
+                results.append({"name": jd_name, "jd_info": None, "match_result": None,
+                                "prefilter_score": None, "error": str(e)})
+
+    if batched:
+        pending = {r["name"]: r for r in results if not r["error"] and r["prefilter_score"] >= min_score}
+        errors = {}
+        try:
+            matches = match_resume_against_jds(resume_info, {name: r["jd_info"] for name, r in pending.items()},
+                                               model, max_batch, max_workers, errors)
+            for name, match_result in matches.items():
+                pending[name]["match_result"] = match_result
+        except Exception as e:
+            print(f"Batched matching failed: {e}", file=sys.stderr)
+            for r in pending.values():
+                r["error"] = str(e)
+        for name, e in errors.items():
+            print(f"Screening failed for {name}: {e}", file=sys.stderr)
+            pending[name]["error"] = str(e)
+    return results
 
 def main():
     MODEL = "llama3.2"
@@ -300,6 +895,9 @@ Skills: Product Management, Project Management, Cross-Functional Team Leadership
 Interests: Entrepreneurship, AI/Robotics, Bio-tech, Edu-tech, E-commerce
 """
 
+    if WARMUP_ENABLED:
+        print_warmup_report(warm_up(MODEL))
+
     print("=== Parsing Resume ===")
     resume_info = parse_resume(resume_text, MODEL)
     print("Resume Parsed:\n", json.dumps(resume_info, indent=2, ensure_ascii=False))
@@ -480,25 +1078,45 @@ Design and implement GenAI solutions, leverage ML infrastructure, and evaluate t
         "Google JD": jd_text_google
     }
 
-    # Parse & match
-    for jd_name, jd_text in all_jds.items():
+    # Parse & match all JDs concurrently, then report in input order
+    learn_corpus(all_jds.values())
+    for result in screen_resume_against_jds(resume_info, all_jds, MODEL):
+        jd_name = result["name"]
+        if result["error"]:
+            print(f"\n=== {jd_name} failed: {result['error']} ===")
+            continue
         print(f"\n=== Parsing JD: {jd_name} ===")
-        jd_info = parse_jd(jd_text, MODEL)
-        print("JD Parsed:\n", json.dumps(jd_info, indent=2, ensure_ascii=False))
+        print("JD Parsed:\n", json.dumps(result["jd_info"], indent=2, ensure_ascii=False))
 
         print(f"\n=== Matching Resume with {jd_name} ===")
-        match_result = match_jd_and_resume(jd_info, resume_info, MODEL)
-        print("Match Result:\n", json.dumps(match_result, indent=2, ensure_ascii=False))
+        if result["match_result"] is None:
+            print(f"Skipped by prefilter (score {result['prefilter_score']:.2f}).")
+            continue
+        print("Match Result:\n", json.dumps(result["match_result"], indent=2, ensure_ascii=False))
 
     print("\n=== Explanation of JSON Handling & Validation ===")
     print(
-        "1) We remove code fences and extract from '{' to '}'.\n"
-        "2) If there's a mismatch in braces, we append '}'.\n"
-        "3) If JSON is invalid or missing keys, we re-prompt once.\n"
+        "0) The REST backend sends a JSON schema as `format`, so output is valid by construction.\n"
+        "1) We remove code fences and parse each '{...}' object, merging split answers.\n"
+        "2) Broken JSON (missing braces/brackets, trailing commas, quotes) is repaired locally.\n"
+        "3) If JSON is invalid or missing keys and decoding was unconstrained, we re-prompt once.\n"
         "4) If that fails, we fallback to non-zero defaults.\n\n"
         "We ensure these 5 keys: education, work_and_project_experience, skills, experience_year, Final_match.\n"
         "Each must have match_level (1-7), match_score ('xx%'), reasoning.\n"
     )
 
+    print_retry_stats()
+    print_prompt_eval_stats()
+    print_backend_stats()
+    if COMPACTION_STATS.documents:
+        print(COMPACTION_STATS.summary())
+    print(PAIR_STATS.summary())
+    stats = get_parse_cache().stats()
+    print(f"Parse cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries stored.")
+    if isinstance(get_journal(), Journal):
+        print(get_journal().summary())
+    json_path, prom_path = metrics.export_all()
+    print(f"Metrics written to {json_path} and {prom_path}.")
+
 if __name__ == "__main__":
     main()
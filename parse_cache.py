@@ -0,0 +1,195 @@
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = ".ollama_cache.sqlite3"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so re-pasted or re-wrapped postings hash the same."""
+    return " ".join(text.split())
+
+
+def cache_key(kind: str, text: str, model: str, prompt_version: str) -> str:
+    material = json.dumps([kind, prompt_version, model, normalize_text(text)], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """
+    Content-addressed store for parse results, backed by one SQLite file.
+    Each put is a single transaction, so a crash never leaves a half-written entry.
+    When the stored payload exceeds max_bytes, least-recently-used entries are evicted.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, kind TEXT, value TEXT, size INTEGER, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access)")
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, kind: str, value: dict):
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, kind, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, kind, payload, len(payload), time.time()),
+                )
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class NullCache:
+    """Stand-in used when caching is disabled; every lookup is a miss."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        self.misses += 1
+        return None
+
+    def put(self, key: str, kind: str, value: dict):
+        pass
+
+    def stats(self) -> dict:
+        return {"hits": 0, "misses": self.misses, "entries": 0, "bytes": 0}
+
+    def close(self):
+        pass
+
+
+class SingleFlight:
+    """Run fn once per key at a time; concurrent callers with the same key wait and share its result."""
+
+    def __init__(self):
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "value": None, "error": None}
+            else:
+                self.coalesced += 1
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["value"]
+        try:
+            call["value"] = fn()
+            return call["value"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_parse_cache():
+    """
+    PARSE_CACHE_PATH selects the SQLite file ("off" disables caching),
+    PARSE_CACHE_MAX_BYTES bounds its size.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = os.environ.get("PARSE_CACHE_PATH", DEFAULT_CACHE_PATH)
+                if path.lower() in ("", "off", "none"):
+                    _cache = NullCache()
+                else:
+                    max_bytes = int(os.environ.get("PARSE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+                    _cache = ParseCache(path, max_bytes)
+    return _cache
+
+
+def set_parse_cache(cache):
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def cached_parse(kind: str, prompt_version: str):
+    """
+    Decorator for parse functions with signature (text, model, ...) -> dict.
+    Empty results (parse failures) are not stored, so they are retried next run.
+    Concurrent misses on the same key share one call instead of each parsing the text.
+    """
+    def decorator(func):
+        flight = SingleFlight()
+
+        @functools.wraps(func)
+        def wrapper(text: str, model: str, *args, **kwargs) -> dict:
+            cache = get_parse_cache()
+            key = cache_key(kind, text, model, prompt_version)
+            hit = cache.get(key)
+            if hit is not None:
+                return hit
+
+            def compute():
+                result = func(text, model, *args, **kwargs)
+                if result:
+                    cache.put(key, kind, result)
+                return result
+            return flight.do(key, compute)
+        return wrapper
+    return decorator
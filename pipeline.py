@@ -0,0 +1,212 @@
+"""
+Staged pipeline with bounded queues between stages.
+
+    pipe = Pipeline([Stage("parse", parse_pair, workers=4), Stage("match", match_pair, workers=8)])
+    for record in pipe.run(pairs):       # results come out in input order
+        sink(record)
+    print(pipe.summary())
+
+Each stage has its own worker threads and reads from a bounded queue, so a slow
+stage blocks the one before it instead of letting work pile up in memory. The
+source is also admitted through a cap on items in flight (queued, running, or
+finished but waiting for an earlier item to be yielded), so memory stays bounded
+even while the output is being put back in input order.
+
+stats() reports per stage: items, busy time, utilization (busy / workers x wall
+time), current and peak input queue depth, and time spent blocked on the next
+queue. The stage with high utilization and a full input queue is the one to give
+more workers.
+
+A stage function that raises stops the pipeline; the exception is re-raised from
+run(). Functions that should keep going record the error in their result instead.
+"""
+import queue
+import sys
+import threading
+import time
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+class _Aborted(Exception):
+    pass
+
+
+class Stage:
+    def __init__(self, name: str, fn, workers: int = 1, queue_size: int = None):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = queue_size or 2 * self.workers
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.peak_depth = 0
+
+    def _record(self, busy: float, blocked: float, depth: int):
+        with self._lock:
+            self.processed += 1
+            self.busy_seconds += busy
+            self.blocked_seconds += blocked
+            self.peak_depth = max(self.peak_depth, depth)
+
+
+class Pipeline:
+    def __init__(self, stages: list, max_in_flight: int = None, report_every: float = None):
+        if not stages:
+            raise ValueError("a pipeline needs at least one stage")
+        self.stages = stages
+        # By default: everything the queues and workers can hold, plus as much again for reordering.
+        self.max_in_flight = max_in_flight or 2 * sum(s.queue_size + s.workers for s in stages)
+        self.report_every = report_every
+        self._queues = []
+        self._abort = threading.Event()
+        self._started = None
+        self._finished = None
+
+    def _put(self, q: queue.Queue, item) -> float:
+        """Blocking put that gives up when the pipeline is aborted; returns seconds spent blocked."""
+        start = time.perf_counter()
+        while True:
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return time.perf_counter() - start
+            except queue.Full:
+                if self._abort.is_set():
+                    raise _Aborted()
+
+    def _get(self, q: queue.Queue):
+        while True:
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                if self._abort.is_set():
+                    raise _Aborted()
+
+    def _feed(self, source, admitted: threading.Semaphore, errors: list):
+        try:
+            for seq, value in enumerate(source):
+                while not admitted.acquire(timeout=_POLL_SECONDS):
+                    if self._abort.is_set():
+                        return
+                self._put(self._queues[0], (seq, value))
+        except _Aborted:
+            return
+        except Exception as e:
+            errors.append(e)
+            self._abort.set()
+            return
+        for _ in range(self.stages[0].workers):
+            try:
+                self._put(self._queues[0], _DONE)
+            except _Aborted:
+                return
+
+    def _work(self, index: int, remaining: list, remaining_lock: threading.Lock, errors: list):
+        stage = self.stages[index]
+        inbox, outbox = self._queues[index], self._queues[index + 1]
+        try:
+            while True:
+                item = self._get(inbox)
+                if item is _DONE:
+                    break
+                depth = inbox.qsize()
+                seq, value = item
+                start = time.perf_counter()
+                value = stage.fn(value)
+                busy = time.perf_counter() - start
+                stage._record(busy, self._put(outbox, (seq, value)), depth)
+        except _Aborted:
+            return
+        except Exception as e:
+            print(f"Pipeline stage {stage.name} failed: {e}", file=sys.stderr)
+            errors.append(e)
+            self._abort.set()
+            return
+        with remaining_lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last:
+            # The last worker out passes end-of-input on to every worker of the next stage.
+            downstream = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+            try:
+                for _ in range(downstream):
+                    self._put(outbox, _DONE)
+            except _Aborted:
+                pass
+
+    def _monitor(self):
+        while not self._abort.wait(self.report_every):
+            print(self.summary(), file=sys.stderr)
+
+    def run(self, source):
+        """Yield each source item after it has passed every stage, in source order."""
+        self._queues = [queue.Queue(s.queue_size) for s in self.stages] + [queue.Queue(self.max_in_flight)]
+        self._abort.clear()
+        self._started = time.perf_counter()
+        self._finished = None
+        admitted = threading.Semaphore(self.max_in_flight)
+        errors = []
+        remaining = [s.workers for s in self.stages]
+        remaining_lock = threading.Lock()
+        threads = [threading.Thread(target=self._feed, args=(source, admitted, errors), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads += [threading.Thread(target=self._work, args=(index, remaining, remaining_lock, errors),
+                                         name=f"{stage.name}-{n}", daemon=True) for n in range(stage.workers)]
+        if self.report_every:
+            threads.append(threading.Thread(target=self._monitor, daemon=True))
+        for thread in threads:
+            thread.start()
+
+        pending = {}
+        next_seq = 0
+        try:
+            while True:
+                try:
+                    item = self._get(self._queues[-1])
+                except _Aborted:
+                    break
+                if item is _DONE:
+                    break
+                seq, value = item
+                pending[seq] = value
+                while next_seq in pending:
+                    value = pending.pop(next_seq)
+                    next_seq += 1
+                    admitted.release()
+                    yield value
+        finally:
+            # Also reached when the consumer stops early: stop the feeder and the workers.
+            self._abort.set()
+            self._finished = time.perf_counter()
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+
+    def stats(self) -> list:
+        end = self._finished or time.perf_counter()
+        wall = max(1e-9, end - self._started) if self._started else 0.0
+        rows = []
+        for stage, inbox in zip(self.stages, self._queues or [None] * len(self.stages)):
+            rows.append({
+                "stage": stage.name,
+                "workers": stage.workers,
+                "processed": stage.processed,
+                "busy_seconds": round(stage.busy_seconds, 3),
+                "utilization": round(stage.busy_seconds / (stage.workers * wall), 3) if wall else 0.0,
+                "queue_depth": inbox.qsize() if inbox is not None else 0,
+                "queue_peak": stage.peak_depth,
+                "queue_size": stage.queue_size,
+                "blocked_seconds": round(stage.blocked_seconds, 3),
+            })
+        return rows
+
+    def summary(self) -> str:
+        return "\n".join(
+            f"Stage {r['stage']}: {r['processed']} items, {r['workers']} workers {100 * r['utilization']:.0f}% busy, "
+            f"queue {r['queue_depth']}/{r['queue_size']} (peak {r['queue_peak']}), "
+            f"{r['blocked_seconds']:.1f}s blocked on the next stage"
+            for r in self.stats())
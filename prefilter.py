@@ -0,0 +1,249 @@
+"""
+Cheap deterministic ranking of resume/JD pairs before LLM matching.
+
+Scores come from the parsed fields only: JD required_skills and
+required_experience_years against resume skills and total_years_of_experience.
+Pairs below the threshold (or outside the top-K per JD) never reach the LLM.
+"""
+import os
+import re
+import threading
+from collections import defaultdict
+
+SKILL_WEIGHT = 0.7
+YEARS_WEIGHT = 0.3
+
+# Canonical forms for spellings that show up across postings and resumes.
+SYNONYMS = {
+    "ml": "machine learning",
+    "dl": "deep learning",
+    "ai": "artificial intelligence",
+    "genai": "generative ai",
+    "gen ai": "generative ai",
+    "llm": "large language models",
+    "llms": "large language models",
+    "nlp": "natural language processing",
+    "cv": "computer vision",
+    "pm": "product management",
+    "tpm": "technical program management",
+    "program mgmt": "program management",
+    "project mgmt": "project management",
+    "product mgmt": "product management",
+    "ux": "user experience",
+    "ui": "user interface",
+    "hci": "human computer interaction",
+    "js": "javascript",
+    "ts": "typescript",
+    "k8s": "kubernetes",
+    "postgres": "postgresql",
+    "sql server": "mssql",
+    "gcp": "google cloud",
+    "aws": "amazon web services",
+    "a b testing": "ab testing",
+    "cross functional leadership": "cross functional team leadership",
+}
+
+STOPWORDS = {
+    "and", "or", "of", "the", "a", "an", "in", "with", "for", "to", "on", "at", "as",
+    "experience", "skills", "skill", "knowledge", "strong", "proven", "ability",
+    "years", "year", "etc", "using", "related", "field",
+}
+
+_NON_WORD = re.compile(r"[^a-z0-9+#]+")
+_SPLIT = re.compile(r"[,;/\n]|\band\b")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_skill(skill: str) -> str:
+    phrase = " ".join(_NON_WORD.sub(" ", skill.lower()).split())
+    return SYNONYMS.get(phrase, phrase)
+
+
+def skill_tokens(phrase: str) -> set:
+    tokens = set()
+    for word in phrase.split():
+        word = SYNONYMS.get(word, word)
+        for part in word.split():
+            if part not in STOPWORDS:
+                tokens.add(part)
+    return tokens
+
+
+def skill_list(value) -> list:
+    """The parsers may return a list, a comma-separated string, or nothing."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        items = _SPLIT.split(value)
+    elif isinstance(value, (list, tuple)):
+        items = [v if isinstance(v, str) else str(v) for v in value]
+    else:
+        items = [str(value)]
+    phrases = []
+    for item in items:
+        phrase = normalize_skill(item)
+        if phrase:
+            phrases.append(phrase)
+    return phrases
+
+
+def parse_years(value) -> float:
+    """'8 years', '5+', 3, None -> number of years (0 when unknown)."""
+    if isinstance(value, bool) or value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value))
+    return float(match.group()) if match else 0.0
+
+
+class ResumeProfile:
+    __slots__ = ("resume_id", "phrases", "tokens", "years")
+
+    def __init__(self, resume_id: str, resume_info: dict):
+        self.resume_id = resume_id
+        self.phrases = set(skill_list(resume_info.get("skills")))
+        self.tokens = set()
+        for phrase in self.phrases:
+            self.tokens |= skill_tokens(phrase)
+        self.years = parse_years(resume_info.get("total_years_of_experience"))
+
+
+def score_pair(jd_info: dict, resume_info: dict) -> float:
+    """Prefilter score in [0, 1] for one parsed JD against one parsed resume."""
+    return _score(jd_info, ResumeProfile("", resume_info))
+
+
+def _score(jd_info: dict, profile: ResumeProfile) -> float:
+    required = skill_list(jd_info.get("required_skills"))
+    if required:
+        covered = 0.0
+        for phrase in required:
+            if phrase in profile.phrases:
+                covered += 1.0
+            else:
+                tokens = skill_tokens(phrase)
+                if tokens:
+                    covered += 0.5 * len(tokens & profile.tokens) / len(tokens)
+        skill_score = covered / len(required)
+    else:
+        skill_score = 1.0
+
+    required_years = parse_years(jd_info.get("required_experience_years"))
+    years_score = min(1.0, profile.years / required_years) if required_years > 0 else 1.0
+    return SKILL_WEIGHT * skill_score + YEARS_WEIGHT * years_score
+
+
+class PrefilterStats:
+    def __init__(self):
+        self.pairs = 0
+        self.sent_to_llm = 0
+        self._lock = threading.Lock()
+
+    def record(self, pairs: int, sent: int):
+        with self._lock:
+            self.pairs += pairs
+            self.sent_to_llm += sent
+
+    @property
+    def avoided(self) -> int:
+        return self.pairs - self.sent_to_llm
+
+    def summary(self) -> str:
+        return (f"Prefilter: {self.pairs} pairs considered, {self.sent_to_llm} sent to the LLM, "
+                f"{self.avoided} LLM calls avoided.")
+
+
+# Totals for pairwise checks (screen_resume_against_jds, batch_screen).
+PAIR_STATS = PrefilterStats()
+
+
+def passes_prefilter(jd_info: dict, resume_info: dict, min_score: float, shortlisted: bool = True) -> tuple:
+    """
+    Return (should_match, score) for one pair and record it in PAIR_STATS.
+    shortlisted=False (the pair is outside its JD's top-K) always skips the LLM.
+    """
+    score = score_pair(jd_info, resume_info)
+    keep = shortlisted and score >= min_score
+    PAIR_STATS.record(1, 1 if keep else 0)
+    return keep, score
+
+
+class SkillIndex:
+    """
+    Inverted index from normalized skill token to resume ids. A resume sharing no
+    skill token with a JD scores at most YEARS_WEIGHT, so when min_score is above that
+    a JD is only scored against the resumes the index lists for its skills; otherwise
+    every resume is scored, and the shortlist agrees with passes_prefilter.
+    """
+
+    def __init__(self):
+        self._profiles = {}
+        self._postings = defaultdict(set)
+        self.stats = PrefilterStats()
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def add_resume(self, resume_id: str, resume_info: dict):
+        if resume_id in self._profiles:
+            self.remove_resume(resume_id)
+        profile = ResumeProfile(resume_id, resume_info)
+        self._profiles[resume_id] = profile
+        for token in profile.tokens:
+            self._postings[token].add(resume_id)
+
+    def remove_resume(self, resume_id: str):
+        profile = self._profiles.pop(resume_id, None)
+        if profile is None:
+            return
+        for token in profile.tokens:
+            self._postings[token].discard(resume_id)
+
+    def shortlist(self, jd_info: dict, top_k: int = None, min_score: float = 0.0) -> list:
+        """
+        Return [(resume_id, score)] best first: at most top_k entries, all >= min_score.
+        Every indexed resume counts as considered for the avoided-calls statistic.
+        """
+        required = skill_list(jd_info.get("required_skills"))
+        if required and min_score > YEARS_WEIGHT:
+            candidate_ids = set()
+            for phrase in required:
+                for token in skill_tokens(phrase):
+                    candidate_ids |= self._postings.get(token, set())
+        else:
+            candidate_ids = set(self._profiles)
+
+        scored = []
+        for resume_id in candidate_ids:
+            score = _score(jd_info, self._profiles[resume_id])
+            if score >= min_score:
+                scored.append((resume_id, score))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        if top_k is not None:
+            scored = scored[:top_k]
+        self.stats.record(len(self._profiles), len(scored))
+        return scored
+
+
+def default_min_score() -> float:
+    return float(os.environ.get("PREFILTER_MIN_SCORE", "0"))
+
+
+def default_top_k():
+    value = os.environ.get("PREFILTER_TOP_K")
+    return int(value) if value else None
+
+
+def shortlist_all(jd_infos: dict, resume_infos: dict, top_k: int = None, min_score: float = None) -> tuple:
+    """
+    Shortlist resumes for every JD. Returns ({jd_id: [(resume_id, score)]}, stats).
+    top_k and min_score default to PREFILTER_TOP_K and PREFILTER_MIN_SCORE.
+    """
+    top_k = default_top_k() if top_k is None else top_k
+    min_score = default_min_score() if min_score is None else min_score
+    index = SkillIndex()
+    for resume_id, resume_info in resume_infos.items():
+        index.add_resume(resume_id, resume_info)
+    shortlists = {jd_id: index.shortlist(jd_info, top_k, min_score) for jd_id, jd_info in jd_infos.items()}
+    return shortlists, index.stats
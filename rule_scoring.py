@@ -0,0 +1,172 @@
+"""
+Deterministic scores for the education and experience_year match dimensions.
+
+Both only compare parsed fields, so they are computed here instead of by the LLM:
+  experience_year  years from the resume's work_experience date ranges (overlaps
+                   merged, an open-ended latest role runs to today), or the stated
+                   total_years_of_experience if larger, against required_experience_years
+  education        an ordinal degree ladder, highest_education against the lowest
+                   degree named in required_education
+
+Each returns the same shape the LLM produces: match_level (1-7), match_score ('xx%'), reasoning.
+"""
+import datetime
+import re
+
+from prefilter import parse_years
+
+# Ordinal degree ladder; the first pattern that matches wins, so higher degrees come first.
+DEGREE_LADDER = (
+    (5, "doctorate", re.compile(r"\b(ph\.?\s?d|doctor(ate|al)?|d\.?phil|ed\.?d)\b")),
+    (4, "master's degree", re.compile(r"\b(master'?s?|m\.?s\.?c?|m\.?a|m\.?eng|mba|m\.?b\.?a|mphil)\b")),
+    (3, "bachelor's degree",
+     re.compile(r"\b(bachelor'?s?|b\.?s\.?c?|b\.?a|b\.?eng|b\.?tech|undergraduate|college degree)\b")),
+    (2, "associate degree", re.compile(r"\bassociate'?s?\s+degree\b")),
+    (1, "high school diploma", re.compile(r"\b(high school|secondary school|ged|diploma)\b")),
+)
+_EQUIVALENT = re.compile(r"equivalent (practical |work )?experience")
+
+_MONTHS = {name: i for i, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1)}
+_PRESENT = re.compile(r"\b(present|current|now|today|ongoing)\b", re.I)
+_MONTH_YEAR = re.compile(r"\b(\d{1,2})\s*[/.-]\s*((?:19|20)\d{2})\b")
+_YEAR_MONTH = re.compile(r"\b((?:19|20)\d{2})\s*[/.-]\s*(\d{1,2})\b")
+_NAMED_MONTH = re.compile(r"\b([a-z]{3})[a-z]*\.?\s+((?:19|20)\d{2})\b", re.I)
+_YEAR = re.compile(r"\b((?:19|20)\d{2})\b")
+
+# (minimum have/required ratio, match_level, match_score) for experience_year.
+YEARS_LEVELS = (
+    (1.5, 7, 95),
+    (1.0, 6, 85),
+    (0.8, 5, 70),
+    (0.6, 4, 55),
+    (0.4, 3, 40),
+    (0.2, 2, 25),
+    (0.0, 1, 10),
+)
+
+
+def parse_month(value, today: datetime.date = None):
+    """'04/2019', '2019-04', 'Apr 2019', '2019', 'Present' -> months since year 0, or None."""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    if _PRESENT.search(value):
+        today = today or datetime.date.today()
+        return today.year * 12 + today.month - 1
+    for pattern, year_group, month_group in ((_MONTH_YEAR, 2, 1), (_YEAR_MONTH, 1, 2)):
+        m = pattern.search(value)
+        if m and 1 <= int(m.group(month_group)) <= 12:
+            return int(m.group(year_group)) * 12 + int(m.group(month_group)) - 1
+    m = _NAMED_MONTH.search(value)
+    if m and m.group(1).lower() in _MONTHS:
+        return int(m.group(2)) * 12 + _MONTHS[m.group(1).lower()] - 1
+    m = _YEAR.search(value)
+    return int(m.group(1)) * 12 if m else None
+
+
+def experience_years(resume_info: dict, today: datetime.date = None) -> float:
+    """
+    Years covered by the work_experience ranges, counting overlapping roles once, or the
+    stated total_years_of_experience when that is larger (parsed ranges are often
+    incomplete). The most recent role with no readable end date ("", "N/A", null)
+    is taken to be the current one.
+    """
+    roles = []
+    for role in resume_info.get("work_experience") or []:
+        if not isinstance(role, dict):
+            continue
+        start = parse_month(role.get("start_date"), today)
+        if start is not None:
+            roles.append((start, parse_month(role.get("end_date"), today)))
+    stated = parse_years(resume_info.get("total_years_of_experience"))
+    if not roles:
+        return stated
+    latest = max(start for start, _ in roles)
+    now = parse_month("present", today)
+    intervals = []
+    for start, end in roles:
+        if end is None:
+            end = max(start, now) if start == latest else start
+        # A range entered backwards ("2020 - 2018") still covers those months.
+        intervals.append((min(start, end), max(start, end) + 1))
+    intervals.sort()
+    months = 0
+    current_start, current_end = intervals[0]
+    for start, end in intervals[1:]:
+        if start > current_end:
+            months += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    months += current_end - current_start
+    return max(round(months / 12, 1), stated)
+
+
+def degree_rank(text) -> tuple:
+    """(rank, label) of the highest degree named in text; (0, None) when none is."""
+    if not isinstance(text, str):
+        return 0, None
+    lowered = text.lower()
+    for rank, label, pattern in DEGREE_LADDER:
+        if pattern.search(lowered):
+            return rank, label
+    return 0, None
+
+
+def required_degree_rank(text) -> tuple:
+    """The lowest degree a JD names is the requirement ("Bachelor's, Master's preferred")."""
+    if not isinstance(text, str):
+        return 0, None
+    lowered = text.lower()
+    found = [(rank, label) for rank, label, pattern in DEGREE_LADDER if pattern.search(lowered)]
+    return min(found) if found else (0, None)
+
+
+def score_experience_year(jd_info: dict, resume_info: dict, today: datetime.date = None) -> dict:
+    required = parse_years(jd_info.get("required_experience_years"))
+    have = experience_years(resume_info, today)
+    if required <= 0:
+        return {"match_level": 6, "match_score": "85%",
+                "reasoning": f"No minimum experience is required; the candidate has {have:g} years."}
+    ratio = have / required
+    for threshold, level, score in YEARS_LEVELS:
+        if ratio >= threshold:
+            break
+    return {"match_level": level, "match_score": f"{score}%",
+            "reasoning": f"The candidate has {have:g} years of experience against {required:g} required."}
+
+
+def score_education(jd_info: dict, resume_info: dict) -> dict:
+    required_text = jd_info.get("required_education")
+    need, need_label = required_degree_rank(required_text)
+    have, have_label = degree_rank(resume_info.get("highest_education"))
+    if not need:
+        level, score = (6, 85) if have else (4, 50)
+        reason = "No specific degree is required"
+    elif not have:
+        level, score = 3, 40
+        reason = f"A {need_label} is required but no degree was found on the resume"
+    else:
+        gap = have - need
+        if gap >= 1:
+            level, score = 7, 95
+        elif gap == 0:
+            level, score = 6, 85
+        elif gap == -1:
+            # "or equivalent practical experience" softens a one-step shortfall.
+            equivalent = isinstance(required_text, str) and _EQUIVALENT.search(required_text.lower())
+            level, score = (4, 55) if equivalent else (3, 35)
+        else:
+            level, score = 2, 20
+        reason = f"The candidate holds a {have_label} and the JD requires a {need_label}"
+    if have_label and not need:
+        reason += f"; the candidate holds a {have_label}"
+    return {"match_level": level, "match_score": f"{score}%", "reasoning": reason + "."}
+
+
+def rule_scores(jd_info: dict, resume_info: dict, today: datetime.date = None) -> dict:
+    """{"education": {...}, "experience_year": {...}} for one parsed pair."""
+    return {
+        "education": score_education(jd_info, resume_info),
+        "experience_year": score_experience_year(jd_info, resume_info, today),
+    }
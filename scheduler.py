@@ -0,0 +1,235 @@
+"""
+Priority scheduling of LLM calls shared by interactive and bulk traffic.
+
+Every backend call takes a slot from the process-wide Scheduler first. Slots are
+capped in total (the backend's parallel capacity) and per priority class, and a
+freed slot goes to the waiting call with the best effective priority:
+
+    effective = class rank + RETRY_PENALTY (re-prompts only) - seconds waited / SCHED_AGING_SECONDS
+
+Lower runs first. Interactive lookups therefore jump ahead of queued bulk pairs,
+re-prompts yield to first attempts of their class, and aging guarantees a bulk
+call waiting long enough is eventually served even under steady interactive load.
+
+    with priority("interactive"):
+        match_jd_and_resume(...)          # every LLM call inside runs as interactive
+
+Threads without a priority() block use the process default (set_default_priority,
+SCHED_DEFAULT_CLASS, "batch" if unset). SCHED_QUOTAS caps classes, e.g.
+"batch=3" keeps one slot of four free for interactive calls.
+"""
+import contextlib
+import itertools
+import os
+import threading
+import time
+
+import metrics
+
+CLASSES = {"interactive": 0, "batch": 10}
+RETRY_PENALTY = 5
+AGING_SECONDS = float(os.environ.get("SCHED_AGING_SECONDS", "10"))
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER", "1") != "0"
+
+_local = threading.local()
+_default_class = os.environ.get("SCHED_DEFAULT_CLASS", "batch")
+
+
+def _check_class(name: str) -> str:
+    if name not in CLASSES:
+        raise ValueError(f"unknown priority class {name!r}; expected one of {sorted(CLASSES)}")
+    return name
+
+
+def set_default_priority(name: str):
+    """Class for threads that never entered priority(), e.g. worker pools of a bulk job."""
+    global _default_class
+    _default_class = _check_class(name)
+
+
+def current_priority() -> str:
+    return getattr(_local, "priority", None) or _default_class
+
+
+@contextlib.contextmanager
+def priority(name: str):
+    """Run the LLM calls made by this thread inside the block at class `name`."""
+    previous = getattr(_local, "priority", None)
+    _local.priority = _check_class(name)
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+@contextlib.contextmanager
+def retrying():
+    """Mark this thread's LLM calls as re-prompts, admitted after first attempts."""
+    previous = getattr(_local, "retry", False)
+    _local.retry = True
+    try:
+        yield
+    finally:
+        _local.retry = previous
+
+
+def parse_quotas(text: str) -> dict:
+    """'interactive=8,batch=3' -> {"interactive": 8, "batch": 3}."""
+    quotas = {}
+    for part in (text or "").split(","):
+        name, _, value = part.partition("=")
+        if name.strip():
+            quotas[_check_class(name.strip())] = int(value)
+    return quotas
+
+
+class _Ticket:
+    __slots__ = ("cls", "rank", "enqueued", "seq")
+
+    def __init__(self, cls: str, rank: float, seq: int):
+        self.cls = cls
+        self.rank = rank
+        self.enqueued = time.monotonic()
+        self.seq = seq
+
+    def effective(self, now: float, aging_seconds: float) -> tuple:
+        return self.rank - (now - self.enqueued) / aging_seconds, self.seq
+
+
+class Scheduler:
+    def __init__(self, capacity: int, quotas: dict = None, aging_seconds: float = AGING_SECONDS):
+        self.capacity = max(1, capacity)
+        self.quotas = {cls: min(self.capacity, (quotas or {}).get(cls, self.capacity)) for cls in CLASSES}
+        self.aging_seconds = aging_seconds
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._running = {cls: 0 for cls in CLASSES}
+        self._total = 0
+        self._stats = {cls: {"calls": 0, "retries": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+                       for cls in CLASSES}
+
+    def _next_ticket(self):
+        """The waiting ticket that gets the next free slot, or None if no class has room."""
+        if self._total >= self.capacity:
+            return None
+        now = time.monotonic()
+        eligible = [t for t in self._waiting if self._running[t.cls] < self.quotas[t.cls]]
+        return min(eligible, key=lambda t: t.effective(now, self.aging_seconds)) if eligible else None
+
+    def acquire(self, cls: str = None, retry: bool = None) -> str:
+        cls = _check_class(cls or current_priority())
+        retry = getattr(_local, "retry", False) if retry is None else retry
+        with self._cond:
+            ticket = _Ticket(cls, CLASSES[cls] + (RETRY_PENALTY if retry else 0), next(self._seq))
+            self._waiting.append(ticket)
+            while self._next_ticket() is not ticket:
+                self._cond.wait()
+            self._waiting.remove(ticket)
+            waited = time.monotonic() - ticket.enqueued
+            self._admit(cls, retry, waited)
+            # Another class may still have room for the next waiter.
+            self._cond.notify_all()
+        metrics.observe("scheduler_wait_seconds", waited, priority=cls)
+        return cls
+
+    def try_acquire(self, cls: str = None, retry: bool = None):
+        """
+        Take a slot only if one is free now and nobody is queued for it; returns the
+        class to release, or None. For optional work such as hedged duplicates.
+        """
+        cls = _check_class(cls or current_priority())
+        retry = getattr(_local, "retry", False) if retry is None else retry
+        with self._cond:
+            if self._waiting or self._total >= self.capacity or self._running[cls] >= self.quotas[cls]:
+                return None
+            self._admit(cls, retry, 0.0)
+        return cls
+
+    def _admit(self, cls: str, retry: bool, waited: float):
+        self._running[cls] += 1
+        self._total += 1
+        stats = self._stats[cls]
+        stats["calls"] += 1
+        stats["retries"] += bool(retry)
+        stats["wait_seconds"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+
+    def release(self, cls: str):
+        with self._cond:
+            self._running[cls] -= 1
+            self._total -= 1
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, cls: str = None, retry: bool = None):
+        cls = self.acquire(cls, retry)
+        try:
+            yield
+        finally:
+            self.release(cls)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {cls: dict(s, running=self._running[cls], waiting=sum(t.cls == cls for t in self._waiting),
+                              quota=self.quotas[cls])
+                    for cls, s in self._stats.items()}
+
+    def summary(self) -> str:
+        parts = []
+        for cls, s in self.stats().items():
+            if s["calls"]:
+                parts.append(f"{cls} {s['calls']} calls ({s['retries']} re-prompts), "
+                             f"avg wait {s['wait_seconds'] / s['calls']:.2f}s, max {s['max_wait_seconds']:.2f}s")
+        return "Scheduler: " + ("; ".join(parts) or "no calls")
+
+
+class NullScheduler:
+    """Stand-in used when SCHEDULER=0; calls go straight to the backend."""
+
+    def acquire(self, cls: str = None, retry: bool = None) -> str:
+        return cls or current_priority()
+
+    def try_acquire(self, cls: str = None, retry: bool = None) -> str:
+        return cls or current_priority()
+
+    def release(self, cls: str):
+        pass
+
+    @contextlib.contextmanager
+    def slot(self, cls: str = None, retry: bool = None):
+        yield
+
+    def stats(self) -> dict:
+        return {}
+
+    def summary(self) -> str:
+        return "Scheduler disabled."
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(default_capacity=None):
+    """
+    Process-wide scheduler. Capacity is SCHED_CAPACITY, else default_capacity() (called
+    once, on first use), else 4; SCHED_QUOTAS sets per-class caps.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                if not SCHEDULER_ENABLED:
+                    _scheduler = NullScheduler()
+                else:
+                    capacity = int(os.environ.get("SCHED_CAPACITY", "0")) or (
+                        default_capacity() if default_capacity else 4)
+                    _scheduler = Scheduler(capacity, parse_quotas(os.environ.get("SCHED_QUOTAS", "")))
+    return _scheduler
+
+
+def set_scheduler(scheduler):
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
@@ -0,0 +1,224 @@
+"""
+Embedding index over parsed JDs and resumes for semantic retrieval.
+
+Documents are built from the dicts returned by parse_jd / parse_resume, embedded
+through the backend's /api/embed endpoint, L2-normalized and stored in a
+memory-mapped float32 matrix, so cosine similarity is a plain matrix multiply.
+Requires numpy.
+
+    resumes = VectorIndex("index/resumes")
+    resumes.add({"r1": resume_info, ...}, resume_document)
+    hits = resumes.query([jd_info], jd_document, top_k=50)[0]   # [(resume_id, score)]
+
+batch_screen.py --top-k K --vector-index DIR adds each JD's K nearest resumes from
+this index to its skill-overlap shortlist.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from ollama_backend import get_backend
+
+EMBED_MODEL = os.environ.get("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+EMBED_BATCH_SIZE = 64
+# Rows scored per matmul block, so a query over a huge index does not allocate
+# an (n_queries x n_rows) matrix all at once.
+SEARCH_BLOCK_ROWS = 65536
+
+
+def _as_text(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_as_text(v) for v in value)
+    if isinstance(value, dict):
+        return " ".join(_as_text(v) for v in value.values())
+    return "" if value is None else str(value)
+
+
+def jd_document(jd_info: dict) -> str:
+    parts = [
+        f"Title: {_as_text(jd_info.get('job_title'))}",
+        f"Skills: {_as_text(jd_info.get('required_skills'))}",
+        f"Education: {_as_text(jd_info.get('required_education'))}",
+        f"Experience: {_as_text(jd_info.get('required_experience_years'))} years",
+        f"Responsibilities: {_as_text(jd_info.get('responsibilities'))}",
+    ]
+    return "\n".join(parts)
+
+
+def resume_document(resume_info: dict) -> str:
+    roles = resume_info.get("work_experience") or []
+    titles = [r.get("title", "") for r in roles if isinstance(r, dict)]
+    parts = [
+        f"Roles: {_as_text(titles)}",
+        f"Skills: {_as_text(resume_info.get('skills'))}",
+        f"Education: {_as_text(resume_info.get('highest_education'))}",
+        f"Experience: {_as_text(resume_info.get('total_years_of_experience'))} years",
+    ]
+    return "\n".join(parts)
+
+
+def _normalize_rows(matrix: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """
+    Append-friendly on-disk index in `path`:
+      vectors.f32  row-major float32 matrix (memory-mapped, grown by doubling)
+      ids.txt      one document id per row
+      meta.json    dim, row count, embedding model (replaced atomically last)
+    Re-adding an existing id overwrites its row in place.
+    """
+
+    def __init__(self, path: str, model: str = EMBED_MODEL):
+        self.path = path
+        self.model = model
+        self._lock = threading.Lock()
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._ids_path = os.path.join(path, "ids.txt")
+        self._meta_path = os.path.join(path, "meta.json")
+        os.makedirs(path, exist_ok=True)
+
+        self.dim = None
+        self.count = 0
+        self._capacity = 0
+        self._matrix = None
+        self._ids = []
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            self.count = meta["count"]
+            self.model = meta.get("model", model)
+            with open(self._ids_path, "rb+") as f:
+                self._ids = [f.readline().decode("utf-8").rstrip("\n") for _ in range(self.count)]
+                end = f.tell()
+                if f.read(1):
+                    # Lines past `count` belong to a write that never committed its meta; cut
+                    # them off so the next append does not land after them.
+                    f.truncate(end)
+            self._open(max(self.count, os.path.getsize(self._vectors_path) // (4 * self.dim)))
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._rows
+
+    def _open(self, capacity: int):
+        size = capacity * self.dim * 4
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._capacity = capacity
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self._capacity:
+            return
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        self._open(max(rows, 2 * self._capacity, 1024))
+
+    def _save_meta(self):
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "count": self.count, "model": self.model}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._meta_path)
+
+    def add_vectors(self, ids: list, vectors) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[0] != len(ids):
+            raise ValueError("vectors must be a (len(ids), dim) matrix")
+        vectors = _normalize_rows(vectors)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"expected dim {self.dim}, got {vectors.shape[1]}")
+
+            new_ids = []
+            rows = []
+            for doc_id in ids:
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self.count + len(new_ids)
+                    self._rows[doc_id] = row
+                    new_ids.append(doc_id)
+                rows.append(row)
+            self._ensure_capacity(self.count + len(new_ids))
+            self._matrix[rows] = vectors
+            self._matrix.flush()
+            if new_ids:
+                with open(self._ids_path, "a", encoding="utf-8") as f:
+                    f.write("".join(doc_id + "\n" for doc_id in new_ids))
+                self._ids.extend(new_ids)
+                self.count += len(new_ids)
+            self._save_meta()
+
+    def embed(self, texts: list) -> "np.ndarray":
+        backend = get_backend()
+        chunks = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            chunks.extend(backend.embed(texts[start:start + EMBED_BATCH_SIZE], self.model))
+        return np.asarray(chunks, dtype=np.float32)
+
+    def add(self, infos: dict, to_document, skip_existing: bool = True) -> int:
+        """
+        Embed and store {doc_id: parsed_dict}. With skip_existing, ids already in the
+        index are not re-embedded, so feeding the whole corpus again only costs the new ones.
+        Returns the number of documents embedded.
+        """
+        items = [(doc_id, info) for doc_id, info in infos.items()
+                 if not (skip_existing and doc_id in self._rows)]
+        for start in range(0, len(items), EMBED_BATCH_SIZE):
+            batch = items[start:start + EMBED_BATCH_SIZE]
+            vectors = self.embed([to_document(info) for _, info in batch])
+            self.add_vectors([doc_id for doc_id, _ in batch], vectors)
+        return len(items)
+
+    def search(self, queries, top_k: int = 10) -> list:
+        """Cosine top-k for each query row; returns [[(doc_id, score), ...], ...]."""
+        queries = _normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        with self._lock:
+            count = self.count
+            matrix = self._matrix
+            ids = self._ids
+        if count == 0:
+            return [[] for _ in range(len(queries))]
+        k = min(top_k, count)
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            block = matrix[start:min(count, start + SEARCH_BLOCK_ROWS)]
+            scores = queries @ block.T
+            rows = np.broadcast_to(np.arange(start, start + block.shape[0]), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k] if scores.shape[1] > k else \
+                np.argsort(-scores, axis=1)
+            best_scores = np.take_along_axis(scores, keep, axis=1)
+            best_rows = np.take_along_axis(rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [
+            [(ids[row], float(score)) for row, score in zip(row_ids, row_scores)]
+            for row_ids, row_scores in zip(best_rows, best_scores)
+        ]
+
+    def query(self, infos: list, to_document, top_k: int = 10) -> list:
+        """Embed parsed dicts (e.g. JDs) and return their top-k neighbours in this index."""
+        if not infos:
+            return []
+        return self.search(self.embed([to_document(info) for info in infos]), top_k)